@@ -0,0 +1,151 @@
+"""Database access for the API: migrations and the request-path queries.
+
+Endpoints use these so database round-trips never block the event loop or
+hold a threadpool slot. The SQL, migrations and row helpers live in
+database.py, whose sync connection pool serves the manage_*.py scripts.
+"""
+from typing import Optional
+
+from psycopg.rows import dict_row
+from psycopg_pool import AsyncConnectionPool
+
+from metrics import log, timed
+
+from database import (
+    DATABASE_URL,
+    DB_POOL_MIN,
+    DB_POOL_MAX,
+    UPLOAD_CACHE_MAX_AGE_DAYS,
+    UPLOAD_CACHE_MAX_MB,
+    TRANSLATION_CACHE_MAX_AGE_DAYS,
+    ADD_REVIEW_SQL,
+    GET_REVIEWS_SQL,
+    SAVE_SUMMARY_SQL,
+    GET_SUMMARY_SQL,
+    ADD_CONTACT_SUBMISSION_SQL,
+    GET_CACHED_UPLOAD_SQL,
+    SAVE_CACHED_UPLOAD_SQL,
+    PRUNE_EXPIRED_UPLOADS_SQL,
+    PRUNE_OVERSIZE_UPLOADS_SQL,
+    GET_CACHED_TRANSLATION_SQL,
+    SAVE_CACHED_TRANSLATION_SQL,
+    PRUNE_EXPIRED_TRANSLATIONS_SQL,
+    CREATE_SCHEMA_VERSION_SQL,
+    GET_SCHEMA_VERSION_SQL,
+    RECORD_SCHEMA_VERSION_SQL,
+    LOCK_MIGRATIONS_SQL,
+    pending_migrations,
+    cached_upload_params,
+    summary_share_id,
+    compress_summary,
+    summary_content
+)
+
+_pool: Optional[AsyncConnectionPool] = None
+
+async def open_pool():
+    global _pool
+    if not DATABASE_URL:
+        log("Warning: DATABASE_URL not set. Async database pool not created.")
+        return
+    if _pool is None:
+        _pool = AsyncConnectionPool(
+            DATABASE_URL,
+            min_size=DB_POOL_MIN,
+            max_size=DB_POOL_MAX,
+            kwargs={"row_factory": dict_row},
+            # Connections dropped by Neon/Render while idle are detected and replaced on checkout
+            check=AsyncConnectionPool.check_connection,
+            open=False
+        )
+        await _pool.open()
+        log(f"Async database pool ready ({DB_POOL_MIN}-{DB_POOL_MAX} connections).")
+
+async def close_pool():
+    global _pool
+    if _pool is not None:
+        await _pool.close()
+        _pool = None
+        log("Async database pool closed.")
+
+async def migrate():
+    """Applies pending schema migrations in one transaction on a pooled connection."""
+    if not _pool: return
+    async with _pool.connection() as conn:
+        async with conn.transaction():
+            await conn.execute(LOCK_MIGRATIONS_SQL)
+            await conn.execute(CREATE_SCHEMA_VERSION_SQL)
+            cur = await conn.execute(GET_SCHEMA_VERSION_SQL)
+            for version, statements in pending_migrations((await cur.fetchone())['version']):
+                log(f"Applying schema migration {version}...")
+                for statement in statements:
+                    await conn.execute(statement)
+                await conn.execute(RECORD_SCHEMA_VERSION_SQL, (version,))
+
+@timed("db.add_review")
+async def add_review(name, role, content, rating):
+    if not _pool: return None
+    async with _pool.connection() as conn:
+        cur = await conn.execute(ADD_REVIEW_SQL, (name, role, content, rating))
+        row = await cur.fetchone()
+        return row['id']
+
+@timed("db.get_reviews")
+async def get_reviews():
+    if not _pool: return []
+    async with _pool.connection() as conn:
+        cur = await conn.execute(GET_REVIEWS_SQL)
+        return await cur.fetchall()
+
+@timed("db.save_summary")
+async def save_summary(content):
+    if not _pool: return None
+    share_id = summary_share_id(content)
+    async with _pool.connection() as conn:
+        await conn.execute(SAVE_SUMMARY_SQL, (share_id, compress_summary(content)))
+    return share_id
+
+@timed("db.get_summary")
+async def get_summary(share_id):
+    if not _pool: return None
+    async with _pool.connection() as conn:
+        cur = await conn.execute(GET_SUMMARY_SQL, (share_id,))
+        row = await cur.fetchone()
+        return summary_content(row) if row else None
+
+@timed("db.get_cached_upload")
+async def get_cached_upload(content_hash):
+    """Returns the cached extraction/study guide for a file hash and marks it as recently used."""
+    if not _pool: return None
+    async with _pool.connection() as conn:
+        cur = await conn.execute(GET_CACHED_UPLOAD_SQL, (content_hash, UPLOAD_CACHE_MAX_AGE_DAYS))
+        return await cur.fetchone()
+
+@timed("db.save_cached_upload")
+async def save_cached_upload(content_hash, extracted_text, study_guide=None):
+    if not _pool: return
+    async with _pool.connection() as conn:
+        await conn.execute(SAVE_CACHED_UPLOAD_SQL, cached_upload_params(content_hash, extracted_text, study_guide))
+        await conn.execute(PRUNE_EXPIRED_UPLOADS_SQL, (UPLOAD_CACHE_MAX_AGE_DAYS,))
+        await conn.execute(PRUNE_OVERSIZE_UPLOADS_SQL, (UPLOAD_CACHE_MAX_MB * 1024 * 1024,))
+
+@timed("db.get_cached_translation")
+async def get_cached_translation(content_hash, language):
+    if not _pool: return None
+    async with _pool.connection() as conn:
+        cur = await conn.execute(GET_CACHED_TRANSLATION_SQL, (content_hash, language, TRANSLATION_CACHE_MAX_AGE_DAYS))
+        row = await cur.fetchone()
+        return row['translated_text'] if row else None
+
+@timed("db.save_cached_translation")
+async def save_cached_translation(content_hash, language, translated_text):
+    if not _pool: return
+    async with _pool.connection() as conn:
+        await conn.execute(SAVE_CACHED_TRANSLATION_SQL, (content_hash, language, translated_text))
+        await conn.execute(PRUNE_EXPIRED_TRANSLATIONS_SQL, (TRANSLATION_CACHE_MAX_AGE_DAYS,))
+
+@timed("db.add_contact_submission")
+async def add_contact_submission(id, name, email, subject, description, timestamp, issue_resolved=0):
+    if not _pool: return
+    async with _pool.connection() as conn:
+        await conn.execute(ADD_CONTACT_SUBMISSION_SQL, (id, name, email, subject, description, timestamp, issue_resolved))
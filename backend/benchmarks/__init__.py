@@ -0,0 +1 @@
+"""Offline benchmarks: a fake Gemini server, synthetic documents and a load runner."""
@@ -0,0 +1,92 @@
+"""Synthetic PDF and DOCX documents for benchmarks.
+
+Content is generated from a fixed seed so the same size always produces the
+same bytes, which keeps runs comparable across commits. Passing a different
+salt changes the content hash so uploads bypass the extraction cache.
+"""
+import io
+import random
+from typing import List
+
+WORDS = (
+    "cell membrane protein enzyme energy reaction equilibrium gradient molecule "
+    "transport diffusion osmosis theory evidence hypothesis experiment variable "
+    "function derivative integral limit matrix vector market supply demand price "
+    "history empire treaty revolution economy culture language structure system"
+).split()
+
+LINES_PER_PAGE = 45
+WORDS_PER_LINE = 12
+
+def page_lines(rng: random.Random, page: int) -> List[str]:
+    lines = [f"Chapter {page // 10 + 1} Section {page + 1}"]
+    for i in range(LINES_PER_PAGE - 1):
+        words = [rng.choice(WORDS) for _ in range(WORDS_PER_LINE)]
+        if i % 9 == 0:
+            words.append(f"{rng.randint(1, 9999)}.{rng.randint(0, 99):02d}")
+        lines.append(" ".join(words))
+    return lines
+
+def make_pdf(pages: int, salt: str = "") -> bytes:
+    """Builds a text-layer PDF with one Helvetica content stream per page."""
+    rng = random.Random(f"pdf-{pages}-{salt}")
+    objects = ["<< /Type /Catalog /Pages 2 0 R >>"]
+    kids = " ".join(f"{3 + 2 * i} 0 R" for i in range(pages))
+    objects.append(f"<< /Type /Pages /Kids [{kids}] /Count {pages} >>")
+    font_id = 3 + 2 * pages
+    for i in range(pages):
+        objects.append(
+            f"<< /Type /Page /Parent 2 0 R /MediaBox [0 0 612 792] /Contents {4 + 2 * i} 0 R "
+            f"/Resources << /Font << /F1 {font_id} 0 R >> >> >>"
+        )
+        lines = page_lines(rng, i)
+        if salt and i == 0:
+            lines[0] += f" {salt}"
+        stream = "BT /F1 10 Tf 50 760 Td 16 TL " + " ".join(f"({line}) Tj T*" for line in lines) + " ET"
+        objects.append(f"<< /Length {len(stream)} >>\nstream\n{stream}\nendstream")
+    objects.append("<< /Type /Font /Subtype /Type1 /BaseFont /Helvetica >>")
+
+    out = io.BytesIO()
+    out.write(b"%PDF-1.4\n")
+    offsets = []
+    for number, body in enumerate(objects, start=1):
+        offsets.append(out.tell())
+        out.write(f"{number} 0 obj\n{body}\nendobj\n".encode("latin-1"))
+    xref = out.tell()
+    out.write(f"xref\n0 {len(objects) + 1}\n0000000000 65535 f \n".encode("latin-1"))
+    for offset in offsets:
+        out.write(f"{offset:010d} 00000 n \n".encode("latin-1"))
+    out.write(f"trailer\n<< /Size {len(objects) + 1} /Root 1 0 R >>\nstartxref\n{xref}\n%%EOF\n".encode("latin-1"))
+    return out.getvalue()
+
+def make_docx(pages: int, salt: str = "") -> bytes:
+    """Builds a DOCX with a running header and footer, headings, paragraphs and a table every few pages."""
+    import docx
+
+    rng = random.Random(f"docx-{pages}-{salt}")
+    document = docx.Document()
+    section = document.sections[0]
+    section.header.paragraphs[0].text = "Course reader - synthetic benchmark document"
+    section.footer.paragraphs[0].text = "For study use only"
+    if salt:
+        document.add_paragraph(salt)
+    for page in range(pages):
+        lines = page_lines(rng, page)
+        document.add_heading(lines[0], level=2)
+        for start in range(1, len(lines), 5):
+            document.add_paragraph(" ".join(lines[start:start + 5]))
+        if page % 5 == 4:
+            table = document.add_table(rows=4, cols=3)
+            for row in table.rows:
+                for cell in row.cells:
+                    cell.text = f"{rng.choice(WORDS)} {rng.randint(1, 999)}"
+    out = io.BytesIO()
+    document.save(out)
+    return out.getvalue()
+
+def make_document(kind: str, pages: int, salt: str = "") -> bytes:
+    if kind == "pdf":
+        return make_pdf(pages, salt)
+    if kind == "docx":
+        return make_docx(pages, salt)
+    raise ValueError(f"Unknown document kind: {kind}")
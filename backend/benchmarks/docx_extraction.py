@@ -0,0 +1,99 @@
+"""Compares the streaming DOCX extractor with the python-docx object model.
+
+Both engines read the same synthetic reports (headings, paragraphs, a table
+every five pages and a running header and footer) from disk. Time is the
+best of several runs; peak memory is measured in a separate run under
+tracemalloc, which slows both engines down equally.
+
+    python -m benchmarks.docx_extraction --pages 200,1000,3000
+"""
+import os
+import sys
+import json
+import time
+import argparse
+import tempfile
+import tracemalloc
+from typing import Callable, Dict, Iterator, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.documents import make_docx  # noqa: E402
+from extraction import iter_docx_blocks  # noqa: E402
+
+def python_docx_lines(path: str) -> Iterator[str]:
+    """The previous extraction path: body paragraphs only, through the full object model."""
+    import docx
+
+    document = docx.Document(path)
+    for para in document.paragraphs:
+        yield para.text
+
+ENGINES: Dict[str, Callable[[str], Iterator[str]]] = {
+    "python-docx": python_docx_lines,
+    "streaming": iter_docx_blocks,
+}
+
+def consume(lines: Iterator[str]) -> Dict:
+    # Lines are counted and dropped, as the upload pipeline hands them on in small batches
+    chars = table_rows = 0
+    for line in lines:
+        chars += len(line) + 1
+        table_rows += " | " in line
+    return {"chars": chars, "table_rows": table_rows}
+
+def measure(extract: Callable[[str], Iterator[str]], path: str, repeats: int) -> Dict:
+    timings = []
+    counts = {}
+    for _ in range(repeats):
+        started = time.perf_counter()
+        counts = consume(extract(path))
+        timings.append(time.perf_counter() - started)
+
+    tracemalloc.start()
+    try:
+        consume(extract(path))
+        _, peak = tracemalloc.get_traced_memory()
+    finally:
+        tracemalloc.stop()
+
+    return {"seconds": round(min(timings), 4), "peak_mb": round(peak / 2**20, 2), **counts}
+
+def run(page_counts: List[int], repeats: int) -> List[Dict]:
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for pages in page_counts:
+            path = os.path.join(directory, f"report-{pages}.docx")
+            with open(path, "wb") as f:
+                f.write(make_docx(pages))
+            row = {"pages": pages, "bytes": os.path.getsize(path)}
+            for name, extract in ENGINES.items():
+                row[name] = measure(extract, path, repeats)
+            results.append(row)
+            print_row(row)
+    return results
+
+def print_row(row: Dict):
+    baseline, streaming = row["python-docx"], row["streaming"]
+    speedup = baseline["seconds"] / streaming["seconds"] if streaming["seconds"] else float("inf")
+    print(
+        f"{row['pages']:>6} pages {row['bytes'] / 2**20:7.2f} MB | "
+        f"python-docx {baseline['seconds']:7.3f}s {baseline['peak_mb']:8.2f} MB peak {baseline['chars']:>9} chars | "
+        f"streaming {streaming['seconds']:7.3f}s {streaming['peak_mb']:8.2f} MB peak {streaming['chars']:>9} chars "
+        f"({streaming['table_rows']} table rows) | {speedup:.1f}x"
+    )
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", default="200,1000,3000", help="Comma-separated report sizes in pages")
+    parser.add_argument("--repeats", type=int, default=3)
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    results = run([int(p) for p in args.pages.split(",") if p.strip()], max(args.repeats, 1))
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
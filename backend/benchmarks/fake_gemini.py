@@ -0,0 +1,242 @@
+"""A local stand-in for the Gemini REST API, for benchmarks and offline testing.
+
+Implements generateContent and streamGenerateContent (SSE) for any model,
+and cachedContents (create, get, update TTL, delete) for context caching,
+with configurable latency, prompt-size-dependent processing time (cached
+content is processed at a fraction of the cost) and injected 429s. Point the backend at it with
+GEMINI_BASE_URL=http://127.0.0.1:<port> and any GEMINI_API_KEY.
+
+    python -m benchmarks.fake_gemini --port 8100 --latency 0.5 --error-rate 0.05
+"""
+import json
+import time
+import uuid
+import random
+import asyncio
+import argparse
+from dataclasses import dataclass
+from datetime import datetime, timezone
+
+from fastapi import FastAPI, Request
+from fastapi.responses import JSONResponse, StreamingResponse
+
+@dataclass
+class FakeGeminiConfig:
+    latency: float = 0.5  # Seconds before the first byte of every response
+    jitter: float = 0.1  # Extra uniform random latency, in seconds
+    chunk_delay: float = 0.02  # Seconds between streamed chunks
+    stream_chunks: int = 20
+    error_rate: float = 0.0  # Fraction of calls answered with 429 RESOURCE_EXHAUSTED
+    retry_after: float = 1.0
+    output_chars: int = 4000  # Approximate length of generated Markdown
+    prefill_per_1k_chars: float = 0.002  # Extra latency per 1000 prompt characters
+    cached_prefill_factor: float = 0.1  # Cached content costs this fraction of inline text
+    caching: bool = True  # When False, creating cached content fails with 400
+
+def iso_time(timestamp: float) -> str:
+    return datetime.fromtimestamp(timestamp, timezone.utc).isoformat().replace("+00:00", "Z")
+
+def error_body(code: int, status: str, message: str) -> dict:
+    return {"error": {"code": code, "message": message, "status": status}}
+
+def prompt_text(body: dict) -> str:
+    parts = []
+    for content in body.get("contents", []):
+        for part in content.get("parts", []):
+            parts.append(part.get("text", ""))
+    return "".join(parts)
+
+def fake_markdown(prompt: str, chars: int) -> str:
+    words = [w for w in prompt.split() if w.isalpha()][:200] or ["lorem", "ipsum", "dolor"]
+    lines = ["# Study Guide", ""]
+    length = 0
+    section = 1
+    while length < chars:
+        line = " ".join(random.choice(words) for _ in range(16))
+        if len(lines) % 8 == 2:
+            line = f"## Section {section}"
+            section += 1
+        lines.append(line)
+        length += len(line) + 1
+    return "\n".join(lines)
+
+def fake_quiz() -> str:
+    return json.dumps([
+        {
+            "question": f"Question {i + 1}?",
+            "options": ["A", "B", "C", "D"],
+            "correct_answer": random.randint(0, 3)
+        }
+        for i in range(10)
+    ])
+
+def response_body(text: str, prompt: str) -> dict:
+    return {
+        "candidates": [{
+            "content": {"parts": [{"text": text}], "role": "model"},
+            "finishReason": "STOP",
+            "index": 0
+        }],
+        "usageMetadata": {
+            "promptTokenCount": len(prompt) // 4,
+            "candidatesTokenCount": len(text) // 4,
+            "totalTokenCount": (len(prompt) + len(text)) // 4
+        },
+        "modelVersion": "fake-gemini"
+    }
+
+def create_app(config: FakeGeminiConfig) -> FastAPI:
+    app = FastAPI()
+    app.state.config = config
+    app.state.stats = {"calls": 0, "streams": 0, "throttled": 0, "models": {},
+                       "caches_created": 0, "cached_calls": 0, "cache_misses": 0}
+    caches = {}  # id -> {"model", "text", "display_name", "created", "expires_at"}
+
+    def throttled() -> JSONResponse:
+        app.state.stats["throttled"] += 1
+        return JSONResponse(
+            error_body(429, "RESOURCE_EXHAUSTED", "Resource has been exhausted (fake)."),
+            status_code=429,
+            headers={"Retry-After": str(config.retry_after)}
+        )
+
+    async def wait(prompt_chars: int = 0, cached_chars: int = 0):
+        prefill = config.prefill_per_1k_chars * (prompt_chars + cached_chars * config.cached_prefill_factor) / 1000
+        await asyncio.sleep(config.latency + random.uniform(0, config.jitter) + prefill)
+
+    def live_cache(cache_id: str):
+        cache = caches.get(cache_id)
+        if cache is None or cache["expires_at"] <= time.time():
+            caches.pop(cache_id, None)
+            return None
+        return cache
+
+    def cache_body(cache_id: str, cache: dict) -> dict:
+        return {
+            "name": f"cachedContents/{cache_id}",
+            "model": cache["model"],
+            "displayName": cache["display_name"],
+            "createTime": iso_time(cache["created"]),
+            "updateTime": iso_time(cache["created"]),
+            "expireTime": iso_time(cache["expires_at"]),
+            "usageMetadata": {"totalTokenCount": len(cache["text"]) // 4}
+        }
+
+    def ttl_seconds(body: dict) -> float:
+        return float(str(body.get("ttl", "3600s")).rstrip("s"))
+
+    @app.post("/{version}/cachedContents")
+    async def create_cache(version: str, request: Request):
+        body = await request.json()
+        text = prompt_text(body)
+        await wait(len(text))
+        if not config.caching:
+            return JSONResponse(error_body(400, "INVALID_ARGUMENT", "Context caching is not supported (fake)."), status_code=400)
+        cache_id = uuid.uuid4().hex[:12]
+        now = time.time()
+        caches[cache_id] = {
+            "model": body.get("model"),
+            "text": text,
+            "display_name": body.get("displayName", ""),
+            "created": now,
+            "expires_at": now + ttl_seconds(body)
+        }
+        app.state.stats["caches_created"] += 1
+        return cache_body(cache_id, caches[cache_id])
+
+    @app.get("/{version}/cachedContents/{cache_id}")
+    async def get_cache(version: str, cache_id: str):
+        cache = live_cache(cache_id)
+        if cache is None:
+            return JSONResponse(error_body(404, "NOT_FOUND", "CachedContent not found (fake)."), status_code=404)
+        return cache_body(cache_id, cache)
+
+    @app.patch("/{version}/cachedContents/{cache_id}")
+    async def update_cache(version: str, cache_id: str, request: Request):
+        cache = live_cache(cache_id)
+        if cache is None:
+            return JSONResponse(error_body(404, "NOT_FOUND", "CachedContent not found (fake)."), status_code=404)
+        cache["expires_at"] = time.time() + ttl_seconds(await request.json())
+        return cache_body(cache_id, cache)
+
+    @app.delete("/{version}/cachedContents/{cache_id}")
+    async def delete_cache(version: str, cache_id: str):
+        caches.pop(cache_id, None)
+        return {}
+
+    def generate(body: dict, prompt: str) -> str:
+        mime = body.get("generationConfig", {}).get("responseMimeType")
+        if mime == "application/json":
+            return fake_quiz()
+        return fake_markdown(prompt, min(config.output_chars, max(len(prompt) // 2, 200)))
+
+    @app.get("/stats")
+    async def stats():
+        return app.state.stats
+
+    @app.post("/{version}/models/{model_action}")
+    async def models(version: str, model_action: str, request: Request):
+        body = await request.json()
+        model, _, action = model_action.partition(":")
+        app.state.stats["calls"] += 1
+        models = app.state.stats["models"]
+        models[model] = models.get(model, 0) + 1
+        prompt = prompt_text(body)
+
+        cached_text = ""
+        if body.get("cachedContent"):
+            cache = live_cache(body["cachedContent"].rsplit("/", 1)[-1])
+            if cache is None:
+                app.state.stats["cache_misses"] += 1
+                return JSONResponse(error_body(404, "NOT_FOUND", "CachedContent not found (fake)."), status_code=404)
+            app.state.stats["cached_calls"] += 1
+            cached_text = cache["text"]
+
+        await wait(len(prompt), len(cached_text))
+        if random.random() < config.error_rate:
+            return throttled()
+
+        text = generate(body, cached_text[:20000] + prompt)
+        if action == "generateContent":
+            return response_body(text, prompt)
+
+        app.state.stats["streams"] += 1
+        size = max(len(text) // max(config.stream_chunks, 1), 1)
+        pieces = [text[i:i + size] for i in range(0, len(text), size)]
+
+        async def events():
+            for piece in pieces:
+                yield f"data: {json.dumps(response_body(piece, prompt))}\r\n\r\n"
+                await asyncio.sleep(config.chunk_delay)
+
+        return StreamingResponse(events(), media_type="text/event-stream")
+
+    return app
+
+def main():
+    parser = argparse.ArgumentParser(description="Run a fake Gemini API server.")
+    parser.add_argument("--host", default="127.0.0.1")
+    parser.add_argument("--port", type=int, default=8100)
+    parser.add_argument("--latency", type=float, default=FakeGeminiConfig.latency)
+    parser.add_argument("--jitter", type=float, default=FakeGeminiConfig.jitter)
+    parser.add_argument("--chunk-delay", type=float, default=FakeGeminiConfig.chunk_delay)
+    parser.add_argument("--error-rate", type=float, default=FakeGeminiConfig.error_rate)
+    parser.add_argument("--retry-after", type=float, default=FakeGeminiConfig.retry_after)
+    parser.add_argument("--prefill-per-1k-chars", type=float, default=FakeGeminiConfig.prefill_per_1k_chars)
+    parser.add_argument("--no-caching", action="store_true", help="Reject cachedContents.create")
+    args = parser.parse_args()
+
+    import uvicorn
+    config = FakeGeminiConfig(
+        latency=args.latency,
+        jitter=args.jitter,
+        chunk_delay=args.chunk_delay,
+        error_rate=args.error_rate,
+        retry_after=args.retry_after,
+        prefill_per_1k_chars=args.prefill_per_1k_chars,
+        caching=not args.no_caching
+    )
+    uvicorn.run(create_app(config), host=args.host, port=args.port, log_level="warning")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,63 @@
+"""Compares tiered PDF extraction with running pdfplumber on every page.
+
+Both runs read the same synthetic text-layer PDFs in a single process, so
+the numbers are per-core costs; PDF_WORKERS spreads either one over more
+cores the same way.
+
+    python -m benchmarks.pdf_extraction --pages 10,50,200
+"""
+import os
+import sys
+import json
+import argparse
+import tempfile
+from collections import Counter
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+import extraction  # noqa: E402
+from benchmarks.documents import make_pdf  # noqa: E402
+
+def measure(path: str, tiered: bool) -> Dict:
+    result = extraction.extract_pdf(path, tiered=tiered)
+    slowest = result.slowest_pages(1)
+    return {
+        "seconds": round(result.elapsed, 4),
+        "chars": len(result.text),
+        "tiers": dict(Counter(result.page_tiers)),
+        "slowest_page_seconds": round(slowest[0][1], 4) if slowest else 0.0,
+    }
+
+def run(page_counts: List[int]) -> List[Dict]:
+    extraction.PDF_WORKERS = 1
+    results = []
+    with tempfile.TemporaryDirectory() as directory:
+        for pages in page_counts:
+            path = os.path.join(directory, f"lecture-{pages}.pdf")
+            with open(path, "wb") as f:
+                f.write(make_pdf(pages))
+            row = {"pages": pages, "pdfplumber": measure(path, tiered=False), "tiered": measure(path, tiered=True)}
+            results.append(row)
+            baseline, tiered = row["pdfplumber"], row["tiered"]
+            tiers = ", ".join(f"{tier} {count}" for tier, count in tiered["tiers"].items())
+            print(
+                f"{pages:>5} pages | pdfplumber {baseline['seconds']:8.3f}s {baseline['chars']:>9} chars | "
+                f"tiered {tiered['seconds']:8.3f}s {tiered['chars']:>9} chars ({tiers}) | "
+                f"{baseline['seconds'] / max(tiered['seconds'], 1e-9):.1f}x"
+            )
+    return results
+
+def main():
+    parser = argparse.ArgumentParser(description=__doc__.splitlines()[0])
+    parser.add_argument("--pages", default="10,50,200", help="Comma-separated document sizes in pages")
+    parser.add_argument("--output", help="Write the results as JSON to this file")
+    args = parser.parse_args()
+
+    results = run([int(p) for p in args.pages.split(",") if p.strip()])
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,298 @@
+"""Offline load test for the API against the fake Gemini server.
+
+Starts benchmarks.fake_gemini and the API (uvicorn main:app) as subprocesses,
+drives /upload, /chat, /quiz, /translate and /share with concurrent clients and
+reports throughput and latency percentiles per scenario. Results are written
+as JSON so two commits can be compared:
+
+    python -m benchmarks.run --output before.json
+    git checkout other-branch
+    python -m benchmarks.run --output after.json --compare before.json
+
+The database is optional: pass --database-url, or --local-postgres to start a
+throwaway server with the pgserver package. Without one, endpoints run with the
+database disabled (nothing is cached or persisted), which is still useful for
+comparing extraction and Gemini call paths.
+"""
+import os
+import sys
+import json
+import time
+import random
+import asyncio
+import argparse
+import tempfile
+import subprocess
+from datetime import datetime, timezone
+from typing import Any, Dict, List, Optional
+
+import httpx
+
+from benchmarks.documents import make_document
+
+BACKEND_DIR = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+SCENARIOS = ["upload", "chat", "quiz", "translate", "share"]
+MIME_TYPES = {
+    "pdf": "application/pdf",
+    "docx": "application/vnd.openxmlformats-officedocument.wordprocessingml.document"
+}
+JOB_POLL_SECONDS = 0.05
+TRANSLATE_PARAGRAPHS = 40
+
+def percentile(sorted_values: List[float], pct: float) -> float:
+    if not sorted_values:
+        return 0.0
+    index = min(len(sorted_values) - 1, max(0, round(pct / 100 * len(sorted_values) + 0.5) - 1))
+    return sorted_values[index]
+
+def summarize(latencies: List[float], errors: int, duration: float) -> Dict[str, Any]:
+    values = sorted(latencies)
+    ms = lambda seconds: round(seconds * 1000, 1)
+    return {
+        "requests": len(values) + errors,
+        "errors": errors,
+        "duration_s": round(duration, 3),
+        "throughput_rps": round(len(values) / duration, 2) if duration else 0.0,
+        "latency_ms": {
+            "p50": ms(percentile(values, 50)),
+            "p90": ms(percentile(values, 90)),
+            "p99": ms(percentile(values, 99)),
+            "mean": ms(sum(values) / len(values)) if values else 0.0,
+            "max": ms(values[-1]) if values else 0.0
+        }
+    }
+
+async def run_load(name: str, requests: int, concurrency: int, call) -> Dict[str, Any]:
+    """Runs call(i) `requests` times with at most `concurrency` in flight."""
+    latencies: List[float] = []
+    failures: List[str] = []
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def one(i: int):
+        async with semaphore:
+            started = time.perf_counter()
+            try:
+                await call(i)
+                latencies.append(time.perf_counter() - started)
+            except Exception as e:
+                failures.append(f"{type(e).__name__}: {e}")
+
+    started = time.perf_counter()
+    await asyncio.gather(*(one(i) for i in range(requests)))
+    result = summarize(latencies, len(failures), time.perf_counter() - started)
+    if failures:
+        result["first_error"] = failures[0][:300]
+    print_result(name, result)
+    return result
+
+def check(response: httpx.Response) -> Dict[str, Any]:
+    if response.status_code >= 400:
+        raise RuntimeError(f"HTTP {response.status_code}: {response.text[:200]}")
+    return response.json()
+
+async def upload_and_wait(client: httpx.AsyncClient, kind: str, pages: int, salt: str) -> Dict[str, Any]:
+    content = await asyncio.to_thread(make_document, kind, pages, salt)
+    files = {"file": (f"bench-{pages}.{kind}", content, MIME_TYPES[kind])}
+    job = check(await client.post("/upload", files=files))
+    while True:
+        job = check(await client.get(f"/jobs/{job['job_id']}"))
+        if job["status"] == "succeeded":
+            return job["result"]
+        if job["status"] in ("failed", "cancelled"):
+            raise RuntimeError(f"Job {job['status']}: {job['error']}")
+        await asyncio.sleep(JOB_POLL_SECONDS)
+
+def translate_text(salt: str) -> str:
+    rng = random.Random(salt)
+    paragraphs = [
+        f"## Topic {i + 1}\n\n" + " ".join(rng.choice(["cell", "energy", "market", "theory", "vector"]) for _ in range(60))
+        for i in range(TRANSLATE_PARAGRAPHS)
+    ]
+    paragraphs.insert(len(paragraphs) // 2, "```python\nprint('code is not translated')\n```")
+    return f"# Notes {salt}\n\n" + "\n\n".join(paragraphs)
+
+async def run_scenarios(base_url: str, args) -> Dict[str, Any]:
+    results: Dict[str, Any] = {}
+    run_id = f"{time.time_ns()}"
+    timeout = httpx.Timeout(args.timeout)
+    limits = httpx.Limits(max_connections=args.concurrency * 2)
+    async with httpx.AsyncClient(base_url=base_url, timeout=timeout, limits=limits) as client:
+        scenarios = args.scenarios.split(",")
+
+        if "upload" in scenarios:
+            for size in args.sizes.split(","):
+                kind, pages = size.split(":")
+                name = f"upload:{kind}:{pages}"
+                results[name] = await run_load(
+                    name, args.upload_requests, args.concurrency,
+                    lambda i, kind=kind, pages=int(pages): upload_and_wait(client, kind, pages, f"{run_id}-{i}")
+                )
+
+        if "chat" in scenarios or "quiz" in scenarios:
+            doc = await upload_and_wait(client, "pdf", args.context_pages, f"{run_id}-context")
+            doc_id = doc["doc_id"]
+
+            async def chat(i: int):
+                check(await client.post("/chat", json={
+                    "doc_id": doc_id,
+                    "messages": [{"role": "user", "content": "Earlier question"}, {"role": "assistant", "content": "Earlier answer"}],
+                    "question": f"Explain section {i % 20 + 1} in simple terms."
+                }))
+
+            async def quiz(i: int):
+                check(await client.post("/quiz", json={"doc_id": doc_id}))
+
+            if "chat" in scenarios:
+                results["chat"] = await run_load("chat", args.requests, args.concurrency, chat)
+            if "quiz" in scenarios:
+                results["quiz"] = await run_load("quiz", args.requests, args.concurrency, quiz)
+
+        if "translate" in scenarios:
+            async def translate(i: int):
+                check(await client.post("/translate", json={"text": translate_text(f"{run_id}-{i}"), "target_language": "Spanish"}))
+            results["translate"] = await run_load("translate", args.requests, args.concurrency, translate)
+
+        if "share" in scenarios:
+            async def share(i: int):
+                created = check(await client.post("/share", json={"content": f"# Shared {run_id}-{i}\n\n" + "notes " * 2000}))
+                if created.get("share_id"):
+                    check(await client.get(f"/share/{created['share_id']}"))
+            results["share"] = await run_load("share", args.requests, args.concurrency, share)
+
+        results["_fake_gemini"] = check(await client.get(f"{args.gemini_url}/stats"))
+    return results
+
+def print_result(name: str, result: Dict[str, Any]):
+    latency = result["latency_ms"]
+    print(
+        f"{name:<20} {result['requests']:>5} req {result['errors']:>4} err "
+        f"{result['throughput_rps']:>8.2f} req/s  p50 {latency['p50']:>8.1f} ms  "
+        f"p99 {latency['p99']:>8.1f} ms"
+    )
+
+def print_comparison(current: Dict[str, Any], baseline: Dict[str, Any]):
+    print(f"\nCompared with {baseline.get('commit', '?')} ({baseline.get('timestamp', '?')}):")
+    for name, result in current["results"].items():
+        before = baseline.get("results", {}).get(name)
+        if name.startswith("_") or not before:
+            continue
+        deltas = []
+        for label, now, then in (
+            ("req/s", result["throughput_rps"], before["throughput_rps"]),
+            ("p50", result["latency_ms"]["p50"], before["latency_ms"]["p50"]),
+            ("p99", result["latency_ms"]["p99"], before["latency_ms"]["p99"]),
+        ):
+            change = (now - then) / then * 100 if then else 0.0
+            deltas.append(f"{label} {then} -> {now} ({change:+.1f}%)")
+        print(f"{name:<20} " + "  ".join(deltas))
+
+def git_commit() -> Optional[str]:
+    try:
+        return subprocess.run(
+            ["git", "rev-parse", "--short", "HEAD"], cwd=BACKEND_DIR, capture_output=True, text=True, check=True
+        ).stdout.strip()
+    except (OSError, subprocess.CalledProcessError):
+        return None
+
+def wait_until_up(url: str, process: subprocess.Popen, seconds: float = 30):
+    deadline = time.monotonic() + seconds
+    while time.monotonic() < deadline:
+        if process.poll() is not None:
+            raise RuntimeError(f"{url} exited with code {process.returncode}")
+        try:
+            httpx.get(url, timeout=1)
+            return
+        except httpx.TransportError:
+            time.sleep(0.1)
+    raise RuntimeError(f"{url} did not start within {seconds} seconds")
+
+def start_local_postgres(data_dir: str) -> str:
+    try:
+        import pgserver
+    except ImportError:
+        sys.exit("--local-postgres needs the pgserver package (pip install pgserver)")
+    return pgserver.get_server(data_dir, cleanup_mode="stop").get_uri()
+
+def main():
+    parser = argparse.ArgumentParser(description="Benchmark the API against a fake Gemini server.")
+    parser.add_argument("--scenarios", default=",".join(SCENARIOS))
+    parser.add_argument("--sizes", default="pdf:5,pdf:50,docx:20", help="Upload documents as kind:pages, comma separated")
+    parser.add_argument("--concurrency", type=int, default=8)
+    parser.add_argument("--requests", type=int, default=50, help="Requests per chat/quiz/translate/share scenario")
+    parser.add_argument("--upload-requests", type=int, default=16, help="Uploads per document size")
+    parser.add_argument("--context-pages", type=int, default=30, help="Pages in the document used for /chat and /quiz")
+    parser.add_argument("--timeout", type=float, default=300)
+    parser.add_argument("--api-port", type=int, default=8200)
+    parser.add_argument("--gemini-port", type=int, default=8100)
+    parser.add_argument("--latency", type=float, default=0.5, help="Fake Gemini latency per call, in seconds")
+    parser.add_argument("--chunk-delay", type=float, default=0.02, help="Fake Gemini delay between streamed chunks")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Fraction of Gemini calls answered with 429")
+    parser.add_argument("--prefill-per-1k-chars", type=float, default=0.002, help="Fake Gemini latency per 1000 prompt characters")
+    parser.add_argument("--no-caching", action="store_true", help="Make the fake Gemini reject context caches")
+    parser.add_argument("--gemini-rpm", default="6000", help="GEMINI_RPM for the API under test")
+    parser.add_argument("--database-url", default=None)
+    parser.add_argument("--local-postgres", action="store_true")
+    parser.add_argument("--output", default=None, help="Write results as JSON to this file")
+    parser.add_argument("--compare", default=None, help="Print deltas against an earlier JSON result")
+    args = parser.parse_args()
+    args.gemini_url = f"http://127.0.0.1:{args.gemini_port}"
+
+    database_url = args.database_url
+    pg_dir = None
+    if args.local_postgres:
+        pg_dir = tempfile.mkdtemp(prefix="bench-pg-")
+        database_url = start_local_postgres(pg_dir)
+
+    env = dict(os.environ)
+    env.update({
+        "GEMINI_API_KEY": "benchmark",
+        "GEMINI_BASE_URL": args.gemini_url,
+        "GEMINI_RPM": args.gemini_rpm,
+        "GEMINI_BURST": env.get("GEMINI_BURST", "100"),
+        "DATABASE_URL": database_url or ""
+    })
+    if not database_url:
+        print("No database configured; running with persistence disabled.")
+
+    gemini_server = subprocess.Popen(
+        [sys.executable, "-m", "benchmarks.fake_gemini", "--port", str(args.gemini_port),
+         "--latency", str(args.latency), "--chunk-delay", str(args.chunk_delay), "--error-rate", str(args.error_rate),
+         "--prefill-per-1k-chars", str(args.prefill_per_1k_chars)] + (["--no-caching"] if args.no_caching else []),
+        cwd=BACKEND_DIR
+    )
+    api_server = None
+    try:
+        wait_until_up(f"{args.gemini_url}/stats", gemini_server)
+        api_server = subprocess.Popen(
+            [sys.executable, "-m", "uvicorn", "main:app", "--port", str(args.api_port), "--log-level", "warning"],
+            cwd=BACKEND_DIR, env=env, stdout=subprocess.DEVNULL
+        )
+        api_url = f"http://127.0.0.1:{args.api_port}"
+        wait_until_up(api_url, api_server)
+        results = asyncio.run(run_scenarios(api_url, args))
+    finally:
+        for process in (api_server, gemini_server):
+            if process is not None:
+                process.terminate()
+                process.wait()
+
+    report = {
+        "commit": git_commit(),
+        "timestamp": datetime.now(timezone.utc).isoformat(timespec="seconds"),
+        "config": {
+            key: value for key, value in vars(args).items()
+            if key not in ("output", "compare", "database_url")
+        },
+        "database": bool(database_url),
+        "results": results
+    }
+    if args.output:
+        with open(args.output, "w") as f:
+            json.dump(report, f, indent=2)
+        print(f"Results written to {args.output}")
+    if args.compare:
+        with open(args.compare) as f:
+            print_comparison(report, json.load(f))
+
+if __name__ == "__main__":
+    main()
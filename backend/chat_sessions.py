@@ -0,0 +1,187 @@
+"""Server-side chat history, compacted to a token budget.
+
+Each (doc_id, session_id) conversation is a JSON file in a directory shared
+by all uvicorn workers, so clients send only the new question. When the
+history outgrows CHAT_HISTORY_TOKENS, the oldest turns are folded into a
+rolling summary by a background model call; the last CHAT_RECENT_MESSAGES
+messages are always kept verbatim. Until a fold lands, the prompt simply
+leaves out the oldest turns that do not fit.
+"""
+import os
+import re
+import time
+import uuid
+import asyncio
+import tempfile
+import threading
+from typing import Awaitable, Callable, List, Literal, Optional
+
+from pydantic import BaseModel, model_validator
+
+from metrics import log, span
+
+CHAT_SESSION_DIR = os.getenv("CHAT_SESSION_DIR") or os.path.join(tempfile.gettempdir(), "docai_chats")
+CHAT_HISTORY_TOKENS = int(os.getenv("CHAT_HISTORY_TOKENS", "1500"))
+CHAT_RECENT_MESSAGES = int(os.getenv("CHAT_RECENT_MESSAGES", "6"))
+CHARS_PER_TOKEN = 4  # Rough average for English text with Gemini's tokenizer
+# Temp files written by put() keep their creation mtime until renamed, so only old ones are removed
+STALE_TEMP_FILE_SECONDS = 3600
+
+SESSION_ID_RE = re.compile(r'^[0-9a-f]{32}$')
+SPEAKERS = {"user": "Student", "assistant": "Tutor"}
+
+class ChatMessage(BaseModel):
+    role: Literal["user", "assistant"]
+    content: str
+
+    @model_validator(mode="before")
+    @classmethod
+    def accept_legacy_shape(cls, data):
+        # Older clients sent {"role": "user" | "assistant" | "model", "parts": [text, ...]}
+        if isinstance(data, dict) and "content" not in data and "parts" in data:
+            data = {"role": data.get("role"), "content": " ".join(str(part) for part in data["parts"] or [])}
+        if isinstance(data, dict) and data.get("role") == "model":
+            data = {**data, "role": "assistant"}
+        return data
+
+class ChatSession(BaseModel):
+    summary: str = ""
+    messages: List[ChatMessage] = []
+
+def estimate_tokens(text: str) -> int:
+    return len(text) // CHARS_PER_TOKEN + 1
+
+def format_message(message: ChatMessage) -> str:
+    return f"{SPEAKERS[message.role]}: {message.content}"
+
+def format_history(session: ChatSession, budget_tokens: int = CHAT_HISTORY_TOKENS) -> str:
+    """Compact transcript for the prompt: the summary, then as many recent messages as fit."""
+    lines = []
+    remaining = budget_tokens
+    if session.summary:
+        lines.append(f"Summary of earlier conversation: {session.summary}")
+        remaining -= estimate_tokens(lines[0])
+    recent = []
+    for message in reversed(session.messages):
+        line = format_message(message)
+        remaining -= estimate_tokens(line)
+        if remaining < 0 and recent:
+            break
+        recent.append(line)
+    return "\n".join(lines + recent[::-1])
+
+def history_tokens(session: ChatSession) -> int:
+    return estimate_tokens(session.summary) + sum(estimate_tokens(format_message(m)) for m in session.messages)
+
+def needs_compaction(session: ChatSession, budget_tokens: int = CHAT_HISTORY_TOKENS) -> bool:
+    return len(session.messages) > CHAT_RECENT_MESSAGES and history_tokens(session) > budget_tokens
+
+def build_summary_prompt(summary: str, messages: List[ChatMessage], budget_tokens: int) -> str:
+    transcript = "\n".join(format_message(m) for m in messages)
+    earlier = f"Summary so far:\n{summary}\n\n" if summary else ""
+    return f"""Update the running summary of a tutoring conversation about a document.
+Keep the facts, definitions and answers the student may refer back to, and any
+preferences they stated. Write plain prose, at most {budget_tokens * CHARS_PER_TOKEN // 12} words.
+
+{earlier}New messages:
+{transcript}
+
+Updated summary:"""
+
+def new_session_id() -> str:
+    return uuid.uuid4().hex
+
+class ChatSessionStore:
+    """Conversations on disk, expiring with the same TTL as their document."""
+
+    def __init__(self, ttl_seconds: float, directory: str = CHAT_SESSION_DIR):
+        self.directory = directory
+        self.ttl_seconds = ttl_seconds
+        self._lock = threading.Lock()
+        self._compacting = set()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, doc_id: str, session_id: str) -> str:
+        return os.path.join(self.directory, f"{doc_id}.{session_id}.json")
+
+    @staticmethod
+    def is_valid_id(session_id: str) -> bool:
+        # Session ids come from clients and become file names
+        return bool(SESSION_ID_RE.match(session_id))
+
+    def get(self, doc_id: str, session_id: str) -> Optional[ChatSession]:
+        if not self.is_valid_id(session_id):
+            return None
+        path = self._path(doc_id, session_id)
+        try:
+            if os.stat(path).st_mtime <= time.time():
+                return None
+            with open(path, "rb") as f:
+                return ChatSession.model_validate_json(f.read())
+        except FileNotFoundError:
+            return None
+
+    def put(self, doc_id: str, session_id: str, session: ChatSession):
+        expires_at = time.time() + self.ttl_seconds
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "w", encoding="utf-8") as f:
+            f.write(session.model_dump_json())
+        os.utime(tmp_path, (expires_at, expires_at))
+        os.replace(tmp_path, self._path(doc_id, session_id))
+
+    def append(self, doc_id: str, session_id: str, messages: List[ChatMessage],
+               seed: Optional[List[ChatMessage]] = None) -> ChatSession:
+        """Adds messages to a session, starting it from `seed` if it does not exist yet."""
+        with self._lock:
+            session = self.get(doc_id, session_id) or ChatSession(messages=list(seed or []))
+            session.messages.extend(messages)
+            self.put(doc_id, session_id, session)
+            return session
+
+    async def compact(self, doc_id: str, session_id: str,
+                      generate: Callable[[str], Awaitable[str]],
+                      budget_tokens: int = CHAT_HISTORY_TOKENS):
+        """Folds the oldest messages into the summary if the session is over budget."""
+        key = (doc_id, session_id)
+        if key in self._compacting:
+            return
+        self._compacting.add(key)
+        try:
+            session = await asyncio.to_thread(self.get, doc_id, session_id)
+            if session is None or not needs_compaction(session, budget_tokens):
+                return
+            folded = session.messages[:-CHAT_RECENT_MESSAGES]
+            try:
+                with span("chat_compaction", messages=len(folded)):
+                    summary = (await generate(build_summary_prompt(session.summary, folded, budget_tokens))).strip()
+            except Exception as e:
+                # The session stays as it is; the prompt keeps dropping the oldest turns until a later fold works
+                log(f"Could not compact chat session {session_id} of {doc_id}: {e}")
+                return
+            # Summaries must leave room for recent turns even if the model ignored the length limit
+            summary = summary[:budget_tokens * CHARS_PER_TOKEN // 2]
+            await asyncio.to_thread(self._replace_prefix, doc_id, session_id, folded, summary)
+        finally:
+            self._compacting.discard(key)
+
+    def _replace_prefix(self, doc_id: str, session_id: str, folded: List[ChatMessage], summary: str):
+        with self._lock:
+            current = self.get(doc_id, session_id)
+            # Messages appended while the summary was being written are kept
+            if current is None or current.messages[:len(folded)] != folded:
+                return
+            self.put(doc_id, session_id, ChatSession(summary=summary, messages=current.messages[len(folded):]))
+
+    def purge_expired(self) -> int:
+        now = time.time()
+        removed = 0
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            cutoff = now - STALE_TEMP_FILE_SECONDS if name.endswith(".tmp") else now
+            try:
+                if os.stat(path).st_mtime <= cutoff:
+                    os.remove(path)
+                    removed += 1
+            except FileNotFoundError:
+                pass
+        return removed
@@ -0,0 +1,154 @@
+"""Gemini context caches for long documents, one per (doc_id, model).
+
+The first /chat or /quiz call for a long document uploads its text once as
+cached content; later calls send only the question and reference the cache,
+which cuts input tokens and time to first token. A cache never outlives its
+document: its TTL is capped at the document's remaining lifetime and is
+extended, in the background, when a document that is still in use gets close
+to it. If a cache cannot be created (small model quota, unsupported model,
+API outage) callers get None and send the inline prompt; creation is not
+retried for CONTEXT_CACHE_RETRY_SECONDS.
+
+Handles are kept per process, so each uvicorn worker creates its own cache
+for a document it serves.
+"""
+import os
+import time
+import asyncio
+from typing import Dict, NamedTuple, Optional, Tuple, Union
+
+from metrics import cache_lookup, log
+
+CONTEXT_CACHE_ENABLED = os.getenv("CONTEXT_CACHE_ENABLED", "1") != "0"
+# Below this size resending the text costs less than a cache; above the max it would not fit
+CONTEXT_CACHE_MIN_CHARS = int(os.getenv("CONTEXT_CACHE_MIN_CHARS", "32000"))
+CONTEXT_CACHE_MAX_CHARS = int(os.getenv("CONTEXT_CACHE_MAX_CHARS", "2000000"))
+CONTEXT_CACHE_TTL_SECONDS = int(os.getenv("CONTEXT_CACHE_TTL_SECONDS", "3600"))
+CONTEXT_CACHE_RETRY_SECONDS = 600
+
+# Extend a cache in use once less than this is left, and never hand out one about to expire
+REFRESH_WINDOW_SECONDS = 300
+EXPIRY_MARGIN_SECONDS = 30
+MIN_TTL_SECONDS = 120
+
+CACHE_SYSTEM_NOTE = "The following is the full text of a document a student uploaded. Questions about it follow."
+
+class CacheHandle(NamedTuple):
+    name: str
+    expires_at: float
+
+class Unavailable(NamedTuple):
+    until: float
+
+Key = Tuple[str, str]
+
+class ContextCache:
+    def __init__(self, gemini, ttl_seconds: int = CONTEXT_CACHE_TTL_SECONDS,
+                 min_chars: int = CONTEXT_CACHE_MIN_CHARS, max_chars: int = CONTEXT_CACHE_MAX_CHARS,
+                 enabled: bool = CONTEXT_CACHE_ENABLED):
+        self.gemini = gemini
+        self.ttl_seconds = ttl_seconds
+        self.min_chars = min_chars
+        self.max_chars = max_chars
+        self.enabled = enabled
+        self._entries: Dict[Key, Union[CacheHandle, Unavailable]] = {}
+        self._locks: Dict[Key, asyncio.Lock] = {}
+        self._refreshing = {}  # key -> task extending that cache's TTL
+
+    def applies_to(self, text: str) -> bool:
+        return self.enabled and self.min_chars <= len(text) <= self.max_chars
+
+    async def get(self, doc_id: str, text: str, model: str, doc_expires_at: Optional[float]) -> Optional[str]:
+        """Returns a cache name for the document, creating the cache if needed, or None to send it inline."""
+        if not self.applies_to(text) or doc_expires_at is None:
+            return None
+        key = (doc_id, model)
+        handle = self._usable(key, doc_expires_at)
+        if handle is not None:
+            cache_lookup("context", hit=True)
+            return handle.name
+        if isinstance(self._entries.get(key), Unavailable):
+            return None
+
+        cache_lookup("context", hit=False)
+        lock = self._locks.setdefault(key, asyncio.Lock())
+        async with lock:
+            # Concurrent questions about a new document share one cache
+            handle = self._usable(key, doc_expires_at)
+            if handle is None and not isinstance(self._entries.get(key), Unavailable):
+                handle = await self._create(key, text, doc_expires_at)
+        return handle.name if handle else None
+
+    def invalidate(self, doc_id: str, model: str):
+        """Forgets a cache the provider no longer recognizes (e.g. expired early)."""
+        self._entries.pop((doc_id, model), None)
+
+    def _usable(self, key: Key, doc_expires_at: float) -> Optional[CacheHandle]:
+        entry = self._entries.get(key)
+        if isinstance(entry, Unavailable) and entry.until <= time.time():
+            self._entries.pop(key, None)
+            return None
+        if not isinstance(entry, CacheHandle):
+            return None
+        now = time.time()
+        if entry.expires_at <= now + EXPIRY_MARGIN_SECONDS:
+            self._entries.pop(key, None)
+            return None
+        if entry.expires_at - now < REFRESH_WINDOW_SECONDS and doc_expires_at - entry.expires_at > MIN_TTL_SECONDS:
+            self._refresh(key, entry, doc_expires_at)
+        return entry
+
+    def _ttl(self, doc_expires_at: float) -> int:
+        return int(min(self.ttl_seconds, doc_expires_at - time.time()))
+
+    async def _create(self, key: Key, text: str, doc_expires_at: float) -> Optional[CacheHandle]:
+        ttl = self._ttl(doc_expires_at)
+        if ttl < MIN_TTL_SECONDS:
+            return None
+        doc_id, model = key
+        try:
+            cached = await self.gemini.create_cache(model, [CACHE_SYSTEM_NOTE, text], ttl, display_name=doc_id)
+        except Exception as e:
+            log(f"Context cache unavailable for {doc_id} on {model}, sending text inline: {e}")
+            self._entries[key] = Unavailable(time.time() + CONTEXT_CACHE_RETRY_SECONDS)
+            return None
+        handle = CacheHandle(cached.name, time.time() + ttl)
+        self._entries[key] = handle
+        log(f"Created context cache {cached.name} for {doc_id} ({len(text)} characters, {ttl}s).")
+        return handle
+
+    async def _extend(self, key: Key, handle: CacheHandle, doc_expires_at: float):
+        ttl = self._ttl(doc_expires_at)
+        try:
+            await self.gemini.extend_cache(handle.name, ttl)
+        except Exception as e:
+            log(f"Could not extend context cache {handle.name}: {e}")
+            return
+        if self._entries.get(key) == handle:
+            self._entries[key] = CacheHandle(handle.name, time.time() + ttl)
+
+    def _refresh(self, key: Key, handle: CacheHandle, doc_expires_at: float):
+        if key in self._refreshing:
+            return
+        task = asyncio.create_task(self._extend(key, handle, doc_expires_at))
+        self._refreshing[key] = task
+        task.add_done_callback(lambda _: self._refreshing.pop(key, None))
+
+    def purge_expired(self) -> int:
+        now = time.time()
+        expired = [
+            key for key, entry in self._entries.items()
+            if (entry.expires_at if isinstance(entry, CacheHandle) else entry.until) <= now
+        ]
+        for key in expired:
+            del self._entries[key]
+        for key in [k for k, lock in self._locks.items() if k not in self._entries and not lock.locked()]:
+            del self._locks[key]
+        return len(expired)
+
+    async def close(self):
+        """Deletes this process's caches so they stop accruing storage cost after shutdown."""
+        handles = [entry for entry in self._entries.values() if isinstance(entry, CacheHandle)]
+        self._entries.clear()
+        if handles:
+            await asyncio.gather(*(self.gemini.delete_cache(h.name) for h in handles), return_exceptions=True)
@@ -1,9 +1,12 @@
 import psycopg2
 import psycopg2.extras
-import json
-import uuid
+import psycopg2.pool
 import os
-from datetime import datetime
+import zlib
+import hashlib
+import time
+import threading
+from contextlib import contextmanager
 from dotenv import load_dotenv
 
 load_dotenv()
@@ -11,23 +14,177 @@ load_dotenv()
 # We depend on the DATABASE_URL environment variable provided by Render/Neon
 DATABASE_URL = os.getenv("DATABASE_URL")
 
+# Upload cache eviction limits (entries older than the max age, or beyond the
+# total size budget in least-recently-used order, are deleted on every save)
+UPLOAD_CACHE_MAX_AGE_DAYS = int(os.getenv("UPLOAD_CACHE_MAX_AGE_DAYS", "30"))
+UPLOAD_CACHE_MAX_MB = int(os.getenv("UPLOAD_CACHE_MAX_MB", "500"))
+TRANSLATION_CACHE_MAX_AGE_DAYS = int(os.getenv("TRANSLATION_CACHE_MAX_AGE_DAYS", "30"))
+
+# Connection pool limits. Connections idle longer than the health-check interval
+# are pinged before reuse, since Neon/Render drop idle connections.
+DB_POOL_MIN = int(os.getenv("DB_POOL_MIN", "1"))
+DB_POOL_MAX = int(os.getenv("DB_POOL_MAX", "10"))
+DB_POOL_HEALTHCHECK_SECONDS = float(os.getenv("DB_POOL_HEALTHCHECK_SECONDS", "30"))
+
+_pool = None
+_pool_lock = threading.Lock()
+# psycopg2 pools raise instead of waiting when exhausted, so checkouts wait on this first
+_pool_slots = threading.BoundedSemaphore(DB_POOL_MAX)
+_last_used = {}
+
+def init_pool():
+    """Creates the shared connection pool (once) and opens the minimum number of connections."""
+    global _pool
+    if not DATABASE_URL:
+        return None
+    with _pool_lock:
+        if _pool is None:
+            _pool = psycopg2.pool.ThreadedConnectionPool(
+                DB_POOL_MIN,
+                DB_POOL_MAX,
+                DATABASE_URL,
+                # Return dictionary-like cursor similar to sqlite3.Row
+                cursor_factory=psycopg2.extras.DictCursor,
+                keepalives=1,
+                keepalives_idle=30
+            )
+            print(f"Database pool ready ({DB_POOL_MIN}-{DB_POOL_MAX} connections).")
+    return _pool
+
+def close_pool():
+    global _pool
+    with _pool_lock:
+        if _pool is not None:
+            _pool.closeall()
+            _pool = None
+            _last_used.clear()
+            print("Database pool closed.")
+
+def _is_healthy(conn):
+    if conn.closed:
+        return False
+    if time.monotonic() - _last_used.get(id(conn), 0) < DB_POOL_HEALTHCHECK_SECONDS:
+        return True
+    try:
+        with conn.cursor() as c:
+            c.execute('SELECT 1')
+        conn.rollback()
+        return True
+    except psycopg2.Error:
+        return False
+
+@contextmanager
 def get_db_connection():
+    """Borrows a pooled connection, committing on success and rolling back on error.
+
+    Yields None when DATABASE_URL is not configured.
+    """
     if not DATABASE_URL:
         print("Warning: DATABASE_URL not set. Database connection failed.")
-        return None
-        
-    conn = psycopg2.connect(DATABASE_URL)
-    # Return dictionary-like cursor similar to sqlite3.Row
-    conn.cursor_factory = psycopg2.extras.DictCursor
-    return conn
-
-def init_db():
-    conn = get_db_connection()
-    if not conn: return
-    c = conn.cursor()
-    
-    # Create reviews table
-    c.execute('''
+        yield None
+        return
+
+    pool = init_pool()
+    _pool_slots.acquire()
+    conn = None
+    try:
+        conn = pool.getconn()
+        if not _is_healthy(conn):
+            pool.putconn(conn, close=True)
+            conn = pool.getconn()
+        try:
+            yield conn
+            conn.commit()
+        except Exception:
+            if not conn.closed:
+                conn.rollback()
+            raise
+    finally:
+        if conn is not None:
+            _last_used[id(conn)] = time.monotonic()
+            pool.putconn(conn, close=conn.closed != 0)
+        _pool_slots.release()
+
+# --- Queries (shared with async_database.py) ---
+
+# API workers LISTEN on this channel to invalidate their cached approved-reviews list
+REVIEWS_CHANNEL = "reviews_changed"
+NOTIFY_REVIEWS_CHANGED_SQL = f"NOTIFY {REVIEWS_CHANNEL}"
+
+ADD_REVIEW_SQL = 'INSERT INTO reviews (name, role, content, rating, is_approved) VALUES (%s, %s, %s, %s, FALSE) RETURNING id'
+GET_REVIEWS_SQL = 'SELECT * FROM reviews WHERE is_approved = TRUE ORDER BY created_at DESC'
+# Shared summaries are keyed by a hash of their content, so sharing the same
+# study guide twice returns the existing id. Rows written before that keep
+# their UUID id and uncompressed `content`.
+SAVE_SUMMARY_SQL = 'INSERT INTO shared_summaries (id, content_gz) VALUES (%s, %s) ON CONFLICT (id) DO NOTHING'
+GET_SUMMARY_SQL = 'SELECT content, content_gz FROM shared_summaries WHERE id = %s'
+ADD_CONTACT_SUBMISSION_SQL = 'INSERT INTO contact_submissions (id, name, email, subject, description, timestamp, issue_resolved) VALUES (%s, %s, %s, %s, %s, %s, %s)'
+
+GET_CACHED_UPLOAD_SQL = '''
+    UPDATE upload_cache SET last_accessed = CURRENT_TIMESTAMP
+    WHERE content_hash = %s AND created_at > CURRENT_TIMESTAMP - make_interval(days => %s)
+    RETURNING extracted_text, study_guide
+'''
+SAVE_CACHED_UPLOAD_SQL = '''
+    INSERT INTO upload_cache (content_hash, extracted_text, study_guide, size_bytes)
+    VALUES (%s, %s, %s, %s)
+    ON CONFLICT (content_hash) DO UPDATE SET
+        extracted_text = EXCLUDED.extracted_text,
+        study_guide = COALESCE(EXCLUDED.study_guide, upload_cache.study_guide),
+        size_bytes = EXCLUDED.size_bytes,
+        last_accessed = CURRENT_TIMESTAMP
+'''
+PRUNE_EXPIRED_UPLOADS_SQL = 'DELETE FROM upload_cache WHERE created_at <= CURRENT_TIMESTAMP - make_interval(days => %s)'
+PRUNE_OVERSIZE_UPLOADS_SQL = '''
+    DELETE FROM upload_cache WHERE content_hash IN (
+        SELECT content_hash FROM (
+            SELECT content_hash,
+                   SUM(size_bytes) OVER (ORDER BY last_accessed DESC) AS running_bytes
+            FROM upload_cache
+        ) ranked
+        WHERE running_bytes > %s
+    )
+'''
+
+GET_CACHED_TRANSLATION_SQL = '''
+    SELECT translated_text FROM translation_cache
+    WHERE content_hash = %s AND language = %s AND created_at > CURRENT_TIMESTAMP - make_interval(days => %s)
+'''
+SAVE_CACHED_TRANSLATION_SQL = '''
+    INSERT INTO translation_cache (content_hash, language, translated_text) VALUES (%s, %s, %s)
+    ON CONFLICT (content_hash, language) DO UPDATE SET
+        translated_text = EXCLUDED.translated_text,
+        created_at = CURRENT_TIMESTAMP
+'''
+PRUNE_EXPIRED_TRANSLATIONS_SQL = 'DELETE FROM translation_cache WHERE created_at <= CURRENT_TIMESTAMP - make_interval(days => %s)'
+
+def summary_share_id(content):
+    return hashlib.sha256(content.encode('utf-8')).hexdigest()[:32]
+
+def compress_summary(content):
+    return zlib.compress(content.encode('utf-8'), 6)
+
+def summary_content(row):
+    """Returns the markdown of a shared_summaries row, compressed or not."""
+    if row['content_gz'] is not None:
+        return zlib.decompress(bytes(row['content_gz'])).decode('utf-8')
+    return row['content']
+
+def cached_upload_params(content_hash, extracted_text, study_guide):
+    # Postgres TEXT cannot hold NUL characters, which some PDFs produce
+    extracted_text = extracted_text.replace('\x00', '')
+    size_bytes = len(extracted_text.encode('utf-8')) + len((study_guide or '').encode('utf-8'))
+    return (content_hash, extracted_text, study_guide, size_bytes)
+
+# --- Schema migrations ---
+
+# Applied in order, each at most once, recording its version in schema_version.
+# Version 1 brings databases created before versioning (any mix of the old
+# tables and columns) up to date, so every statement in it is idempotent.
+# Never edit a released migration; append a new one.
+MIGRATIONS = [
+    (1, [
+        '''
         CREATE TABLE IF NOT EXISTS reviews (
             id SERIAL PRIMARY KEY,
             name VARCHAR(255) NOT NULL,
@@ -37,93 +194,27 @@ def init_db():
             is_approved BOOLEAN DEFAULT FALSE,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
-    ''')
-    
-    # Create shared_summaries table
-    c.execute('''
+        ''',
+        'ALTER TABLE reviews ADD COLUMN IF NOT EXISTS is_approved BOOLEAN DEFAULT FALSE',
+        '''
         CREATE TABLE IF NOT EXISTS shared_summaries (
             id VARCHAR(255) PRIMARY KEY,
             content TEXT NOT NULL,
             created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
         )
-    ''')
-    
-    conn.commit()
-    conn.close()
-    
-    # Auto-migrate for existing databases
-    migrate_reviews_table()
-    init_contact_table()
-    print("Database initialized.")
-
-def migrate_reviews_table():
-    """Adds is_approved column if it doesn't exist."""
-    conn = get_db_connection()
-    if not conn: return
-    c = conn.cursor()
-    try:
-        # Check if column exists in postgres
-        c.execute("""
-            SELECT column_name 
-            FROM information_schema.columns 
-            WHERE table_name='reviews' and column_name='is_approved';
-        """)
-        if not c.fetchone():
-            print("Migrating reviews table: adding is_approved column...")
-            c.execute("ALTER TABLE reviews ADD COLUMN is_approved BOOLEAN DEFAULT FALSE")
-            conn.commit()
-    except Exception as e:
-        print(f"Migration failed: {e}")
-    finally:
-        conn.close()
-
-def add_review(name, role, content, rating):
-    conn = get_db_connection()
-    if not conn: return None
-    c = conn.cursor()
-    
-    c.execute('INSERT INTO reviews (name, role, content, rating, is_approved) VALUES (%s, %s, %s, %s, FALSE) RETURNING id',
-              (name, role, content, rating))
-    conn.commit()
-    review_id = c.fetchone()[0]
-    conn.close()
-    return review_id
-
-def get_reviews():
-    conn = get_db_connection()
-    if not conn: return []
-    c = conn.cursor()
-    # Only fetch approved reviews
-    c.execute('SELECT * FROM reviews WHERE is_approved = TRUE ORDER BY created_at DESC')
-    reviews = c.fetchall()
-    conn.close()
-    return [dict(row) for row in reviews]
-
-def save_summary(content):
-    conn = get_db_connection()
-    if not conn: return None
-    c = conn.cursor()
-    share_id = str(uuid.uuid4())
-    c.execute('INSERT INTO shared_summaries (id, content) VALUES (%s, %s)',
-              (share_id, content))
-    conn.commit()
-    conn.close()
-    return share_id
-
-def get_summary(share_id):
-    conn = get_db_connection()
-    if not conn: return None
-    c = conn.cursor()
-    c.execute('SELECT content FROM shared_summaries WHERE id = %s', (share_id,))
-    row = c.fetchone()
-    conn.close()
-    return row['content'] if row else None
-
-def init_contact_table():
-    conn = get_db_connection()
-    if not conn: return
-    c = conn.cursor()
-    c.execute('''
+        ''',
+        # Keyed by SHA-256 of the uploaded file bytes
+        '''
+        CREATE TABLE IF NOT EXISTS upload_cache (
+            content_hash CHAR(64) PRIMARY KEY,
+            extracted_text TEXT NOT NULL,
+            study_guide TEXT,
+            size_bytes BIGINT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            last_accessed TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+        )
+        ''',
+        '''
         CREATE TABLE IF NOT EXISTS contact_submissions (
             id VARCHAR(255) PRIMARY KEY,
             name VARCHAR(255) NOT NULL,
@@ -133,38 +224,38 @@ def init_contact_table():
             timestamp TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
             issue_resolved INTEGER DEFAULT 0
         )
-    ''')
-    conn.commit()
-    conn.close()
-    
-    # Run migration if needed
-    migrate_contact_table()
-
-def migrate_contact_table():
-    """Adds issue_resolved column if it doesn't exist."""
-    conn = get_db_connection()
-    if not conn: return
-    c = conn.cursor()
-    try:
-        c.execute("""
-            SELECT column_name 
-            FROM information_schema.columns 
-            WHERE table_name='contact_submissions' and column_name='issue_resolved';
-        """)
-        if not c.fetchone():
-            print("Migrating contact_submissions table: adding issue_resolved column...")
-            c.execute("ALTER TABLE contact_submissions ADD COLUMN issue_resolved INTEGER DEFAULT 0")
-            conn.commit()
-    except Exception as e:
-        print(f"Migration failed: {e}")
-    finally:
-        conn.close()
-
-def add_contact_submission(id, name, email, subject, description, timestamp, issue_resolved=0):
-    conn = get_db_connection()
-    if not conn: return
-    c = conn.cursor()
-    c.execute('INSERT INTO contact_submissions (id, name, email, subject, description, timestamp, issue_resolved) VALUES (%s, %s, %s, %s, %s, %s, %s)',
-              (id, name, email, subject, description, timestamp, issue_resolved))
-    conn.commit()
-    conn.close()
+        ''',
+        'ALTER TABLE contact_submissions ADD COLUMN IF NOT EXISTS issue_resolved INTEGER DEFAULT 0',
+    ]),
+    # Compressed, content-addressed shared summaries; legacy rows keep `content`
+    (2, [
+        'ALTER TABLE shared_summaries ADD COLUMN IF NOT EXISTS content_gz BYTEA',
+        'ALTER TABLE shared_summaries ALTER COLUMN content DROP NOT NULL',
+    ]),
+    # Keyed by SHA-256 of the source text and the target language
+    (3, [
+        '''
+        CREATE TABLE IF NOT EXISTS translation_cache (
+            content_hash CHAR(64) NOT NULL,
+            language VARCHAR(64) NOT NULL,
+            translated_text TEXT NOT NULL,
+            created_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP,
+            PRIMARY KEY (content_hash, language)
+        )
+        ''',
+    ]),
+]
+
+CREATE_SCHEMA_VERSION_SQL = '''
+    CREATE TABLE IF NOT EXISTS schema_version (
+        version INTEGER PRIMARY KEY,
+        applied_at TIMESTAMP DEFAULT CURRENT_TIMESTAMP
+    )
+'''
+GET_SCHEMA_VERSION_SQL = 'SELECT COALESCE(MAX(version), 0) AS version FROM schema_version'
+RECORD_SCHEMA_VERSION_SQL = 'INSERT INTO schema_version (version) VALUES (%s)'
+# Serializes migrations when several workers boot at once (released at commit)
+LOCK_MIGRATIONS_SQL = 'SELECT pg_advisory_xact_lock(5150001)'
+
+def pending_migrations(current_version):
+    return [(version, statements) for version, statements in MIGRATIONS if version > current_version]
@@ -0,0 +1,153 @@
+"""Memory-bounded store for extracted document texts.
+
+Texts are kept in a per-process LRU with an explicit memory budget and are
+written through to gzip files in a directory shared by all uvicorn workers,
+so any worker can serve a doc_id and evicted texts can be reloaded from disk.
+"""
+import os
+import re
+import sys
+import gzip
+import time
+import tempfile
+import threading
+from collections import OrderedDict
+from typing import Optional, Tuple
+
+DOCUMENT_STORE_DIR = os.getenv("DOCUMENT_STORE_DIR", os.path.join(tempfile.gettempdir(), "docai_documents"))
+DOCUMENT_STORE_MEMORY_MB = int(os.getenv("DOCUMENT_STORE_MEMORY_MB", "256"))
+DOCUMENT_TTL_HOURS = float(os.getenv("DOCUMENT_TTL_HOURS", "24"))
+# Temp files keep their creation mtime until put() stamps the expiry, so only
+# ones this old are treated as left behind by a crashed writer
+STALE_TEMP_FILE_SECONDS = 3600
+
+# doc_ids come from clients and become file names, so only UUIDs are accepted
+DOC_ID_RE = re.compile(r'^[0-9a-f]{8}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{4}-[0-9a-f]{12}$')
+
+class DocumentStore:
+    def __init__(self, directory: str = DOCUMENT_STORE_DIR,
+                 memory_budget_bytes: int = DOCUMENT_STORE_MEMORY_MB * 1024 * 1024,
+                 ttl_seconds: float = DOCUMENT_TTL_HOURS * 3600):
+        self.directory = directory
+        self.memory_budget_bytes = memory_budget_bytes
+        self.ttl_seconds = ttl_seconds
+        self.memory_bytes = 0
+        # doc_id -> (text, expires_at), least recently used first
+        self._entries: "OrderedDict[str, Tuple[str, float]]" = OrderedDict()
+        self._lock = threading.Lock()
+        os.makedirs(directory, exist_ok=True)
+
+    def _path(self, doc_id: str) -> str:
+        return os.path.join(self.directory, f"{doc_id}.txt.gz")
+
+    def put(self, doc_id: str, text: str, ttl_seconds: Optional[float] = None):
+        if not DOC_ID_RE.match(doc_id):
+            raise ValueError(f"Invalid document id: {doc_id}")
+        expires_at = time.time() + (ttl_seconds if ttl_seconds is not None else self.ttl_seconds)
+
+        # Write to a temp file and rename, so other workers never read a partial file.
+        # The expiry time is kept in the file's mtime so every worker sees the same TTL.
+        fd, tmp_path = tempfile.mkstemp(dir=self.directory, suffix=".tmp")
+        with os.fdopen(fd, "wb") as f:
+            f.write(gzip.compress(text.encode("utf-8"), compresslevel=6))
+        os.utime(tmp_path, (expires_at, expires_at))
+        os.replace(tmp_path, self._path(doc_id))
+
+        self._remember(doc_id, text, expires_at)
+
+    def get(self, doc_id: str) -> Optional[str]:
+        if not DOC_ID_RE.match(doc_id):
+            return None
+        now = time.time()
+
+        with self._lock:
+            entry = self._entries.get(doc_id)
+            if entry and entry[1] > now:
+                self._entries.move_to_end(doc_id)
+                return entry[0]
+
+        # Not in this worker's memory (evicted, expired here, or stored by another worker)
+        path = self._path(doc_id)
+        try:
+            expires_at = os.stat(path).st_mtime
+            if expires_at <= now:
+                self._discard(doc_id)
+                return None
+            with open(path, "rb") as f:
+                text = gzip.decompress(f.read()).decode("utf-8")
+        except FileNotFoundError:
+            self._discard(doc_id, remove_file=False)
+            return None
+
+        self._remember(doc_id, text, expires_at)
+        return text
+
+    def __contains__(self, doc_id: str) -> bool:
+        return self.get(doc_id) is not None
+
+    def expires_at(self, doc_id: str) -> Optional[float]:
+        """When the document expires, or None if it is gone. Read from disk, so it is the same in every worker."""
+        if not DOC_ID_RE.match(doc_id):
+            return None
+        try:
+            return os.stat(self._path(doc_id)).st_mtime
+        except FileNotFoundError:
+            return None
+
+    def touch(self, doc_id: str):
+        """Extends a document's TTL, e.g. while it is actively being chatted about."""
+        expires_at = time.time() + self.ttl_seconds
+        try:
+            os.utime(self._path(doc_id), (expires_at, expires_at))
+        except FileNotFoundError:
+            return
+        with self._lock:
+            entry = self._entries.get(doc_id)
+            if entry:
+                self._entries[doc_id] = (entry[0], expires_at)
+
+    def purge_expired(self) -> int:
+        """Deletes expired documents from memory and disk. Returns how many files were removed."""
+        now = time.time()
+        with self._lock:
+            for doc_id in [d for d, (_, expires_at) in self._entries.items() if expires_at <= now]:
+                self._drop(doc_id)
+
+        removed = 0
+        for name in os.listdir(self.directory):
+            path = os.path.join(self.directory, name)
+            # A temp file may still be being written by put() in some worker
+            cutoff = now - STALE_TEMP_FILE_SECONDS if name.endswith(".tmp") else now
+            try:
+                if os.stat(path).st_mtime <= cutoff:
+                    os.remove(path)
+                    removed += 1
+            except FileNotFoundError:
+                pass  # Another worker purged it first
+        return removed
+
+    def _remember(self, doc_id: str, text: str, expires_at: float):
+        with self._lock:
+            self._drop(doc_id)
+            size = sys.getsizeof(text)
+            if size > self.memory_budget_bytes:
+                return  # Too large to keep hot; it is served from disk instead
+            self._entries[doc_id] = (text, expires_at)
+            self.memory_bytes += size
+            # Evict least recently used texts; their gzip copies stay on disk
+            while self.memory_bytes > self.memory_budget_bytes:
+                self._drop(next(iter(self._entries)))
+
+    def _drop(self, doc_id: str):
+        entry = self._entries.pop(doc_id, None)
+        if entry:
+            self.memory_bytes -= sys.getsizeof(entry[0])
+
+    def _discard(self, doc_id: str, remove_file: bool = True):
+        with self._lock:
+            self._drop(doc_id)
+        if remove_file:
+            try:
+                os.remove(self._path(doc_id))
+            except FileNotFoundError:
+                pass
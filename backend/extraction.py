@@ -0,0 +1,436 @@
+"""Text extraction engines for uploaded documents."""
+import os
+import mmap
+import time
+import asyncio
+import zipfile
+import contextvars
+import posixpath
+import threading
+import multiprocessing
+import xml.etree.ElementTree as ET
+from concurrent.futures import ProcessPoolExecutor
+from contextlib import contextmanager
+from dataclasses import dataclass, field
+from typing import AsyncIterator, Callable, Dict, IO, Iterator, List, NamedTuple, Optional, Tuple, Union
+
+from metrics import PDF_PAGES, PDF_PAGE_SECONDS
+
+# Worker processes used for PDF extraction (1 disables the pool) and how many
+# pages each worker task handles. Small documents are extracted inline.
+PDF_WORKERS = int(os.getenv("PDF_WORKERS", str(os.cpu_count() or 1)))
+PDF_PAGES_PER_CHUNK = int(os.getenv("PDF_PAGES_PER_CHUNK", "16"))
+
+# Pages are read from the PDF text layer with pdfium first; pdfplumber's layout
+# analysis only runs on pages that fail the quality checks below. PDF_TIERED=0
+# sends every page through pdfplumber.
+PDF_TIERED = os.getenv("PDF_TIERED", "1") != "0"
+PDF_MIN_PAGE_CHARS = int(os.getenv("PDF_MIN_PAGE_CHARS", "40"))
+PDF_TABLE_MIN_PATHS = int(os.getenv("PDF_TABLE_MIN_PATHS", "12"))
+# Text runs that jump back up the page; a few are normal for multi-column layouts
+PDF_MAX_BACKTRACKS = 4
+BACKTRACK_POINTS = 24
+# Below these shares of mapped characters and spaces the text layer is garbled
+MIN_MAPPED_RATIO = 0.7
+MIN_SPACE_RATIO = 0.05
+
+# Extraction tier of a page: read from the text layer, re-read with layout
+# analysis, or without any text (an image only, or nothing at all)
+PDF_TIERS = ("text", "layout", "scanned", "empty")
+
+_pdf_pool: Optional[ProcessPoolExecutor] = None
+_pdf_pool_lock = threading.Lock()
+# pdfium is not thread-safe, and concurrent uploads extract in several threads
+_pdfium_lock = threading.Lock()
+
+class PdfPage(NamedTuple):
+    text: str
+    seconds: float
+    tier: str
+
+class NoTextLayer(Exception):
+    """Raised when no page of a PDF has extractable text, e.g. a scan."""
+
+@dataclass
+class PdfExtraction:
+    text: str
+    page_count: int
+    elapsed: float
+    # Seconds spent extracting each page, in page order
+    page_timings: List[float] = field(default_factory=list)
+    # Extraction tier of each page, in page order
+    page_tiers: List[str] = field(default_factory=list)
+
+    def slowest_pages(self, n: int = 3) -> List[Tuple[int, float]]:
+        return slowest_pages(self.page_timings, n)
+
+def slowest_pages(page_timings: List[float], n: int = 3) -> List[Tuple[int, float]]:
+    """Returns (1-based page number, seconds) for the n slowest pages."""
+    ranked = sorted(enumerate(page_timings, start=1), key=lambda p: p[1], reverse=True)
+    return ranked[:n]
+
+def get_pdf_pool() -> ProcessPoolExecutor:
+    global _pdf_pool
+    # Uploads extract in several threads at once; only one of them may create the pool
+    with _pdf_pool_lock:
+        if _pdf_pool is None:
+            # "spawn" keeps workers independent of the event loop and threads of the server process
+            _pdf_pool = ProcessPoolExecutor(
+                max_workers=PDF_WORKERS,
+                mp_context=multiprocessing.get_context("spawn")
+            )
+        return _pdf_pool
+
+def shutdown_pdf_pool():
+    global _pdf_pool
+    with _pdf_pool_lock:
+        if _pdf_pool is not None:
+            _pdf_pool.shutdown(wait=False, cancel_futures=True)
+            _pdf_pool = None
+
+@contextmanager
+def open_pdf(path: str):
+    """Opens a PDF through a read-only memory map, so every process shares the OS page cache."""
+    import pdfplumber  # Imported on first use to keep API startup fast
+
+    with open(path, "rb") as f, mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_READ) as mapped:
+        with pdfplumber.open(mapped) as pdf:
+            yield pdf
+
+@contextmanager
+def open_pdfium(path: str):
+    import pypdfium2  # Imported on first use to keep API startup fast
+
+    pdf = pypdfium2.PdfDocument(path)
+    try:
+        yield pdf
+    finally:
+        pdf.close()
+
+def _count_pages(path: str) -> int:
+    with _pdfium_lock, open_pdfium(path) as pdf:
+        return len(pdf)
+
+def _needs_layout(text: str, backtracks: int, paths: int) -> bool:
+    visible = "".join(text.split())
+    if len(visible) < PDF_MIN_PAGE_CHARS:
+        return True  # Too little text
+    unmapped = sum(1 for char in visible if char == "\ufffd" or not char.isprintable())
+    if unmapped > len(visible) * (1 - MIN_MAPPED_RATIO):
+        return True  # Glyphs without a Unicode mapping
+    if len(text) > 200 and text.count(" ") < len(text) * MIN_SPACE_RATIO:
+        return True  # Words run together; pdfplumber infers spaces from glyph gaps
+    return backtracks > PDF_MAX_BACKTRACKS or paths >= PDF_TABLE_MIN_PATHS
+
+def _read_text_layer(page) -> Tuple[str, str]:
+    """Returns (text, tier) for a pdfium page, where tier is "text" or a fallback."""
+    import pypdfium2.raw as pdfium_c
+
+    textpage = page.get_textpage()
+    try:
+        glyphs = textpage.count_chars()
+        text = textpage.get_text_range() if glyphs > 0 else ""
+        backtracks = 0
+        if text.strip():
+            previous_top = None
+            for i in range(textpage.count_rects()):
+                top = textpage.get_rect(i)[3]
+                if previous_top is not None and top > previous_top + BACKTRACK_POINTS:
+                    backtracks += 1
+                previous_top = top
+    finally:
+        textpage.close()
+
+    images = paths = 0
+    for obj in page.get_objects(filter=(pdfium_c.FPDF_PAGEOBJ_IMAGE, pdfium_c.FPDF_PAGEOBJ_PATH)):
+        if obj.type == pdfium_c.FPDF_PAGEOBJ_IMAGE:
+            images += 1
+        else:
+            paths += 1
+    text = text.replace("\r\n", "\n")
+    if not text.strip():
+        return "", "scanned" if images else "empty"
+    return text, "layout" if _needs_layout(text, backtracks, paths) else "text"
+
+def _read_text_layers(path: str, start: int, end: int) -> List[PdfPage]:
+    pages = []
+    with _pdfium_lock, open_pdfium(path) as pdf:
+        for index in range(start, end):
+            page_start = time.perf_counter()
+            page = pdf[index]
+            try:
+                text, tier = _read_text_layer(page)
+            finally:
+                page.close()
+            pages.append(PdfPage(text, time.perf_counter() - page_start, tier))
+    return pages
+
+def _extract_page_range(path: str, start: int, end: int, tiered: bool = PDF_TIERED) -> List[PdfPage]:
+    # Runs in a worker process, which opens the uploaded file itself
+    if tiered:
+        pages = _read_text_layers(path, start, end)
+    else:
+        pages = [PdfPage("", 0.0, "layout")] * (end - start)
+    if all(page.tier != "layout" for page in pages):
+        return pages
+
+    results = []
+    with open_pdf(path) as pdf:
+        for index, page in zip(range(start, end), pages):
+            if page.tier != "layout":
+                results.append(page)
+                continue
+            page_start = time.perf_counter()
+            plumber_page = pdf.pages[index]
+            extracted = plumber_page.extract_text() or ""
+            plumber_page.close()  # Releases the page's cached layout objects
+            seconds = page.seconds + time.perf_counter() - page_start
+            # Keep the text layer when layout analysis finds nothing better
+            results.append(PdfPage(extracted if extracted.strip() else page.text, seconds, page.tier))
+    return results
+
+def _iter_page_ranges(path: str, pages_per_chunk: int, tiered: bool) -> Iterator[PdfPage]:
+    # Workers read the document from disk instead of each receiving a pickled copy of the bytes
+    page_count = _count_pages(path)
+    step = max(pages_per_chunk, 1)
+    ranges = [(start, min(start + step, page_count)) for start in range(0, page_count, step)]
+
+    if PDF_WORKERS <= 1 or len(ranges) <= 1:
+        for start, end in ranges:
+            yield from _extract_page_range(path, start, end, tiered)
+        return
+
+    pool = get_pdf_pool()
+    futures = [pool.submit(_extract_page_range, path, start, end, tiered) for start, end in ranges]
+    try:
+        for future in futures:
+            yield from future.result()
+    finally:
+        # The consumer stopped early (or failed); drop ranges that have not started
+        for future in futures:
+            future.cancel()
+
+def iter_pdf_pages(path: str, pages_per_chunk: int = PDF_PAGES_PER_CHUNK,
+                   tiered: bool = PDF_TIERED) -> Iterator[PdfPage]:
+    """Yields a PdfPage (text, seconds, tier) for each page of the PDF at `path`, in page order.
+
+    Page ranges are spread over the process pool up front, and each range is
+    yielded as soon as it and all earlier ranges are done, so consumers can start
+    on the first pages while later ones are still being extracted. Raises
+    NoTextLayer at the end if no page had any text.
+    """
+    has_text = False
+    for page in _iter_page_ranges(path, pages_per_chunk, tiered):
+        PDF_PAGES.inc(tier=page.tier)
+        PDF_PAGE_SECONDS.observe(page.seconds, tier=page.tier)
+        has_text = has_text or bool(page.text.strip())
+        yield page
+    if not has_text:
+        raise NoTextLayer("The PDF has no text layer; it is probably scanned or empty.")
+
+def extract_pdf(path: str, pages_per_chunk: int = PDF_PAGES_PER_CHUNK, tiered: bool = PDF_TIERED) -> PdfExtraction:
+    """Extracts the text of the PDF at `path`, spreading page ranges over the process pool.
+
+    Page texts are joined in page order once at the end, so the cost stays linear
+    in the size of the document.
+    """
+    started = time.perf_counter()
+    parts = []
+    page_timings = []
+    page_tiers = []
+    for page in iter_pdf_pages(path, pages_per_chunk, tiered):
+        if page.text:
+            parts.append(page.text)
+            parts.append("\n")
+        page_timings.append(page.seconds)
+        page_tiers.append(page.tier)
+
+    return PdfExtraction(
+        text="".join(parts),
+        page_count=len(page_timings),
+        elapsed=time.perf_counter() - started,
+        page_timings=page_timings,
+        page_tiers=page_tiers
+    )
+
+W_NS = "{http://schemas.openxmlformats.org/wordprocessingml/2006/main}"
+R_NS = "{http://schemas.openxmlformats.org/officeDocument/2006/relationships}"
+MC_FALLBACK = "{http://schemas.openxmlformats.org/markup-compatibility/2006}Fallback"
+RELS_NS = "{http://schemas.openxmlformats.org/package/2006/relationships}"
+
+_W_P, _W_TBL, _W_TR, _W_TC = W_NS + "p", W_NS + "tbl", W_NS + "tr", W_NS + "tc"
+_INLINE_TEXT = {W_NS + "tab": "\t", W_NS + "br": "\n", W_NS + "cr": "\n", W_NS + "noBreakHyphen": "-"}
+_HEADER_FOOTER_REFS = (W_NS + "headerReference", W_NS + "footerReference")
+
+class _SectionEnd(NamedTuple):
+    # Relationship ids of the header and footer parts of the section that just ended
+    part_ids: List[str]
+
+def _inline_text(element: ET.Element, parts: List[str]):
+    for child in element:
+        tag = child.tag
+        if tag == W_NS + "t":
+            parts.append(child.text or "")
+        elif tag in _INLINE_TEXT:
+            parts.append(_INLINE_TEXT[tag])
+        elif tag == MC_FALLBACK:
+            continue  # Duplicates the text of the preferred mc:Choice
+        elif tag == _W_P:
+            # Paragraphs nested in text boxes or table cells
+            _inline_text(child, parts)
+            parts.append(" ")
+        else:
+            _inline_text(child, parts)
+
+def _paragraph_text(paragraph: ET.Element) -> str:
+    parts: List[str] = []
+    _inline_text(paragraph, parts)
+    return "".join(parts)
+
+def _structural_children(element: ET.Element, tag: str) -> Iterator[ET.Element]:
+    # Rows and cells may be wrapped in content controls, but never look inside nested blocks
+    for child in element:
+        if child.tag == tag:
+            yield child
+        elif child.tag not in (_W_P, _W_TBL, _W_TR, _W_TC):
+            yield from _structural_children(child, tag)
+
+def _table_rows(table: ET.Element) -> Iterator[str]:
+    for row in _structural_children(table, _W_TR):
+        cells = []
+        for cell in _structural_children(row, _W_TC):
+            parts: List[str] = []
+            _inline_text(cell, parts)
+            cells.append(" ".join("".join(parts).split()))
+        if any(cells):
+            yield " | ".join(cells)
+
+def _iter_blocks(stream: IO[bytes]) -> Iterator[Union[str, _SectionEnd]]:
+    """Yields the lines of one WordprocessingML part in document order.
+
+    Each top-level paragraph is one line and each table row is one line with
+    its cells joined by " | ". Blocks are dropped from the tree as soon as
+    they are read, so memory is bounded by the largest paragraph or table
+    rather than by the document.
+    """
+    stack: List[ET.Element] = []
+    in_paragraph = in_table = 0
+    pending: List[str] = []
+    for event, element in ET.iterparse(stream, events=("start", "end")):
+        tag = element.tag
+        if event == "start":
+            stack.append(element)
+            if tag == _W_P:
+                in_paragraph += 1
+            elif tag == _W_TBL:
+                in_table += 1
+            continue
+
+        stack.pop()
+        if tag == _W_P:
+            in_paragraph -= 1
+        elif tag == _W_TBL:
+            in_table -= 1
+        if tag in _HEADER_FOOTER_REFS and not in_table:
+            # Section properties sit at the end of the section: in its last paragraph or the body
+            pending.append(element.get(R_NS + "id"))
+        if in_paragraph or in_table:
+            continue  # Still part of an enclosing block
+
+        if tag == _W_P:
+            yield _paragraph_text(element)
+        elif tag == _W_TBL:
+            yield from _table_rows(element)
+        if pending:
+            yield _SectionEnd(pending)
+            pending = []
+        if stack:
+            stack[-1].remove(element)
+
+def _part_targets(archive: zipfile.ZipFile) -> Dict[str, str]:
+    """Maps relationship ids of word/document.xml to part names in the archive."""
+    try:
+        with archive.open("word/_rels/document.xml.rels") as f:
+            relationships = ET.parse(f).getroot()
+    except KeyError:
+        return {}
+    targets = {}
+    for rel in relationships.iter(RELS_NS + "Relationship"):
+        target = rel.get("Target", "")
+        if rel.get("TargetMode") == "External" or not target:
+            continue
+        name = target.lstrip("/") if target.startswith("/") else posixpath.normpath(posixpath.join("word", target))
+        targets[rel.get("Id")] = name
+    return targets
+
+def iter_docx_blocks(path: str) -> Iterator[str]:
+    """Yields the text of the .docx at `path` one line per paragraph or table row.
+
+    word/document.xml is parsed incrementally straight out of the zip instead
+    of loading the whole object model. Headers and footers follow the body of
+    the section they belong to; a part repeated by later sections (the usual
+    running header) is emitted only once.
+    """
+    with zipfile.ZipFile(path) as archive:
+        targets = None
+        emitted = set()
+        with archive.open("word/document.xml") as document:
+            for block in _iter_blocks(document):
+                if isinstance(block, str):
+                    yield block
+                    continue
+                if targets is None:
+                    targets = _part_targets(archive)
+                for part_id in block.part_ids:
+                    name = targets.get(part_id)
+                    if name is None or name in emitted or name not in archive.NameToInfo:
+                        continue
+                    emitted.add(name)
+                    with archive.open(name) as part:
+                        for line in _iter_blocks(part):
+                            if isinstance(line, str) and line.strip():
+                                yield line
+
+class _Raised:
+    def __init__(self, error: BaseException):
+        self.error = error
+
+_DONE = object()
+
+async def iterate_in_thread(make_iterator: Callable[[], Iterator]) -> AsyncIterator:
+    """Runs a blocking iterator in a worker thread and yields its items on the event loop.
+
+    Closing the async iterator early stops the thread at its next item.
+    """
+    loop = asyncio.get_running_loop()
+    queue: asyncio.Queue = asyncio.Queue()
+    stop = threading.Event()
+
+    def produce():
+        iterator = make_iterator()
+        try:
+            for item in iterator:
+                if stop.is_set():
+                    break
+                loop.call_soon_threadsafe(queue.put_nowait, item)
+        except BaseException as e:
+            loop.call_soon_threadsafe(queue.put_nowait, _Raised(e))
+            return
+        finally:
+            close = getattr(iterator, "close", None)
+            if close:
+                close()
+        loop.call_soon_threadsafe(queue.put_nowait, _DONE)
+
+    # Log lines from the thread keep the request id of the caller
+    loop.run_in_executor(None, contextvars.copy_context().run, produce)
+    try:
+        while True:
+            item = await queue.get()
+            if item is _DONE:
+                break
+            if isinstance(item, _Raised):
+                raise item.error
+            yield item
+    finally:
+        stop.set()
@@ -0,0 +1,341 @@
+"""Shared Gemini access layer.
+
+Every model call goes through GeminiClient, which applies in order:
+1. a cap on in-flight calls, granted by endpoint priority (chat before background work),
+2. a token bucket sized to the project's requests-per-minute quota,
+3. a per-endpoint timeout, and
+4. retries on throttling/unavailability with jittered exponential backoff that
+   honors the server's Retry-After / RetryInfo delay.
+"""
+import os
+import re
+import time
+import heapq
+import random
+import asyncio
+import itertools
+from typing import Any, AsyncIterator, Dict, NamedTuple, Optional
+
+from metrics import (
+    GEMINI_CALLS,
+    GEMINI_RETRIES,
+    GEMINI_QUEUE_WAIT,
+    GEMINI_LATENCY,
+    GEMINI_PROMPT_CHARS,
+    log,
+    span
+)
+
+GEMINI_MODEL = os.getenv("GEMINI_MODEL", "gemini-2.5-flash")
+GEMINI_RPM = float(os.getenv("GEMINI_RPM", "60"))
+GEMINI_BURST = int(os.getenv("GEMINI_BURST", "10"))
+GEMINI_MAX_IN_FLIGHT = int(os.getenv("GEMINI_MAX_IN_FLIGHT", "8"))
+GEMINI_MAX_RETRIES = int(os.getenv("GEMINI_MAX_RETRIES", "5"))
+GEMINI_BACKOFF_BASE = float(os.getenv("GEMINI_BACKOFF_BASE", "1"))
+GEMINI_BACKOFF_CAP = float(os.getenv("GEMINI_BACKOFF_CAP", "30"))
+GEMINI_BASE_URL = os.getenv("GEMINI_BASE_URL") or None  # Overrides the API endpoint, e.g. the benchmark stand-in
+
+RETRYABLE_CODES = {429, 500, 502, 503, 504}
+
+class CallPolicy(NamedTuple):
+    priority: int  # Lower runs first when calls are queued
+    timeout: float  # Seconds per attempt
+
+ENDPOINT_POLICIES: Dict[str, CallPolicy] = {
+    "chat": CallPolicy(priority=0, timeout=60),
+    "translate": CallPolicy(priority=1, timeout=120),
+    "upload": CallPolicy(priority=1, timeout=300),
+    "quiz": CallPolicy(priority=2, timeout=90),
+    "summary_section": CallPolicy(priority=3, timeout=180),
+    "chat_summary": CallPolicy(priority=3, timeout=60),
+    "context_cache": CallPolicy(priority=1, timeout=120),
+}
+DEFAULT_POLICY = CallPolicy(priority=2, timeout=120)
+
+class GeminiUnavailableError(Exception):
+    """Raised when no Gemini client is configured."""
+
+class TokenBucket:
+    def __init__(self, rate_per_minute: float, burst: int):
+        self.rate = rate_per_minute / 60.0
+        self.capacity = max(burst, 1)
+        self.tokens = float(self.capacity)
+        self.updated = time.monotonic()
+        self._lock = asyncio.Lock()
+
+    async def acquire(self):
+        async with self._lock:
+            while True:
+                now = time.monotonic()
+                self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+                self.updated = now
+                if self.tokens >= 1:
+                    self.tokens -= 1
+                    return
+                await asyncio.sleep((1 - self.tokens) / self.rate)
+
+class PrioritySlots:
+    """A semaphore whose waiters are woken by priority, then in arrival order."""
+
+    def __init__(self, size: int):
+        self.free = size
+        self._waiters = []
+        self._order = itertools.count()
+
+    async def acquire(self, priority: int):
+        if self.free > 0 and not self._waiters:
+            self.free -= 1
+            return
+        future = asyncio.get_running_loop().create_future()
+        entry = [priority, next(self._order), future]
+        heapq.heappush(self._waiters, entry)
+        try:
+            await future
+        except asyncio.CancelledError:
+            if future.done() and not future.cancelled():
+                self.release()  # The slot was handed over just as we were cancelled
+            elif entry in self._waiters:
+                # release() may already have popped and skipped the cancelled entry
+                self._waiters.remove(entry)
+                heapq.heapify(self._waiters)
+            raise
+
+    def release(self):
+        while self._waiters:
+            _, _, future = heapq.heappop(self._waiters)
+            if not future.done():
+                future.set_result(None)
+                return
+        self.free += 1
+
+    @property
+    def queued(self) -> int:
+        return len(self._waiters)
+
+def retry_after_seconds(error: Exception) -> Optional[float]:
+    """Reads the server-requested delay from a Retry-After header or a RetryInfo detail."""
+    headers = getattr(getattr(error, "response", None), "headers", None)
+    if headers:
+        value = headers.get("retry-after")
+        if value:
+            try:
+                return float(value)
+            except ValueError:
+                pass
+    match = re.search(r"'retryDelay': '([\d.]+)s'", str(getattr(error, "details", "")))
+    return float(match.group(1)) if match else None
+
+def prompt_chars(prompt: Any) -> int:
+    if isinstance(prompt, str):
+        return len(prompt)
+    if isinstance(prompt, (list, tuple)):
+        return sum(prompt_chars(part) for part in prompt)
+    return 0
+
+def error_code(error: Exception) -> Optional[int]:
+    from google.genai import errors  # Already loaded by the time a call has failed
+
+    if isinstance(error, errors.APIError):
+        return error.code
+    return None
+
+class GeminiClient:
+    def __init__(self, client=None, rpm: float = GEMINI_RPM, burst: int = GEMINI_BURST,
+                 max_in_flight: int = GEMINI_MAX_IN_FLIGHT, max_retries: int = GEMINI_MAX_RETRIES):
+        self._client = client
+        self._api_key: Optional[str] = None
+        self._base_url: Optional[str] = None
+        self.max_retries = max_retries
+        self._bucket = TokenBucket(rpm, burst)
+        self._slots = PrioritySlots(max_in_flight)
+        self.stats: Dict[str, Any] = {
+            "calls": 0,
+            "failures": 0,
+            "retries": 0,
+            "throttled": 0,
+            "timeouts": 0,
+            "in_flight": 0,
+            "queue_wait_total": 0.0,
+            "queue_wait_max": 0.0,
+        }
+
+    def configure(self, api_key: str, base_url: Optional[str] = GEMINI_BASE_URL):
+        """Sets the API key and endpoint; the genai.Client is created on first use."""
+        self._api_key = api_key
+        self._base_url = base_url
+
+    @property
+    def client(self):
+        if self._client is None and self._api_key:
+            from google import genai  # Slow to import, so deferred until the first call
+            http_options = {"base_url": self._base_url} if self._base_url else None
+            self._client = genai.Client(api_key=self._api_key, http_options=http_options)
+        return self._client
+
+    @client.setter
+    def client(self, client):
+        self._client = client
+
+    def __bool__(self) -> bool:
+        return self._client is not None or bool(self._api_key)
+
+    def snapshot(self) -> Dict[str, Any]:
+        stats = dict(self.stats)
+        stats["queued"] = self._slots.queued
+        stats["queue_wait_avg"] = stats["queue_wait_total"] / stats["calls"] if stats["calls"] else 0.0
+        return stats
+
+    async def _enter(self, policy: CallPolicy, endpoint: str):
+        queued_at = time.monotonic()
+        await self._slots.acquire(policy.priority)
+        try:
+            await self._bucket.acquire()
+        except BaseException:
+            self._slots.release()
+            raise
+        waited = time.monotonic() - queued_at
+        GEMINI_QUEUE_WAIT.observe(waited, endpoint=endpoint)
+        self.stats["calls"] += 1
+        self.stats["in_flight"] += 1
+        self.stats["queue_wait_total"] += waited
+        self.stats["queue_wait_max"] = max(self.stats["queue_wait_max"], waited)
+
+    def _exit(self):
+        self.stats["in_flight"] -= 1
+        self._slots.release()
+
+    async def _retry_or_raise(self, error: Exception, attempt: int, endpoint: str):
+        """Sleeps before the next attempt, or re-raises errors that should not be retried.
+
+        Called after the in-flight slot is released, so backing off never blocks other calls.
+        """
+        code = error_code(error)
+        is_timeout = isinstance(error, asyncio.TimeoutError)
+        reason = "timeout" if is_timeout else code
+        GEMINI_CALLS.inc(endpoint=endpoint, outcome=reason or "error")
+        if is_timeout:
+            self.stats["timeouts"] += 1
+        if code == 429:
+            self.stats["throttled"] += 1
+        if attempt >= self.max_retries - 1 or not (is_timeout or code in RETRYABLE_CODES):
+            self.stats["failures"] += 1
+            raise error
+        self.stats["retries"] += 1
+        GEMINI_RETRIES.inc(endpoint=endpoint, reason=reason)
+
+        # Full jitter spreads out clients that were throttled at the same moment
+        delay = random.uniform(0, min(GEMINI_BACKOFF_CAP, GEMINI_BACKOFF_BASE * 2 ** attempt))
+        requested = retry_after_seconds(error)
+        if requested is not None:
+            delay = max(delay, requested)
+        log(f"Gemini call for {endpoint} failed ({reason}), retrying in {delay:.1f} seconds...")
+        await asyncio.sleep(delay)
+
+    async def generate(self, prompt: Any, endpoint: str, model: Optional[str] = None, config: Any = None):
+        if not self.client:
+            raise GeminiUnavailableError("Gemini API Key not configured.")
+        policy = ENDPOINT_POLICIES.get(endpoint, DEFAULT_POLICY)
+        chars = prompt_chars(prompt)
+        GEMINI_PROMPT_CHARS.observe(chars, endpoint=endpoint)
+
+        with span("gemini", endpoint=endpoint, model=model or GEMINI_MODEL, prompt_chars=chars) as fields:
+            for attempt in range(self.max_retries):
+                fields["attempts"] = attempt + 1
+                await self._enter(policy, endpoint)
+                started = time.monotonic()
+                try:
+                    response = await asyncio.wait_for(
+                        self.client.aio.models.generate_content(
+                            model=model or GEMINI_MODEL,
+                            contents=prompt,
+                            config=config
+                        ),
+                        timeout=policy.timeout
+                    )
+                    GEMINI_CALLS.inc(endpoint=endpoint, outcome="ok")
+                    return response
+                except Exception as e:
+                    error = e
+                finally:
+                    GEMINI_LATENCY.observe(time.monotonic() - started, endpoint=endpoint)
+                    self._exit()
+                await self._retry_or_raise(error, attempt, endpoint)
+
+    async def stream(self, prompt: Any, endpoint: str, model: Optional[str] = None,
+                     config: Any = None) -> AsyncIterator[Any]:
+        """Yields response chunks. Retries only happen before the first chunk is yielded.
+
+        The timeout applies to opening the stream and to the gap between chunks.
+        """
+        if not self.client:
+            raise GeminiUnavailableError("Gemini API Key not configured.")
+        policy = ENDPOINT_POLICIES.get(endpoint, DEFAULT_POLICY)
+        chars = prompt_chars(prompt)
+        GEMINI_PROMPT_CHARS.observe(chars, endpoint=endpoint)
+
+        with span("gemini_stream", endpoint=endpoint, model=model or GEMINI_MODEL, prompt_chars=chars) as fields:
+            for attempt in range(self.max_retries):
+                fields["attempts"] = attempt + 1
+                emitted = False
+                await self._enter(policy, endpoint)
+                started = time.monotonic()
+                try:
+                    chunks = await asyncio.wait_for(
+                        self.client.aio.models.generate_content_stream(
+                            model=model or GEMINI_MODEL,
+                            contents=prompt,
+                            config=config
+                        ),
+                        timeout=policy.timeout
+                    )
+                    iterator = chunks.__aiter__()
+                    while True:
+                        try:
+                            chunk = await asyncio.wait_for(iterator.__anext__(), timeout=policy.timeout)
+                        except StopAsyncIteration:
+                            GEMINI_CALLS.inc(endpoint=endpoint, outcome="ok")
+                            return
+                        if not emitted:
+                            # Time to first chunk is what the user waits for
+                            GEMINI_LATENCY.observe(time.monotonic() - started, endpoint=endpoint)
+                            emitted = True
+                        yield chunk
+                except Exception as e:
+                    if emitted:
+                        self.stats["failures"] += 1
+                        GEMINI_CALLS.inc(endpoint=endpoint, outcome="error")
+                        raise
+                    error = e
+                finally:
+                    self._exit()
+                await self._retry_or_raise(error, attempt, endpoint)
+
+    async def _cache_call(self, operation: str, call, **fields):
+        """Runs one context-cache API call under the shared limits. Not retried: callers fall back."""
+        if not self.client:
+            raise GeminiUnavailableError("Gemini API Key not configured.")
+        policy = ENDPOINT_POLICIES["context_cache"]
+        with span(f"gemini_cache_{operation}", **fields):
+            await self._enter(policy, "context_cache")
+            try:
+                return await asyncio.wait_for(call(), timeout=policy.timeout)
+            except Exception as e:
+                GEMINI_CALLS.inc(endpoint="context_cache", outcome=error_code(e) or "error")
+                raise
+            finally:
+                self._exit()
+
+    async def create_cache(self, model: str, contents: Any, ttl_seconds: int, display_name: str = ""):
+        """Creates provider-side cached content; returns the CachedContent (use its .name)."""
+        config = {"contents": contents, "ttl": f"{int(ttl_seconds)}s", "display_name": display_name}
+        return await self._cache_call(
+            "create", lambda: self.client.aio.caches.create(model=model, config=config),
+            model=model, prompt_chars=prompt_chars(contents)
+        )
+
+    async def extend_cache(self, name: str, ttl_seconds: int):
+        config = {"ttl": f"{int(ttl_seconds)}s"}
+        return await self._cache_call("extend", lambda: self.client.aio.caches.update(name=name, config=config))
+
+    async def delete_cache(self, name: str):
+        return await self._cache_call("delete", lambda: self.client.aio.caches.delete(name=name))
@@ -0,0 +1,208 @@
+"""In-process job queue for long-running uploads.
+
+POST /upload only enqueues a job and returns its id; a fixed pool of worker
+tasks runs extraction and generation. Clients poll GET /jobs/{id} or follow
+GET /jobs/{id}/events. Jobs are keyed for idempotency: re-submitting the
+same file joins the existing job under a job id of its own. Transient
+failures are retried with backoff. Cancelling through one job id only
+withdraws that submitter; the work stops once every submitter has cancelled.
+
+Jobs live in the memory of one API process, so multi-worker deployments need
+sticky routing for the /jobs endpoints.
+"""
+import os
+import time
+import uuid
+import random
+import asyncio
+from typing import Any, AsyncIterator, Awaitable, Callable, Dict, List, Optional, Set, Tuple
+
+from fastapi import HTTPException
+
+from metrics import log
+
+UPLOAD_WORKERS = int(os.getenv("UPLOAD_WORKERS", "4"))
+JOB_MAX_ATTEMPTS = int(os.getenv("JOB_MAX_ATTEMPTS", "3"))
+JOB_RETENTION_SECONDS = int(os.getenv("JOB_RETENTION_SECONDS", "3600"))
+
+QUEUED, RUNNING, SUCCEEDED, FAILED, CANCELLED = "queued", "running", "succeeded", "failed", "cancelled"
+FINISHED = {SUCCEEDED, FAILED, CANCELLED}
+
+class Job:
+    def __init__(self, key: str, payload: Dict[str, Any]):
+        self.id = str(uuid.uuid4())
+        self.key = key
+        self.payload = payload
+        self.status = QUEUED
+        self.stage = "queued"
+        self.attempts = 0
+        self.result: Optional[Dict[str, Any]] = None
+        self.progress: Optional[Dict[str, Any]] = None  # Job-specific detail, e.g. per-file status of a batch
+        self.error: Optional[str] = None
+        self.created_at = time.time()
+        self.updated_at = self.created_at
+        self.cancel_requested = False
+        self.holders: Set[str] = {self.id}  # Job ids handed out for this job, one per submitter
+        self._task: Optional[asyncio.Task] = None
+        self._changed = asyncio.Event()
+
+    @property
+    def finished(self) -> bool:
+        return self.status in FINISHED
+
+    def update(self, status: Optional[str] = None, stage: Optional[str] = None,
+               progress: Optional[Dict[str, Any]] = None):
+        if status:
+            self.status = status
+        if stage:
+            self.stage = stage
+        if progress is not None:
+            self.progress = progress
+        self.updated_at = time.time()
+        # Wake everyone following this job, then start a fresh event for the next change
+        self._changed.set()
+        self._changed = asyncio.Event()
+
+    def to_dict(self, job_id: Optional[str] = None) -> Dict[str, Any]:
+        return {
+            "job_id": job_id or self.id,
+            "status": self.status,
+            "stage": self.stage,
+            "attempts": self.attempts,
+            "progress": self.progress,
+            "result": self.result,
+            "error": self.error,
+            "created_at": self.created_at,
+            "updated_at": self.updated_at,
+        }
+
+class JobQueue:
+    def __init__(self, run: Callable[[Job], Awaitable[Dict[str, Any]]], workers: int = UPLOAD_WORKERS,
+                 max_attempts: int = JOB_MAX_ATTEMPTS, retention_seconds: int = JOB_RETENTION_SECONDS,
+                 cleanup: Optional[Callable[[Job], None]] = None):
+        self.run = run
+        self.cleanup = cleanup  # Releases a job's payload (e.g. temp files) once it is over
+        self.workers = workers
+        self.max_attempts = max_attempts
+        self.retention_seconds = retention_seconds
+        self._jobs: Dict[str, Job] = {}
+        self._by_key: Dict[str, Job] = {}
+        self._queue: Optional[asyncio.Queue] = None
+        self._worker_tasks: List[asyncio.Task] = []
+        self._stopping = False
+
+    def start(self):
+        self._stopping = False
+        self._queue = asyncio.Queue()
+        self._worker_tasks = [asyncio.create_task(self._worker()) for _ in range(self.workers)]
+
+    async def stop(self):
+        self._stopping = True
+        for task in self._worker_tasks:
+            task.cancel()
+        await asyncio.gather(*self._worker_tasks, return_exceptions=True)
+        self._worker_tasks = []
+
+    def get(self, job_id: str) -> Optional[Job]:
+        return self._jobs.get(job_id)
+
+    def submit(self, key: str, payload: Dict[str, Any]) -> Tuple[str, Job]:
+        """Enqueues a job and returns (job id, job).
+
+        If a live or succeeded job was already submitted with this key, the caller
+        joins it instead, under a new job id that only it can cancel.
+        """
+        self._purge_finished()
+        existing = self._by_key.get(key)
+        if existing and existing.status not in (FAILED, CANCELLED):
+            job_id = str(uuid.uuid4())
+            existing.holders.add(job_id)
+            self._jobs[job_id] = existing
+            return job_id, existing
+        job = Job(key, payload)
+        self._jobs[job.id] = job
+        self._by_key[key] = job
+        self._queue.put_nowait(job)
+        return job.id, job
+
+    def cancel(self, job_id: str) -> Optional[Dict[str, Any]]:
+        """Withdraws the submitter holding `job_id` and returns the job's state as they see it.
+
+        The job itself is only cancelled when no other submitter still holds it.
+        """
+        job = self._jobs.get(job_id)
+        if job is None or job.finished:
+            return job.to_dict(job_id) if job else None
+        if len(job.holders) > 1:
+            job.holders.discard(job_id)
+            del self._jobs[job_id]
+            return {**job.to_dict(job_id), "status": CANCELLED, "stage": "cancelled"}
+        job.cancel_requested = True
+        if job._task is not None:
+            job._task.cancel()
+        self._release(job)
+        job.update(CANCELLED, "cancelled")
+        return job.to_dict(job_id)
+
+    async def follow(self, job: Job, job_id: Optional[str] = None) -> AsyncIterator[Dict[str, Any]]:
+        """Yields the job's state now and after every change, until it finishes."""
+        while True:
+            changed = job._changed
+            state = job.to_dict(job_id)
+            yield state
+            # Check the state that was sent: the job may have finished while it was being sent
+            if state["status"] in FINISHED:
+                return
+            await changed.wait()
+
+    def _release(self, job: Job):
+        if job.payload and self.cleanup:
+            self.cleanup(job)
+        job.payload = {}
+
+    def _purge_finished(self):
+        cutoff = time.time() - self.retention_seconds
+        for job in {j.id: j for j in self._jobs.values() if j.finished and j.updated_at < cutoff}.values():
+            for job_id in job.holders:
+                self._jobs.pop(job_id, None)
+            if self._by_key.get(job.key) is job:
+                del self._by_key[job.key]
+
+    async def _worker(self):
+        while True:
+            job = await self._queue.get()
+            if job.cancel_requested:
+                continue
+            await self._execute(job)
+
+    async def _execute(self, job: Job):
+        job.update(RUNNING, "starting")
+        while not job.cancel_requested:
+            job.attempts += 1
+            job._task = asyncio.create_task(self.run(job))
+            try:
+                result = await job._task
+                if not job.cancel_requested:
+                    job.result = result
+                    job.update(SUCCEEDED, "done")
+                break
+            except asyncio.CancelledError:
+                if self._stopping or not job.cancel_requested:
+                    raise  # The worker itself is shutting down
+                break  # cancel() already recorded it
+            except Exception as e:
+                if job.cancel_requested:
+                    break
+                # Client errors (e.g. an unreadable file) will not succeed on a retry
+                retryable = not (isinstance(e, HTTPException) and e.status_code < 500)
+                if not retryable or job.attempts >= self.max_attempts:
+                    job.error = e.detail if isinstance(e, HTTPException) else str(e)
+                    job.update(FAILED, "failed")
+                    break
+                delay = random.uniform(0, 2 ** job.attempts)
+                log(f"Job {job.id} failed ({e}), retrying in {delay:.1f} seconds...")
+                job.update(stage="retrying")
+                await asyncio.sleep(delay)
+            finally:
+                job._task = None
+        self._release(job)
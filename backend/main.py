@@ -1,63 +1,121 @@
 import os
-import io
 import asyncio
 import uuid
 import time
 import re
 import json
+import hashlib
+from collections import Counter
 from contextlib import asynccontextmanager
-from typing import List, Optional, Dict, Any
+from typing import List, Optional, Dict, Any, AsyncIterator, Awaitable, Callable, Iterator, Tuple
 
-from fastapi import FastAPI, UploadFile, File, HTTPException, BackgroundTasks
+from fastapi import FastAPI, UploadFile, File, Form, HTTPException, BackgroundTasks, Request, Response
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, JSONResponse
 from pydantic import BaseModel
-import pdfplumber
-import docx
-from google import genai
 from dotenv import load_dotenv
 
-# Import database functions
-from database import (
-    init_db, 
-    add_review, 
-    get_reviews, 
-    save_summary, 
-    get_summary, 
-    init_contact_table, 
-    add_contact_submission,
-    migrate_contact_table
-)
+import async_database as db
+from reviews_cache import ReviewsCache, listen_for_changes
+
+from extraction import PDF_TIERS, NoTextLayer, iter_docx_blocks, iter_pdf_pages, iterate_in_thread, slowest_pages, shutdown_pdf_pool
+from document_store import DocumentStore
+from retrieval import IndexCache
+from summarization import condense, StreamingSections
+from translation import translate_markdown
+from quizzes import QuizCache, QUIZ_SAMPLE_CHUNKS, build_quiz_prompt, build_cached_quiz_prompt
+from jobs import Job, JobQueue
+from chat_sessions import ChatMessage, ChatSession, ChatSessionStore, format_history, needs_compaction, new_session_id
+from uploads import MAX_UPLOAD_MB, MAX_BATCH_UPLOAD_MB, SpooledUpload, spool_upload, spool_uploads
+from gemini_client import GEMINI_BASE_URL, GeminiClient, error_code
+from context_cache import ContextCache
+from routing import ModelRouter
+import metrics
+from metrics import bind_request_id, cache_lookup, log, log_event, new_request_id, request_id_var, span
 
 load_dotenv()
 
 # Global variables
-client: Optional[genai.Client] = None
-documents: Dict[str, str] = {} # In-memory document store
+gemini = GeminiClient() # Shared, rate-limited wrapper; configured with the API key in lifespan
+router = ModelRouter() # Picks a lighter model for short and transactional documents
+context_cache = ContextCache(gemini) # Gemini-side caches of long documents for /chat and /quiz
+documents = DocumentStore() # Memory-bounded, shared across workers via disk
+chat_sessions = ChatSessionStore(documents.ttl_seconds) # Per-document chat histories, shared via disk
+indexes = IndexCache() # BM25 chunk indexes for /chat retrieval
+pending_tasks = set() # Strong references to fire-and-forget tasks
+reviews_cache = ReviewsCache() # Approved reviews, invalidated by manage_reviews.py via NOTIFY
+
+# Browsers/CDNs may reuse the landing-page reviews for this long before revalidating
+REVIEWS_MAX_AGE_SECONDS = int(os.getenv("REVIEWS_MAX_AGE_SECONDS", "60"))
+
+# /chat sends the top-k matching chunks of longer documents instead of the whole text
+CHAT_TOP_K = int(os.getenv("CHAT_TOP_K", "8"))
+CHAT_FULL_TEXT_CHARS = int(os.getenv("CHAT_FULL_TEXT_CHARS", "12000"))
+
+async def purge_expired_documents():
+    while True:
+        await asyncio.sleep(600)
+        try:
+            removed = await asyncio.to_thread(documents.purge_expired)
+            if removed:
+                log(f"Purged {removed} expired documents.")
+            removed = await asyncio.to_thread(chat_sessions.purge_expired)
+            if removed:
+                log(f"Purged {removed} expired chat sessions.")
+            context_cache.purge_expired()
+        except Exception as e:
+            log(f"Document purge failed: {e}")
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
     # Startup
-    global client
     api_key = os.getenv("GEMINI_API_KEY")
     if api_key:
-        client = genai.Client(api_key=api_key)
-        print("Gemini Client initialized.")
+        # google-genai is slow to import, so the client is created on the first Gemini call
+        gemini.configure(api_key)
+        if GEMINI_BASE_URL:
+            log(f"Gemini Client configured (endpoint {GEMINI_BASE_URL}).")
+        else:
+            log("Gemini Client configured.")
     else:
-        print("Warning: GEMINI_API_KEY not found in environment variables.")
+        log("Warning: GEMINI_API_KEY not found in environment variables.")
     
-    init_db()
-    init_contact_table()
-    migrate_contact_table() # Ensure migration runs
-    print("Database initialized.")
+    await db.open_pool()
+    await db.migrate()
+    log("Database initialized.")
+
+    purge_task = asyncio.create_task(purge_expired_documents())
+    reviews_listener = asyncio.create_task(listen_for_changes(reviews_cache))
+    upload_jobs.start()
     
     yield
     
     # Shutdown
-    print("Shutting down...")
+    log("Shutting down...")
+    purge_task.cancel()
+    reviews_listener.cancel()
+    await upload_jobs.stop()
+    await context_cache.close()
+    shutdown_pdf_pool()
+    await db.close_pool()
 
 app = FastAPI(lifespan=lifespan)
 
-# Configure CORS
+# Multipart overhead allowed on top of the file itself
+UPLOAD_REQUEST_OVERHEAD_BYTES = 64 * 1024
+
+@app.middleware("http")
+async def limit_upload_size(request: Request, call_next):
+    # Refuse oversized uploads from their Content-Length, before the body is received
+    if request.method == "POST" and request.url.path.startswith("/upload"):
+        limit_mb = MAX_BATCH_UPLOAD_MB if request.url.path == "/upload/batch" else MAX_UPLOAD_MB
+        length = request.headers.get("content-length")
+        if length and length.isdigit() and int(length) > limit_mb * 1024 * 1024 + UPLOAD_REQUEST_OVERHEAD_BYTES:
+            what = "Upload" if limit_mb == MAX_BATCH_UPLOAD_MB else "File"
+            return JSONResponse({"detail": f"{what} is larger than {limit_mb} MB"}, status_code=413)
+    return await call_next(request)
+
+# Configure CORS (added last so it also wraps the responses of the middleware above)
 app.add_middleware(
     CORSMiddleware,
     allow_origins=["*"],
@@ -66,15 +124,45 @@ app.add_middleware(
     allow_headers=["*"],
 )
 
+@app.middleware("http")
+async def request_context(request: Request, call_next):
+    """Tags everything done for a request with its id, and records its latency and status."""
+    request_id = request.headers.get("x-request-id") or new_request_id()
+    request_id_var.set(request_id)
+    started = time.perf_counter()
+    status = 500
+    try:
+        response = await call_next(request)
+        status = response.status_code
+        response.headers["X-Request-ID"] = request_id
+        return response
+    finally:
+        elapsed = time.perf_counter() - started
+        route = request.scope.get("route")
+        # Templated paths keep the label set small (/jobs/{job_id}, not one series per job)
+        route_path = route.path if route is not None else "unmatched"
+        metrics.HTTP_REQUESTS.inc(method=request.method, route=route_path, status=str(status))
+        metrics.HTTP_DURATION.observe(elapsed, method=request.method, route=route_path)
+        log_event("request", method=request.method, path=request.url.path, status=status,
+                  duration_ms=round(elapsed * 1000, 2))
+
 # --- Helper Functions ---
 
-async def get_gemini_response_async(text: str) -> str:
-    if not client:
-        raise HTTPException(status_code=500, detail="Gemini API Key not configured.")
-    
-    try:
-        prompt = f"""
+HEADING_INDENT_RE = re.compile(r'^\s+(#+)', flags=re.MULTILINE)
+
+# Longest text sent in one study-guide prompt; longer documents go through map-reduce
+STUDY_GUIDE_MAX_CHARS = int(os.getenv("STUDY_GUIDE_MAX_CHARS", "250000"))
+# Documents above this size are summarized by section first, which is faster than one huge prompt
+MAP_REDUCE_THRESHOLD_CHARS = int(os.getenv("MAP_REDUCE_THRESHOLD_CHARS", "150000"))
+
+def build_study_guide_prompt(text: str, from_notes: bool = False) -> str:
+    source_note = (
+        "The text below is a set of section-by-section notes that together cover the ENTIRE document, in order. "
+        "Treat them as the document itself."
+    ) if from_notes else ""
+    return f"""
         You are an expert document analyzer and academic tutor. Your task is to analyze the following text and generate an appropriate summary based on the document's nature.
+        {source_note}
         
         **CRITICAL INSTRUCTIONS**:
         1. **FULL COVERAGE**: You must process the **ENTIRE** provided text.
@@ -99,54 +187,195 @@ async def get_gemini_response_async(text: str) -> str:
         Format the output in clean, professional Markdown. 
         
         Text to process:
-        {text[:250000]}
+        {text[:STUDY_GUIDE_MAX_CHARS]}
         """
-        
-        # Retry logic
-        max_retries = 3
-        for attempt in range(max_retries):
-            try:
-                # Use async call
-                response = await client.aio.models.generate_content(
-                    model='gemini-2.5-flash',
-                    contents=prompt
-                )
-                
-                cleaned_text = response.text
-                # Regex to un-indent headers
-                cleaned_text = re.sub(r'^\s+(#+)', r'\1', cleaned_text, flags=re.MULTILINE)
-                return cleaned_text
-                
-            except Exception as e:
-                if "429" in str(e) and attempt < max_retries - 1:
-                    wait_time = 2 ** attempt
-                    print(f"Quota exceeded, retrying in {wait_time} seconds...")
-                    await asyncio.sleep(wait_time)
-                else:
-                    raise e
+
+def unindent_headings(text: str) -> str:
+    # Regex to un-indent headers
+    return HEADING_INDENT_RE.sub(r'\1', text)
+
+class HeadingUnindenter:
+    """Applies unindent_headings to streamed text, giving the same result as on the full text.
+
+    A match can only start at a line start and may swallow whitespace-only lines, so the
+    incomplete last line and any trailing whitespace-only lines are held back until more
+    text (or the end of the stream) shows whether they precede a heading.
+    """
+
+    def __init__(self):
+        self.pending = ""
+
+    def feed(self, chunk: str) -> str:
+        self.pending += chunk
+        cut = self.pending.rfind("\n") + 1
+        while cut > 0:
+            line_start = self.pending.rfind("\n", 0, cut - 1) + 1
+            if self.pending[line_start:cut].strip():
+                break
+            cut = line_start
+        ready, self.pending = self.pending[:cut], self.pending[cut:]
+        return unindent_headings(ready)
+
+    def flush(self) -> str:
+        ready, self.pending = self.pending, ""
+        return unindent_headings(ready)
+
+async def generate_text(prompt: str, endpoint: str = "upload", model: Optional[str] = None) -> str:
+    if not gemini:
+        raise HTTPException(status_code=500, detail="Gemini API Key not configured.")
+    response = await gemini.generate(prompt, endpoint, model=model)
+    return response.text
+
+async def generate_section_notes(prompt: str) -> str:
+    return await generate_text(prompt, "summary_section")
+
+async def generate_chat_summary(prompt: str) -> str:
+    return await generate_text(prompt, "chat_summary")
+
+async def generate_translation(prompt: str) -> str:
+    return await generate_text(prompt, "translate")
+
+def new_streaming_sections() -> Optional[StreamingSections]:
+    """Section summarizer fed during extraction, so map-reduce starts before the last page is read."""
+    if not gemini:
+        return None
+    return StreamingSections(MAP_REDUCE_THRESHOLD_CHARS, generate_section_notes)
+
+async def prepare_study_guide_prompt(text: str, sections: Optional[StreamingSections] = None) -> str:
+    if sections is not None and sections.started:
+        log(f"Long document ({len(text)} characters), collecting section notes started during extraction...")
+        notes = await condense(await sections.finish(), min(MAP_REDUCE_THRESHOLD_CHARS, STUDY_GUIDE_MAX_CHARS), generate_section_notes)
+        log(f"Section notes ready ({len(notes)} characters).")
+        return build_study_guide_prompt(notes, from_notes=True)
+
+    if len(text) <= MAP_REDUCE_THRESHOLD_CHARS:
+        return build_study_guide_prompt(text)
+
+    log(f"Long document ({len(text)} characters), summarizing sections first...")
+    notes = await condense(text, min(MAP_REDUCE_THRESHOLD_CHARS, STUDY_GUIDE_MAX_CHARS), generate_section_notes)
+    log(f"Section notes ready ({len(notes)} characters).")
+    return build_study_guide_prompt(notes, from_notes=True)
+
+async def get_gemini_response_async(text: str, sections: Optional[StreamingSections] = None) -> str:
+    if not gemini:
+        raise HTTPException(status_code=500, detail="Gemini API Key not configured.")
+    
+    try:
+        route = router.route(text, "upload")
+        log(f"Routing {route.doc_class} document to {route.model}.")
+        prompt = await prepare_study_guide_prompt(text, sections)
+        return unindent_headings(await generate_text(prompt, model=route.model))
                     
     except Exception as e:
-        print(f"Error generating content: {e}")
+        log(f"Error generating content: {e}")
         raise HTTPException(status_code=500, detail=f"AI generation failed: {str(e)}")
 
-def process_pdf_sync(content: bytes) -> str:
-    text = ""
-    with pdfplumber.open(io.BytesIO(content)) as pdf:
-        total_pages = len(pdf.pages)
-        print(f"PDF has {total_pages} pages.")
-        for i, page in enumerate(pdf.pages):
-            extracted = page.extract_text()
-            if extracted:
-                text += extracted + "\n"
-    return text
-
-def process_docx_sync(content: bytes) -> str:
-    text = ""
-    doc = docx.Document(io.BytesIO(content))
-    print(f"Word doc has {len(doc.paragraphs)} paragraphs.")
-    for para in doc.paragraphs:
-        text += para.text + "\n"
-    return text
+async def stream_gemini_response_async(text: str, sections: Optional[StreamingSections] = None) -> AsyncIterator[str]:
+    """Yields the study guide as Gemini produces it, with headings un-indented on the fly."""
+    if not gemini:
+        raise HTTPException(status_code=500, detail="Gemini API Key not configured.")
+
+    route = router.route(text, "upload")
+    log(f"Routing {route.doc_class} document to {route.model}.")
+    prompt = await prepare_study_guide_prompt(text, sections)
+    unindenter = HeadingUnindenter()
+
+    async for chunk in gemini.stream(prompt, "upload", model=route.model):
+        piece = unindenter.feed(chunk.text or "")
+        if piece:
+            yield piece
+
+    tail = unindenter.flush()
+    if tail:
+        yield tail
+
+# Word documents are handed downstream in batches of paragraphs and table rows, PDFs page by page
+DOCX_BLOCKS_PER_PIECE = 200
+
+def iter_pdf_text(path: str) -> Iterator[str]:
+    started = time.perf_counter()
+    page_timings = []
+    tiers = Counter()
+    no_text = []
+    for page in iter_pdf_pages(path):
+        page_timings.append(page.seconds)
+        tiers[page.tier] += 1
+        if page.text:
+            yield page.text + "\n"
+        if page.tier in ("scanned", "empty"):
+            no_text.append(len(page_timings))
+    breakdown = ", ".join(f"{tier}: {tiers[tier]}" for tier in PDF_TIERS if tiers[tier])
+    log(f"PDF has {len(page_timings)} pages ({breakdown}), extracted in {time.perf_counter() - started:.2f}s.")
+    slowest = ", ".join(f"p{page} {seconds:.2f}s" for page, seconds in slowest_pages(page_timings))
+    if slowest:
+        log(f"Slowest pages: {slowest}")
+    if no_text:
+        log(f"Pages without a text layer: {', '.join(map(str, no_text[:20]))}{' ...' if len(no_text) > 20 else ''}")
+
+def iter_docx_text(path: str) -> Iterator[str]:
+    started = time.perf_counter()
+    batch = []
+    blocks = 0
+    for block in iter_docx_blocks(path):
+        batch.append(block)
+        if len(batch) == DOCX_BLOCKS_PER_PIECE:
+            yield "\n".join(batch) + "\n"
+            blocks += len(batch)
+            batch = []
+    if batch:
+        yield "\n".join(batch) + "\n"
+        blocks += len(batch)
+    log(f"Word doc has {blocks} paragraphs and table rows, extracted in {time.perf_counter() - started:.2f}s.")
+
+def _task_done(task: asyncio.Task):
+    pending_tasks.discard(task)
+    # Nobody awaits these tasks, so report their failures here
+    if not task.cancelled() and task.exception() is not None:
+        log(f"Background task {task.get_name()} failed: {task.exception()!r}")
+
+def spawn(coro):
+    task = asyncio.create_task(coro)
+    pending_tasks.add(task)
+    task.add_done_callback(_task_done)
+    return task
+
+async def register_document(text: str) -> str:
+    doc_id = str(uuid.uuid4())
+    await asyncio.to_thread(documents.put, doc_id, text)
+    log(f"Stored document text with ID: {doc_id}")
+    # Build the chat retrieval index while the study guide is being generated
+    if len(text) > CHAT_FULL_TEXT_CHARS:
+        spawn(asyncio.to_thread(indexes.build, doc_id, text))
+    return doc_id
+
+async def register_job_document(job: Job, slot: str, text: str) -> str:
+    """register_document() once per job, so a retried attempt reuses the doc_id of an earlier one."""
+    doc_ids = job.payload.setdefault("doc_ids", {})
+    if slot not in doc_ids:
+        doc_ids[slot] = await register_document(text)
+    return doc_ids[slot]
+
+def select_chat_context(doc_id: str, doc_text: str, question: str, messages: List[ChatMessage]) -> str:
+    if len(doc_text) <= CHAT_FULL_TEXT_CHARS:
+        return doc_text
+
+    # Follow-ups like "explain that more" need the previous user turn to find the right chunks
+    query = question
+    for message in reversed(messages):
+        if message.role == 'user':
+            query += " " + message.content
+            break
+
+    index = indexes.get_or_build(doc_id, doc_text)
+    chunk_ids = index.search(query, CHAT_TOP_K) or index.sample(CHAT_TOP_K)
+    return "\n...\n".join(index.excerpts(doc_text, chunk_ids))
+
+async def save_upload_to_cache(content_hash: str, text: str, study_guide: Optional[str] = None):
+    # A cache write failure must never fail the upload itself
+    try:
+        await db.save_cached_upload(content_hash, text, study_guide)
+    except Exception as e:
+        log(f"Upload cache write failed: {e}")
 
 # --- Models ---
 
@@ -172,8 +401,31 @@ class TranslationRequest(BaseModel):
 
 class ChatRequest(BaseModel):
     doc_id: str
-    messages: list
     question: str
+    session_id: Optional[str] = None
+    # Earlier turns, only needed to start a session from history the client kept itself
+    messages: List[ChatMessage] = []
+
+def etag_matches(if_none_match: Optional[str], etag: str, wildcard: bool = True) -> bool:
+    """Weak comparison of an If-None-Match header against an ETag (RFC 9110, section 13.1.2).
+
+    The header may list several tags, weak ones carry a W/ prefix, and "*"
+    matches any current representation unless `wildcard` is False.
+    """
+    if not if_none_match:
+        return False
+    opaque = etag[2:] if etag.startswith("W/") else etag
+    for candidate in if_none_match.split(","):
+        candidate = candidate.strip()
+        if candidate == "*":
+            if wildcard:
+                return True
+            continue
+        if candidate.startswith("W/"):
+            candidate = candidate[2:]
+        if candidate == opaque:
+            return True
+    return False
 
 # --- Endpoints ---
 
@@ -181,26 +433,54 @@ class ChatRequest(BaseModel):
 def read_root():
     return {"message": "PDF Study Summarizer API is running"}
 
+@app.get("/metrics")
+def read_metrics():
+    """Prometheus text exposition of the counters and histograms in metrics.py."""
+    return Response(content=metrics.render(), media_type="text/plain; version=0.0.4")
+
+@app.get("/stats/gemini")
+def read_gemini_stats():
+    return gemini.snapshot()
+
 @app.get("/reviews")
-def read_reviews():
-    return get_reviews()
+async def read_reviews(request: Request):
+    body, etag = await reviews_cache.get()
+    headers = {
+        "ETag": etag,
+        "Cache-Control": f"public, max-age={REVIEWS_MAX_AGE_SECONDS}"
+    }
+    if etag_matches(request.headers.get("if-none-match"), etag):
+        return Response(status_code=304, headers=headers)
+    return Response(content=body, media_type="application/json", headers=headers)
 
 @app.post("/reviews")
-def create_review(review: ReviewRequest):
-    add_review(review.name, review.role, review.content, review.rating)
+async def create_review(review: ReviewRequest):
+    await db.add_review(review.name, review.role, review.content, review.rating)
     return {"message": "Review added successfully"}
 
 @app.post("/share")
-def create_share_link(request: ShareRequest):
-    share_id = save_summary(request.content)
+async def create_share_link(request: ShareRequest):
+    share_id = await db.save_summary(request.content)
     return {"share_id": share_id}
 
 @app.get("/share/{share_id}")
-def read_shared_summary(share_id: str):
-    content = get_summary(share_id)
+async def read_shared_summary(share_id: str, request: Request):
+    # A shared summary never changes, so its id doubles as the ETag and
+    # revalidation needs no database round-trip
+    headers = {
+        "ETag": f'"{share_id}"',
+        "Cache-Control": "public, max-age=31536000, immutable"
+    }
+    if_none_match = request.headers.get("if-none-match")
+    # "*" only matches once the summary is known to exist
+    if etag_matches(if_none_match, headers["ETag"], wildcard=False):
+        return Response(status_code=304, headers=headers)
+    content = await db.get_summary(share_id)
     if not content:
         raise HTTPException(status_code=404, detail="Summary not found")
-    return {"content": content}
+    if etag_matches(if_none_match, headers["ETag"]):
+        return Response(status_code=304, headers=headers)
+    return JSONResponse({"content": content}, headers=headers)
 
 @app.post("/contact")
 async def contact_form(request: ContactRequest, background_tasks: BackgroundTasks):
@@ -208,9 +488,7 @@ async def contact_form(request: ContactRequest, background_tasks: BackgroundTask
     timestamp = str(time.strftime('%Y-%m-%d %H:%M:%S'))
     
     try:
-        # Check if add_contact_submission is sync (it is), so we can call it directly.
-        # SQLite writes are fast enough to keep sync for now, or could offload.
-        add_contact_submission(
+        await db.add_contact_submission(
             id=submission_id,
             name=request.name,
             email=request.email,
@@ -224,178 +502,519 @@ async def contact_form(request: ContactRequest, background_tasks: BackgroundTask
         
         return {"status": "success", "message": "We will get in touch soon."}
     except Exception as e:
-        print(f"Database error: {e}")
+        log(f"Database error: {e}")
         raise HTTPException(status_code=500, detail="Internal server error")
 
 @app.post("/translate")
 async def translate_text(request: TranslationRequest):
-    print(f"Received translation request to {request.target_language}")
-    if not client:
+    log(f"Received translation request to {request.target_language}")
+    if not gemini:
         raise HTTPException(status_code=500, detail="Gemini API Key not configured.")
-    
+
+    # Many users translate the same study guide into the same language
+    content_hash = hashlib.sha256(request.text.encode("utf-8")).hexdigest()
+    language = request.target_language.strip().lower()[:64]
     try:
-        prompt = f"""
-        Translate the following academic study guide into {request.target_language}.
-        
-        Maintain the original Markdown formatting.
-        Do not translate Mermaid.js code blocks.
-        
-        Text to translate:
-        {request.text}
-        """
-        
-        # Retry logic
-        max_retries = 3
-        for attempt in range(max_retries):
-            try:
-                response = await client.aio.models.generate_content(
-                    model='gemini-2.5-flash', # Using flash model for speed
-                    contents=prompt
-                )
-                return {"translated_text": response.text}
-            except Exception as e:
-                if "429" in str(e) and attempt < max_retries - 1:
-                    wait_time = 2 ** attempt
-                    print(f"Quota exceeded, retrying in {wait_time} seconds...")
-                    await asyncio.sleep(wait_time)
-                else:
-                    raise e
+        cached = await db.get_cached_translation(content_hash, language)
+        cache_lookup("translation", hit=cached is not None)
+        if cached is not None:
+            log(f"Translation cache hit for {content_hash[:12]} ({language})")
+            return {"translated_text": cached}
     except Exception as e:
-        print(f"Translation error: {e}")
-        raise HTTPException(status_code=500, detail=f"Translation failed: {str(e)}")
+        log(f"Translation cache lookup failed: {e}")
 
-@app.post("/upload")
-async def upload_file(file: UploadFile = File(...)):
-    print(f"Received upload request: {file.filename}")
-    
-    if not file.filename.endswith((".pdf", ".docx")):
-        raise HTTPException(status_code=400, detail="File must be a PDF or Word (.docx) document")
+    try:
+        translated = await translate_markdown(request.text, request.target_language, generate_translation)
+    except Exception as e:
+        log(f"Translation error: {e}")
+        raise HTTPException(status_code=500, detail=f"Translation failed: {str(e)}")
 
     try:
-        # Read file content - awaiting file.read() is non-blocking in FastAPI
-        print(f"Reading file content...")
-        content = await file.read()
-        text = ""
-
-        # Offload CPU-bound processing to thread header
-        if file.filename.lower().endswith(".pdf"):
-            print(f"Processing PDF in thread...")
-            text = await asyncio.to_thread(process_pdf_sync, content)
-        
-        elif file.filename.lower().endswith(".docx"):
-            print(f"Processing Word Document in thread...")
-            text = await asyncio.to_thread(process_docx_sync, content)
-        
-        print(f"Text extraction complete. Length: {len(text)} characters.")
-        if not text.strip():
-            print("Extraction failed (empty text).")
-            raise HTTPException(status_code=400, detail="Could not extract text. It might be scanned or empty.")
-
-        doc_id = str(uuid.uuid4())
-        documents[doc_id] = text
-        print(f"Stored document text with ID: {doc_id}")
-
-        print(f"Calling Gemini API asynchronously...")
-        study_guide = await get_gemini_response_async(text)
-        print("Gemini response received.")
-        
-        return {"filename": file.filename, "study_guide": study_guide, "doc_id": doc_id}
+        await db.save_cached_translation(content_hash, language, translated)
+    except Exception as e:
+        log(f"Translation cache write failed: {e}")
+    return {"translated_text": translated}
+
+async def extract_upload(file: UploadFile, sections: Optional[StreamingSections] = None
+                         ) -> Tuple[str, str, Optional[Dict[str, Any]]]:
+    """Spools and extracts an uploaded file, consulting the upload cache first.
+
+    Returns the content hash, the extracted text and the cache row (if any).
+    """
+    log(f"Reading file content...")
+    with span("upload_read"):
+        upload = await spool_upload(file)
+    with upload:
+        return await extract_document(upload, sections)
+
+async def extract_document(upload: SpooledUpload, sections: Optional[StreamingSections] = None
+                           ) -> Tuple[str, str, Optional[Dict[str, Any]]]:
+    """Extracts the upload's text, feeding it to `sections` as pages come out of the extractor."""
+    content_hash = upload.content_hash
+
+    # Identical files (e.g. the same lecture uploaded by a whole class) are served from the cache
+    cached = None
+    try:
+        cached = await db.get_cached_upload(content_hash)
+    except Exception as e:
+        log(f"Upload cache lookup failed: {e}")
+    cache_lookup("upload", hit=bool(cached))
 
+    if cached:
+        log(f"Upload cache hit for {content_hash[:12]}")
+        return content_hash, cached['extracted_text'], cached
+
+    # Offload CPU-bound processing to a thread, consuming its output as it is produced
+    if upload.kind == "pdf":
+        log(f"Processing PDF in thread...")
+        pieces = iterate_in_thread(lambda: iter_pdf_text(upload.path))
+    else:
+        log(f"Processing Word Document in thread...")
+        pieces = iterate_in_thread(lambda: iter_docx_text(upload.path))
+
+    parts = []
+    try:
+        with span("extract", kind=upload.kind, bytes=upload.size) as fields:
+            async for piece in pieces:
+                parts.append(piece)
+                if sections is not None:
+                    sections.feed(piece)
+            fields["chars"] = sum(len(part) for part in parts)
+    except NoTextLayer:
+        log("Extraction failed (no text layer).")
+        raise HTTPException(status_code=400, detail="Could not extract text. The PDF looks scanned or empty; upload a version with selectable text.")
+    except Exception as e:
+        # A corrupt file fails the same way every time, so report it as a client error
+        log(f"Extraction error: {e}")
+        raise HTTPException(status_code=400, detail="Could not read the file. It might be corrupt or password-protected.")
+    
+    text = "".join(parts)
+    log(f"Text extraction complete. Length: {len(text)} characters.")
+    if not text.strip():
+        log("Extraction failed (empty text).")
+        raise HTTPException(status_code=400, detail="Could not extract text. It might be scanned or empty.")
+
+    # Cache the extraction before the Gemini call so a failed generation still saves the work
+    await save_upload_to_cache(content_hash, text)
+    return content_hash, text, None
+
+async def run_upload_job(job: Job) -> Dict[str, Any]:
+    # Logs from the worker carry the id of the request that submitted the job
+    with bind_request_id(job.payload.get("request_id")):
+        if "uploads" in job.payload:
+            return await process_batch_job(job)
+        return await process_upload_job(job)
+
+async def process_upload_job(job: Job) -> Dict[str, Any]:
+    upload = job.payload["upload"]
+    job.update(stage="extracting")
+    sections = new_streaming_sections()
+    try:
+        content_hash, text, cached = await extract_document(upload, sections)
+        doc_id = await register_job_document(job, "document", text)
+
+        if cached and cached['study_guide']:
+            study_guide = cached['study_guide']
+        else:
+            job.update(stage="generating")
+            log(f"Calling Gemini API asynchronously...")
+            with span("study_guide", chars=len(text)):
+                study_guide = await get_gemini_response_async(text, sections)
+            log("Gemini response received.")
+            await save_upload_to_cache(content_hash, text, study_guide)
+    finally:
+        if sections is not None:
+            sections.cancel()
+
+    # Precompute quizzes now that the study guide no longer competes for the model
+    quizzes.prefetch(doc_id)
+    return {"filename": upload.filename, "study_guide": study_guide, "doc_id": doc_id}
+
+# Files of one batch extracted at the same time (PDF pages also share the extraction pool)
+BATCH_CONCURRENCY = int(os.getenv("BATCH_CONCURRENCY", "4"))
+BATCH_MODES = ("combined", "separate")
+
+def combine_documents(files: List[Dict[str, Any]], texts: Dict[int, str]) -> str:
+    """One text for the whole set, with each file under its own heading so answers can name it."""
+    return "\n\n".join(f"# {files[i]['filename']}\n\n{text}" for i, text in sorted(texts.items()))
+
+async def process_batch_job(job: Job) -> Dict[str, Any]:
+    uploads: List[SpooledUpload] = job.payload["uploads"]
+    mode = job.payload["mode"]
+    files = [{"filename": upload.filename, "status": "queued", "doc_id": None, "error": None} for upload in uploads]
+    progress = {"files": files}
+
+    def set_file(i: int, **changes):
+        files[i].update(changes)
+        job.update(progress=progress)
+
+    texts: Dict[int, str] = {}
+    hashes: Dict[int, str] = {}
+    guides: Dict[int, str] = {}
+    limit = asyncio.Semaphore(BATCH_CONCURRENCY)
+
+    async def extract(i: int, upload: SpooledUpload):
+        async with limit:
+            set_file(i, status="extracting")
+            try:
+                content_hash, text, cached = await extract_document(upload)
+            except HTTPException as e:
+                if e.status_code >= 500:
+                    raise
+                # One unreadable file should not fail the rest of the set
+                set_file(i, status="failed", error=e.detail)
+                return
+            texts[i] = text
+            hashes[i] = content_hash
+            if cached and cached['study_guide']:
+                guides[i] = cached['study_guide']
+            set_file(i, status="extracted", doc_id=await register_job_document(job, f"file-{i}", text))
+
+    job.update(stage="extracting", progress=progress)
+    with span("batch_extract", files=len(uploads)):
+        await asyncio.gather(*(extract(i, upload) for i, upload in enumerate(uploads)))
+    if not texts:
+        raise HTTPException(status_code=400, detail="None of the files could be read.")
+
+    # The set gets its own doc_id, so /chat and /quiz cover every file at once
+    set_text = combine_documents(files, texts)
+    set_doc_id = await register_job_document(job, "set", set_text)
+
+    job.update(stage="generating")
+    study_guide = None
+    if mode == "combined":
+        with span("study_guide", chars=len(set_text), files=len(texts)):
+            study_guide = await get_gemini_response_async(set_text)
+        for i in texts:
+            set_file(i, status="done")
+    else:
+        async def generate(i: int):
+            if i not in guides:
+                set_file(i, status="generating")
+                with span("study_guide", chars=len(texts[i])):
+                    guides[i] = await get_gemini_response_async(texts[i])
+                await save_upload_to_cache(hashes[i], texts[i], guides[i])
+            set_file(i, status="done")
+
+        await asyncio.gather(*(generate(i) for i in texts))
+
+    quizzes.prefetch(set_doc_id)
+    return {
+        "doc_id": set_doc_id,
+        "mode": mode,
+        "study_guide": study_guide,
+        "files": [
+            {"filename": f["filename"], "doc_id": f["doc_id"], "study_guide": guides.get(i) if mode == "separate" else None,
+             "error": f["error"]}
+            for i, f in enumerate(files)
+        ]
+    }
+
+def release_upload_job(job: Job):
+    for upload in job.payload.get("uploads") or [job.payload["upload"]]:
+        upload.close()
+
+# Worker pool behind POST /upload, started in lifespan
+upload_jobs = JobQueue(run_upload_job, cleanup=release_upload_job)
+
+@app.post("/upload", status_code=202)
+async def upload_file(request: Request, file: UploadFile = File(...)):
+    """Queues the file for extraction and study-guide generation and returns a job id.
+
+    Follow the job with GET /jobs/{job_id} or GET /jobs/{job_id}/events. Submitting
+    the same file again (or the same Idempotency-Key header) joins the same job under a
+    job id of its own, so one submitter cancelling does not stop it for the others.
+    """
+    log(f"Received upload request: {file.filename}")
+    with span("upload_read"):
+        upload = await spool_upload(file)
+    key = request.headers.get("idempotency-key") or upload.content_hash
+    payload = {"upload": upload, "request_id": request_id_var.get()}
+    job_id, job = upload_jobs.submit(key, payload)
+    if job.payload is not payload:
+        upload.close()  # An existing job already covers this file
+    return {"job_id": job_id, "status": job.status}
+
+@app.post("/upload/batch", status_code=202)
+async def upload_batch(request: Request, files: List[UploadFile] = File(...), mode: str = Form("combined")):
+    """Queues a set of files (e.g. a week of lectures) as one job and returns its id.
+
+    Files are extracted concurrently; `mode` is "combined" for one study guide covering
+    the set or "separate" for one per file. The job's progress lists each file's status
+    as it changes (follow GET /jobs/{job_id}/events). The result has a doc_id for the
+    whole set, usable with /chat and /quiz, plus each file's own doc_id.
+    """
+    if mode not in BATCH_MODES:
+        raise HTTPException(status_code=400, detail=f"mode must be one of: {', '.join(BATCH_MODES)}")
+    log(f"Received batch upload request: {len(files)} files")
+    with span("upload_read", files=len(files)):
+        uploads = await spool_uploads(files)
+    digest = hashlib.sha256(mode.encode("utf-8"))
+    for upload in uploads:
+        digest.update(upload.content_hash.encode("ascii"))
+    key = request.headers.get("idempotency-key") or f"batch-{digest.hexdigest()}"
+    payload = {"uploads": uploads, "mode": mode, "request_id": request_id_var.get()}
+    job_id, job = upload_jobs.submit(key, payload)
+    if job.payload is not payload:
+        for upload in uploads:
+            upload.close()
+    return {"job_id": job_id, "status": job.status}
+
+@app.get("/jobs/{job_id}")
+async def read_job(job_id: str):
+    job = upload_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return job.to_dict(job_id)
+
+@app.get("/jobs/{job_id}/events")
+async def follow_job(job_id: str):
+    """Server-Sent Events: a `job` event with the job's state after every change, until it finishes."""
+    job = upload_jobs.get(job_id)
+    if job is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+
+    async def event_stream():
+        async for state in upload_jobs.follow(job, job_id):
+            yield sse_event("job", state)
+
+    return StreamingResponse(
+        with_heartbeats(event_stream()),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+@app.delete("/jobs/{job_id}")
+async def cancel_job(job_id: str):
+    """Cancels this job id's interest in the job; the work stops once no other submitter shares it."""
+    state = upload_jobs.cancel(job_id)
+    if state is None:
+        raise HTTPException(status_code=404, detail="Job not found")
+    return state
+
+def sse_event(event: str, data: Dict[str, Any]) -> str:
+    return f"event: {event}\ndata: {json.dumps(data)}\n\n"
+
+# Proxies drop connections that stay silent for too long (often 60 seconds)
+SSE_HEARTBEAT_SECONDS = float(os.getenv("SSE_HEARTBEAT_SECONDS", "15"))
+SSE_HEARTBEAT = ": keepalive\n\n"  # An SSE comment, ignored by clients
+
+async def with_heartbeats(events: AsyncIterator[str], interval: float = SSE_HEARTBEAT_SECONDS) -> AsyncIterator[str]:
+    """Relays SSE events, adding a heartbeat whenever the source is quiet for `interval` seconds.
+
+    Keeps the connection alive while, e.g., a long document's sections are summarized
+    before the first study-guide chunk exists.
+    """
+    iterator = events.__aiter__()
+    pending = asyncio.ensure_future(iterator.__anext__())
+    try:
+        while True:
+            done, _ = await asyncio.wait({pending}, timeout=interval)
+            if not done:
+                yield SSE_HEARTBEAT
+                continue
+            try:
+                event = pending.result()
+            except StopAsyncIteration:
+                return
+            yield event
+            pending = asyncio.ensure_future(iterator.__anext__())
+    finally:
+        # The client went away: stop the source, running its cleanup
+        if not pending.done():
+            pending.cancel()
+            await asyncio.gather(pending, return_exceptions=True)
+        await iterator.aclose()
+
+@app.post("/upload/stream")
+async def upload_file_stream(file: UploadFile = File(...)):
+    """Same as /upload, but relays the study guide as Server-Sent Events while Gemini writes it.
+
+    Events: `meta` (doc_id, filename), then `chunk` (text) repeatedly, then `done` or `error`.
+    A `: keepalive` comment is sent whenever nothing else was for SSE_HEARTBEAT_SECONDS,
+    e.g. while a long document is summarized section by section.
+    """
+    log(f"Received streaming upload request: {file.filename}")
+
+    # Extraction errors are still reported as a normal HTTP error, before the stream starts
+    sections = new_streaming_sections()
+    try:
+        content_hash, text, cached = await extract_upload(file, sections)
     except HTTPException as he:
+        if sections is not None:
+            sections.cancel()
         raise he
     except Exception as e:
-        print(f"Error in upload: {e}")
+        if sections is not None:
+            sections.cancel()
+        log(f"Error in upload: {e}")
         raise HTTPException(status_code=500, detail=f"An error occurred: {str(e)}")
 
-@app.post("/chat")
-async def chat_with_document(request: ChatRequest):
-    if request.doc_id not in documents:
-        raise HTTPException(status_code=404, detail="Document context not found. Please re-upload.")
-    
-    doc_text = documents[request.doc_id]
-    
-    if not client:
-         raise HTTPException(status_code=500, detail="Gemini API Key not configured.")
+    if not gemini and not (cached and cached['study_guide']):
+        raise HTTPException(status_code=500, detail="Gemini API Key not configured.")
 
-    try:
-        # Construct chat prompt
-        chat_prompt = f"""
+    doc_id = await register_document(text)
+
+    async def event_stream():
+        yield sse_event("meta", {"doc_id": doc_id, "filename": file.filename})
+
+        if cached and cached['study_guide']:
+            yield sse_event("chunk", {"text": cached['study_guide']})
+            yield sse_event("done", {})
+            quizzes.prefetch(doc_id)
+            return
+
+        parts = []
+        try:
+            log(f"Streaming Gemini response...")
+            async for piece in stream_gemini_response_async(text, sections):
+                parts.append(piece)
+                yield sse_event("chunk", {"text": piece})
+        except Exception as e:
+            log(f"Error generating content: {e}")
+            yield sse_event("error", {"detail": f"AI generation failed: {str(e)}"})
+            return
+        finally:
+            # Stops section summaries if the client disconnected while they were running
+            if sections is not None:
+                sections.cancel()
+
+        log("Gemini stream complete.")
+        await save_upload_to_cache(content_hash, text, "".join(parts))
+        yield sse_event("done", {})
+        quizzes.prefetch(doc_id)
+
+    return StreamingResponse(
+        with_heartbeats(event_stream()),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"}
+    )
+
+def build_chat_prompt(context: Optional[str], history: str, question: str) -> str:
+    """Chat prompt with the given document excerpts, or for a document already in the cached context."""
+    document = f"Relevant Document Content:\n{context}" if context is not None else "The document is provided above."
+    return f"""
         You are a helpful AI tutor assistant.
         
-        Document Content (Truncated):
-        {doc_text[:100000]}...
+        {document}
         
         Chat History:
-        {request.messages}
+        {history}
         
-        User Question: {request.question}
+        User Question: {question}
         
         Answer concise and helpful:
         """
-        max_retries = 3
-        for attempt in range(max_retries):
-            try:
-                response = await client.aio.models.generate_content(
-                    model='gemini-2.5-flash',
-                    contents=chat_prompt
-                )
-                return {"answer": response.text}
-            except Exception as e:
-                if "429" in str(e) and attempt < max_retries - 1:
-                    wait_time = 2 ** attempt
-                    print(f"Quota exceeded in chat, retrying in {wait_time} seconds...")
-                    await asyncio.sleep(wait_time)
-                else:
-                    raise e
+
+# Errors that mean the provider no longer has (or never accepts) a cache we reference
+CONTEXT_CACHE_ERROR_CODES = {400, 403, 404}
+
+async def generate_for_document(doc_id: str, doc_text: str, endpoint: str,
+                                inline_prompt: Callable[[], Awaitable[str]], cached_prompt: str,
+                                config: Optional[Dict[str, Any]] = None):
+    """Asks Gemini about a stored document, referencing its context cache when there is one.
+
+    `inline_prompt` builds a prompt carrying the document (or excerpts) itself and is only
+    awaited when no cache can be used.
+    """
+    model = router.route(doc_text, endpoint).model
+    expires_at = await asyncio.to_thread(documents.expires_at, doc_id)
+    cache_name = await context_cache.get(doc_id, doc_text, model, expires_at)
+    if cache_name:
+        try:
+            return await gemini.generate(cached_prompt, endpoint, model=model,
+                                         config={**(config or {}), "cached_content": cache_name})
+        except Exception as e:
+            if error_code(e) not in CONTEXT_CACHE_ERROR_CODES:
+                raise
+            log(f"Context cache {cache_name} was rejected ({error_code(e)}), sending the document inline.")
+            context_cache.invalidate(doc_id, model)
+    return await gemini.generate(await inline_prompt(), endpoint, model=model, config=config)
+
+@app.post("/chat")
+async def chat_with_document(request: ChatRequest):
+    doc_text = await asyncio.to_thread(documents.get, request.doc_id)
+    if doc_text is None:
+        raise HTTPException(status_code=404, detail="Document context not found. Please re-upload.")
+    await asyncio.to_thread(documents.touch, request.doc_id)
+    
+    if not gemini:
+         raise HTTPException(status_code=500, detail="Gemini API Key not configured.")
+
+    # The history lives on the server; a new or expired session starts from what the client sent
+    session_id = request.session_id
+    session = await asyncio.to_thread(chat_sessions.get, request.doc_id, session_id) if session_id else None
+    if session is None:
+        session_id = session_id if session_id and chat_sessions.is_valid_id(session_id) else new_session_id()
+        session = ChatSession(messages=request.messages)
+
+    history = format_history(session)
+
+    async def inline_prompt() -> str:
+        with span("chat_context", doc_chars=len(doc_text)):
+            context = await asyncio.to_thread(
+                select_chat_context, request.doc_id, doc_text, request.question, session.messages
+            )
+        return build_chat_prompt(context, history, request.question)
+
+    try:
+        cached_prompt = build_chat_prompt(None, history, request.question)
+        response = await generate_for_document(request.doc_id, doc_text, "chat", inline_prompt, cached_prompt)
+        answer = response.text
     except Exception as e:
-        print(f"Chat error: {e}")
-        return {"answer": "I'm sorry, I encountered an error while processing your question via AI."}
+        log(f"Chat error: {e}")
+        return {"answer": "I'm sorry, I encountered an error while processing your question via AI.", "session_id": session_id}
+
+    turn = [ChatMessage(role="user", content=request.question), ChatMessage(role="assistant", content=answer)]
+    session = await asyncio.to_thread(chat_sessions.append, request.doc_id, session_id, turn, request.messages)
+    if needs_compaction(session):
+        # Folding old turns into the summary happens after the answer is sent
+        spawn(chat_sessions.compact(request.doc_id, session_id, generate_chat_summary))
+    return {"answer": answer, "session_id": session_id}
 class QuizRequest(BaseModel):
     doc_id: Optional[str] = None
     text: Optional[str] = None
 
-@app.post("/quiz")
-async def generate_quiz(request: QuizRequest):
-    doc_text = ""
-    if request.doc_id and request.doc_id in documents:
-        doc_text = documents[request.doc_id]
-    elif request.text:
-        doc_text = request.text
-    else:
-        raise HTTPException(status_code=400, detail="Either doc_id or text must be provided")
-    
-    prompt = f"""Based on the following text, generate a quiz with 10 multiple-choice questions.
-    Return a JSON array of objects, where each object has:
-    - "question": The question string
-    - "options": A list of 4 answer options (strings)
-    - "correct_answer": The index of the correct answer (0-3)
+QUIZ_CONFIG = {'response_mime_type': 'application/json'}
 
-    Text (Truncated):
-    {doc_text[:10000]}
-    """ # Limiting text for context window
+async def generate_quiz_from_text(text: str, model: Optional[str] = None) -> list:
+    if not gemini:
+        raise HTTPException(status_code=500, detail="Gemini client not initialized")
+    response = await gemini.generate(build_quiz_prompt(text), "quiz", model=model, config=QUIZ_CONFIG)
+    return json.loads(response.text)
 
-    try:
-        if not client:
-             raise HTTPException(status_code=500, detail="Gemini client not initialized")
+def select_quiz_context(doc_id: str, doc_text: str, seed: int) -> str:
+    # Questions should cover the whole document, not just its first pages
+    if len(doc_text) <= CHAT_FULL_TEXT_CHARS:
+        return doc_text
+    index = indexes.get_or_build(doc_id, doc_text)
+    return "\n...\n".join(index.excerpts(doc_text, index.sample(QUIZ_SAMPLE_CHUNKS, seed=seed)))
 
-        max_retries = 3
-        for attempt in range(max_retries):
-            try:
-                response = await client.aio.models.generate_content(
-                    model="gemini-2.5-flash",
-                    contents=prompt,
-                    config={
-                        'response_mime_type': 'application/json'
-                    }
-                )
-                return json.loads(response.text)
-            except Exception as e:
-                if "429" in str(e) and attempt < max_retries - 1:
-                    wait_time = 2 ** attempt
-                    print(f"Quota exceeded in quiz, retrying in {wait_time} seconds...")
-                    await asyncio.sleep(wait_time)
-                else:
-                    raise e
+async def make_quiz(doc_id: str, seed: int) -> list:
+    doc_text = await asyncio.to_thread(documents.get, doc_id)
+    if not doc_text:
+        raise HTTPException(status_code=404, detail="Document not found")
+    if not gemini:
+        raise HTTPException(status_code=500, detail="Gemini client not initialized")
+
+    async def inline_prompt() -> str:
+        return build_quiz_prompt(await asyncio.to_thread(select_quiz_context, doc_id, doc_text, seed))
+
+    response = await generate_for_document(doc_id, doc_text, "quiz", inline_prompt, build_cached_quiz_prompt(seed), QUIZ_CONFIG)
+    return json.loads(response.text)
+
+quizzes = QuizCache(make_quiz) # Ready quiz variants per doc_id, refilled in the background
+
+@app.post("/quiz")
+async def generate_quiz(request: QuizRequest):
+    try:
+        if request.doc_id and await asyncio.to_thread(documents.__contains__, request.doc_id):
+            return await quizzes.take(request.doc_id)
+        if request.text:
+            return await generate_quiz_from_text(request.text[:CHAT_FULL_TEXT_CHARS], router.route(request.text, "quiz").model)
+    except HTTPException as he:
+        raise he
     except Exception as e:
-        print(f"Quiz generation error: {e}")
+        log(f"Quiz generation error: {e}")
         raise HTTPException(status_code=500, detail=str(e))
+    raise HTTPException(status_code=400, detail="Either doc_id or text must be provided")
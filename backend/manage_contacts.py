@@ -1,55 +1,34 @@
 import psycopg2
-import psycopg2.extras
-import os
-from dotenv import load_dotenv
-
-load_dotenv()
-
-DATABASE_URL = os.getenv("DATABASE_URL")
-
-def get_db_connection():
-    if not DATABASE_URL:
-        print("Error: DATABASE_URL not set in environment.")
-        return None
-    try:
-        conn = psycopg2.connect(DATABASE_URL)
-        conn.cursor_factory = psycopg2.extras.DictCursor
-        return conn
-    except Exception as e:
-        print(f"Error connecting to database: {e}")
-        return None
+from database import get_db_connection, close_pool
 
 def fetch_contacts(resolved=False):
-    conn = get_db_connection()
-    if not conn: return []
+    with get_db_connection() as conn:
+        if not conn: return []
     
-    c = conn.cursor()
-    # 0 is unresolved, 1 is resolved
-    status = 1 if resolved else 0
-    c.execute('SELECT * FROM contact_submissions WHERE issue_resolved = %s ORDER BY timestamp DESC', (status,))
-    submissions = c.fetchall()
-    conn.close()
-    return submissions
+        c = conn.cursor()
+        # 0 is unresolved, 1 is resolved
+        status = 1 if resolved else 0
+        c.execute('SELECT * FROM contact_submissions WHERE issue_resolved = %s ORDER BY timestamp DESC', (status,))
+        submissions = c.fetchall()
+        return submissions
 
 def resolve_contact(contact_id):
-    conn = get_db_connection()
-    if not conn: return False
-    c = conn.cursor()
-    c.execute('UPDATE contact_submissions SET issue_resolved = 1 WHERE id = %s', (contact_id,))
-    conn.commit()
-    rows_affected = c.rowcount
-    conn.close()
-    return rows_affected > 0
+    with get_db_connection() as conn:
+        if not conn: return False
+        c = conn.cursor()
+        c.execute('UPDATE contact_submissions SET issue_resolved = 1 WHERE id = %s', (contact_id,))
+        conn.commit()
+        rows_affected = c.rowcount
+        return rows_affected > 0
 
 def delete_contact(contact_id):
-    conn = get_db_connection()
-    if not conn: return False
-    c = conn.cursor()
-    c.execute('DELETE FROM contact_submissions WHERE id = %s', (contact_id,))
-    conn.commit()
-    rows_affected = c.rowcount
-    conn.close()
-    return rows_affected > 0
+    with get_db_connection() as conn:
+        if not conn: return False
+        c = conn.cursor()
+        c.execute('DELETE FROM contact_submissions WHERE id = %s', (contact_id,))
+        conn.commit()
+        rows_affected = c.rowcount
+        return rows_affected > 0
 
 def display_submission(s):
     print(f"\n[{s['timestamp'].strftime('%Y-%m-%d %H:%M')}] ID: {s['id']}")
@@ -122,4 +101,9 @@ def main():
             print("Invalid choice.")
 
 if __name__ == "__main__":
-    main()
+    try:
+        main()
+    except psycopg2.OperationalError as e:
+        print(f"Error connecting to database: {e}")
+    finally:
+        close_pool()
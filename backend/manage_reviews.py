@@ -1,64 +1,48 @@
 import psycopg2
-import psycopg2.extras
-import os
-from dotenv import load_dotenv
-
-load_dotenv()
-
-DATABASE_URL = os.getenv("DATABASE_URL")
-
-def get_db_connection():
-    if not DATABASE_URL:
-        print("Error: DATABASE_URL not set in environment.")
-        return None
-    try:
-        conn = psycopg2.connect(DATABASE_URL)
-        conn.cursor_factory = psycopg2.extras.DictCursor
-        return conn
-    except Exception as e:
-        print(f"Error connecting to database: {e}")
-        return None
+from database import get_db_connection, close_pool, NOTIFY_REVIEWS_CHANGED_SQL
 
 def list_reviews(is_approved):
-    conn = get_db_connection()
-    if not conn: return []
+    with get_db_connection() as conn:
+        if not conn: return []
     
-    c = conn.cursor()
-    c.execute('SELECT * FROM reviews WHERE is_approved = %s ORDER BY created_at DESC', (is_approved,))
-    reviews = c.fetchall()
-    # DictCursor allows dictionary-like access
-    conn.close()
-    return reviews
+        c = conn.cursor()
+        c.execute('SELECT * FROM reviews WHERE is_approved = %s ORDER BY created_at DESC', (is_approved,))
+        reviews = c.fetchall()
+        # DictCursor allows dictionary-like access
+        return reviews
 
 def approve_review(review_id):
-    conn = get_db_connection()
-    if not conn: return False
-    c = conn.cursor()
-    c.execute('UPDATE reviews SET is_approved = TRUE WHERE id = %s', (review_id,))
-    conn.commit()
-    rows_affected = c.rowcount
-    conn.close()
-    return rows_affected > 0
+    with get_db_connection() as conn:
+        if not conn: return False
+        c = conn.cursor()
+        c.execute('UPDATE reviews SET is_approved = TRUE WHERE id = %s', (review_id,))
+        rows_affected = c.rowcount
+        if rows_affected:
+            c.execute(NOTIFY_REVIEWS_CHANGED_SQL) # Delivered to the API on commit
+        conn.commit()
+        return rows_affected > 0
 
 def unapprove_review(review_id):
-    conn = get_db_connection()
-    if not conn: return False
-    c = conn.cursor()
-    c.execute('UPDATE reviews SET is_approved = FALSE WHERE id = %s', (review_id,))
-    conn.commit()
-    rows_affected = c.rowcount
-    conn.close()
-    return rows_affected > 0
+    with get_db_connection() as conn:
+        if not conn: return False
+        c = conn.cursor()
+        c.execute('UPDATE reviews SET is_approved = FALSE WHERE id = %s', (review_id,))
+        rows_affected = c.rowcount
+        if rows_affected:
+            c.execute(NOTIFY_REVIEWS_CHANGED_SQL) # Delivered to the API on commit
+        conn.commit()
+        return rows_affected > 0
 
 def delete_review(review_id):
-    conn = get_db_connection()
-    if not conn: return False
-    c = conn.cursor()
-    c.execute('DELETE FROM reviews WHERE id = %s', (review_id,))
-    conn.commit()
-    rows_affected = c.rowcount
-    conn.close()
-    return rows_affected > 0
+    with get_db_connection() as conn:
+        if not conn: return False
+        c = conn.cursor()
+        c.execute('DELETE FROM reviews WHERE id = %s', (review_id,))
+        rows_affected = c.rowcount
+        if rows_affected:
+            c.execute(NOTIFY_REVIEWS_CHANGED_SQL) # Delivered to the API on commit
+        conn.commit()
+        return rows_affected > 0
 
 def handle_pending():
     while True:
@@ -139,4 +123,9 @@ def main():
             print("Invalid choice.")
 
 if __name__ == "__main__":
-    main()
+    try:
+        main()
+    except psycopg2.OperationalError as e:
+        print(f"Error connecting to database: {e}")
+    finally:
+        close_pool()
@@ -0,0 +1,185 @@
+"""In-process metrics, timing spans and structured logs.
+
+Counters and histograms are rendered in the Prometheus text format by
+GET /metrics. span() times a stage of the current request into
+stage_duration_seconds and writes one JSON log line tagged with the request
+id, which the HTTP middleware assigns (or takes from an X-Request-ID header);
+log() writes other messages the same way.
+Work that outlives the request, such as upload jobs, carries the id along
+with bind_request_id().
+"""
+import os
+import json
+import time
+import uuid
+import bisect
+import functools
+import threading
+import contextvars
+from contextlib import contextmanager
+from typing import Dict, Iterator, Optional, Sequence, Tuple
+
+STRUCTURED_LOGS = os.getenv("STRUCTURED_LOGS", "1") != "0"
+
+SECONDS_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 30, 60, 120, 300)
+CHARS_BUCKETS = (1000, 5000, 20000, 50000, 100000, 250000, 500000, 1000000, 2500000)
+
+request_id_var: contextvars.ContextVar[Optional[str]] = contextvars.ContextVar("request_id", default=None)
+
+def new_request_id() -> str:
+    return uuid.uuid4().hex[:16]
+
+@contextmanager
+def bind_request_id(request_id: Optional[str]) -> Iterator[None]:
+    token = request_id_var.set(request_id)
+    try:
+        yield
+    finally:
+        request_id_var.reset(token)
+
+def log_event(event: str, **fields):
+    if not STRUCTURED_LOGS:
+        return
+    record = {"ts": round(time.time(), 3), "event": event, "request_id": request_id_var.get()}
+    record.update(fields)
+    print(json.dumps(record, default=str), flush=True)
+
+def log(message: str, **fields):
+    """A human-readable log line, tagged with the current request id.
+
+    Written as a JSON "log" event like the spans, or as plain text when
+    STRUCTURED_LOGS is off.
+    """
+    if STRUCTURED_LOGS:
+        log_event("log", message=message, **fields)
+        return
+    request_id = request_id_var.get()
+    print(f"[{request_id}] {message}" if request_id else message, flush=True)
+
+def _escape(value: str) -> str:
+    return value.replace("\\", "\\\\").replace("\n", "\\n").replace('"', '\\"')
+
+def _labels(names: Sequence[str], values: Tuple[str, ...], extra: str = "") -> str:
+    pairs = [f'{name}="{_escape(value)}"' for name, value in zip(names, values)]
+    if extra:
+        pairs.append(extra)
+    return "{" + ",".join(pairs) + "}" if pairs else ""
+
+class Metric:
+    kind = ""
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        self.name = name
+        self.help = help
+        self.labelnames = tuple(labelnames)
+        self._lock = threading.Lock()  # Extraction threads record metrics too
+        REGISTRY.append(self)
+
+    def _key(self, labels: Dict[str, str]) -> Tuple[str, ...]:
+        return tuple(str(labels.get(name, "")) for name in self.labelnames)
+
+    def render(self) -> str:
+        lines = [f"# HELP {self.name} {self.help}", f"# TYPE {self.name} {self.kind}"]
+        with self._lock:
+            lines.extend(self._samples())
+        return "\n".join(lines)
+
+    def _samples(self):
+        raise NotImplementedError
+
+class Counter(Metric):
+    kind = "counter"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = ()):
+        super().__init__(name, help, labelnames)
+        self._values: Dict[Tuple[str, ...], float] = {}
+
+    def inc(self, amount: float = 1, **labels):
+        key = self._key(labels)
+        with self._lock:
+            self._values[key] = self._values.get(key, 0) + amount
+
+    def _samples(self):
+        for key, value in sorted(self._values.items()):
+            yield f"{self.name}{_labels(self.labelnames, key)} {value}"
+
+class Histogram(Metric):
+    kind = "histogram"
+
+    def __init__(self, name: str, help: str, labelnames: Sequence[str] = (), buckets: Sequence[float] = SECONDS_BUCKETS):
+        super().__init__(name, help, labelnames)
+        self.buckets = tuple(sorted(buckets))
+        self._series: Dict[Tuple[str, ...], list] = {}  # key -> [bucket counts..., sum, count]
+
+    def observe(self, value: float, **labels):
+        key = self._key(labels)
+        index = bisect.bisect_left(self.buckets, value)
+        with self._lock:
+            series = self._series.get(key)
+            if series is None:
+                series = self._series[key] = [0] * (len(self.buckets) + 2)
+            if index < len(self.buckets):
+                series[index] += 1
+            series[-2] += value
+            series[-1] += 1
+
+    def _samples(self):
+        for key, series in sorted(self._series.items()):
+            cumulative = 0
+            for bound, count in zip(self.buckets, series):
+                cumulative += count
+                labels = _labels(self.labelnames, key, 'le="%s"' % bound)
+                yield f"{self.name}_bucket{labels} {cumulative}"
+            labels = _labels(self.labelnames, key, 'le="+Inf"')
+            yield f"{self.name}_bucket{labels} {series[-1]}"
+            yield f"{self.name}_sum{_labels(self.labelnames, key)} {series[-2]}"
+            yield f"{self.name}_count{_labels(self.labelnames, key)} {series[-1]}"
+
+REGISTRY: list = []
+
+HTTP_REQUESTS = Counter("http_requests_total", "HTTP requests by route and status.", ("method", "route", "status"))
+HTTP_DURATION = Histogram("http_request_duration_seconds", "HTTP request latency until the response starts.", ("method", "route"))
+STAGE_DURATION = Histogram("stage_duration_seconds", "Time spent in each processing stage.", ("stage",))
+STAGE_ERRORS = Counter("stage_errors_total", "Stages that raised an exception.", ("stage",))
+GEMINI_CALLS = Counter("gemini_calls_total", "Gemini call attempts by outcome.", ("endpoint", "outcome"))
+GEMINI_RETRIES = Counter("gemini_retries_total", "Gemini calls retried after throttling, timeouts or server errors.", ("endpoint", "reason"))
+GEMINI_QUEUE_WAIT = Histogram("gemini_queue_wait_seconds", "Time a Gemini call waited for a slot and the rate limiter.", ("endpoint",))
+GEMINI_LATENCY = Histogram("gemini_response_seconds", "Gemini response time per attempt, excluding queueing.", ("endpoint",))
+GEMINI_PROMPT_CHARS = Histogram("gemini_prompt_chars", "Prompt size in characters.", ("endpoint",), CHARS_BUCKETS)
+CACHE_LOOKUPS = Counter("cache_lookups_total", "Cache lookups by cache and result.", ("cache", "result"))
+ROUTING_DECISIONS = Counter("routing_decisions_total", "Model chosen per document class.", ("endpoint", "doc_class", "model"))
+CONDENSE_TRUNCATIONS = Counter("condense_truncations_total", "Map-reduce notes cut to fit because the model stopped shrinking them.")
+PDF_PAGES = Counter("pdf_pages_total", "PDF pages extracted, by extraction tier.", ("tier",))
+PDF_PAGE_SECONDS = Histogram("pdf_page_seconds", "Extraction time per PDF page, by extraction tier.", ("tier",))
+
+def cache_lookup(cache: str, hit: bool):
+    CACHE_LOOKUPS.inc(cache=cache, result="hit" if hit else "miss")
+
+@contextmanager
+def span(stage: str, **fields) -> Iterator[Dict]:
+    """Times a stage. Extra fields can be added to the yielded dict before it ends."""
+    started = time.perf_counter()
+    error = None
+    try:
+        yield fields
+    except BaseException as e:
+        error = type(e).__name__
+        STAGE_ERRORS.inc(stage=stage)
+        raise
+    finally:
+        elapsed = time.perf_counter() - started
+        STAGE_DURATION.observe(elapsed, stage=stage)
+        log_event("span", stage=stage, duration_ms=round(elapsed * 1000, 2), error=error, **fields)
+
+def timed(stage: str):
+    """Decorator form of span() for coroutine functions."""
+    def decorate(func):
+        @functools.wraps(func)
+        async def wrapper(*args, **kwargs):
+            with span(stage):
+                return await func(*args, **kwargs)
+        return wrapper
+    return decorate
+
+def render() -> str:
+    return "\n".join(metric.render() for metric in REGISTRY) + "\n"
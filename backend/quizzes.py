@@ -0,0 +1,114 @@
+"""Quizzes precomputed in the background and served from a per-document queue.
+
+After an upload, a few quiz variants are generated concurrently. /quiz hands
+out one ready variant and immediately starts generating a replacement, so
+"regenerate" normally returns without waiting for the model.
+"""
+import os
+import asyncio
+import itertools
+from collections import OrderedDict, deque
+from typing import Any, Awaitable, Callable, Dict, List
+
+from metrics import cache_lookup, log
+
+QUIZ_VARIANTS = int(os.getenv("QUIZ_VARIANTS", "2"))
+QUIZ_SAMPLE_CHUNKS = int(os.getenv("QUIZ_SAMPLE_CHUNKS", "8"))
+QUIZ_CACHE_SIZE = int(os.getenv("QUIZ_CACHE_SIZE", "256"))
+
+Quiz = List[Dict[str, Any]]
+
+def build_quiz_prompt(text: str) -> str:
+    return f"""Based on the following text, generate a quiz with 10 multiple-choice questions.
+    Return a JSON array of objects, where each object has:
+    - "question": The question string
+    - "options": A list of 4 answer options (strings)
+    - "correct_answer": The index of the correct answer (0-3)
+
+    Text (excerpts from across the document):
+    {text}
+    """
+
+QUIZ_FOCUS_PARTS = 4
+
+def build_cached_quiz_prompt(seed: int) -> str:
+    """Quiz prompt for a document already in the model's cached context.
+
+    The model sees the whole document, so variants differ by which part they focus on.
+    """
+    part = seed % QUIZ_FOCUS_PARTS + 1
+    return f"""Based on the document above, generate a quiz with 10 multiple-choice questions.
+    Cover the whole document, but take about half of the questions from part {part} of {QUIZ_FOCUS_PARTS}
+    (dividing the document into {QUIZ_FOCUS_PARTS} equal parts in reading order).
+    Return a JSON array of objects, where each object has:
+    - "question": The question string
+    - "options": A list of 4 answer options (strings)
+    - "correct_answer": The index of the correct answer (0-3)
+    """
+
+class _Entry:
+    def __init__(self):
+        self.ready: "deque[Quiz]" = deque()
+        self.pending: "set[asyncio.Task]" = set()
+
+class QuizCache:
+    """Per-process LRU of ready quiz variants by doc_id.
+
+    `make_quiz(doc_id, seed)` generates one variant; each variant gets a new seed
+    so it is built from a different sample of the document.
+    """
+
+    def __init__(self, make_quiz: Callable[[str, int], Awaitable[Quiz]],
+                 variants: int = QUIZ_VARIANTS, max_entries: int = QUIZ_CACHE_SIZE):
+        self.make_quiz = make_quiz
+        self.variants = variants
+        self.max_entries = max_entries
+        self._entries: "OrderedDict[str, _Entry]" = OrderedDict()
+        self._seeds = itertools.count(1)
+
+    def _entry(self, doc_id: str) -> _Entry:
+        entry = self._entries.get(doc_id)
+        if entry is None:
+            entry = self._entries[doc_id] = _Entry()
+            while len(self._entries) > self.max_entries:
+                _, evicted = self._entries.popitem(last=False)
+                for task in evicted.pending:
+                    task.cancel()
+        self._entries.move_to_end(doc_id)
+        return entry
+
+    def _start(self, doc_id: str, entry: _Entry) -> asyncio.Task:
+        task = asyncio.create_task(self.make_quiz(doc_id, next(self._seeds)))
+        entry.pending.add(task)
+
+        def finished(task: asyncio.Task):
+            entry.pending.discard(task)
+            if task.cancelled():
+                return
+            if task.exception() is not None:
+                log(f"Quiz precompute failed for {doc_id}: {task.exception()}")
+                return
+            entry.ready.append(task.result())
+
+        task.add_done_callback(finished)
+        return task
+
+    def prefetch(self, doc_id: str):
+        """Starts generating variants until `variants` are ready or in progress."""
+        entry = self._entry(doc_id)
+        for _ in range(self.variants - len(entry.ready) - len(entry.pending)):
+            self._start(doc_id, entry)
+
+    async def take(self, doc_id: str) -> Quiz:
+        """Returns a quiz variant that no earlier call received, then refills the queue."""
+        entry = self._entry(doc_id)
+        cache_lookup("quiz", hit=bool(entry.ready))
+        while not entry.ready:
+            if entry.pending:
+                await asyncio.wait(set(entry.pending), return_when=asyncio.FIRST_COMPLETED)
+            else:
+                # Nothing precomputed (e.g. the upload was handled by another worker)
+                await asyncio.shield(self._start(doc_id, entry))
+        quiz = entry.ready.popleft()
+        self.prefetch(doc_id)
+        return quiz
@@ -0,0 +1,136 @@
+"""Lexical retrieval over document chunks, used to build compact chat prompts.
+
+Documents are split into overlapping chunks at upload time and indexed with
+BM25. Postings are stored in NumPy arrays grouped by term, so a query only
+touches the chunks containing its terms.
+"""
+import os
+import re
+import threading
+from collections import Counter, OrderedDict
+from typing import List, Optional, Tuple
+
+import numpy as np
+
+CHUNK_CHARS = int(os.getenv("RETRIEVAL_CHUNK_CHARS", "1500"))
+CHUNK_OVERLAP = int(os.getenv("RETRIEVAL_CHUNK_OVERLAP", "200"))
+INDEX_CACHE_SIZE = int(os.getenv("RETRIEVAL_INDEX_CACHE_SIZE", "64"))
+
+TOKEN_RE = re.compile(r"\w\w+")
+
+def tokenize(text: str) -> List[str]:
+    return TOKEN_RE.findall(text.lower())
+
+def chunk_spans(text: str, chunk_chars: int = CHUNK_CHARS, overlap: int = CHUNK_OVERLAP) -> List[Tuple[int, int]]:
+    """Splits text into overlapping (start, end) spans, preferring to cut at line breaks."""
+    spans = []
+    start = 0
+    length = len(text)
+    while start < length:
+        end = min(start + chunk_chars, length)
+        if end < length:
+            # Cut at the last line break (or space) in the second half of the chunk
+            cut = text.rfind("\n", start + chunk_chars // 2, end)
+            if cut == -1:
+                cut = text.rfind(" ", start + chunk_chars // 2, end)
+            if cut != -1:
+                end = cut + 1
+        spans.append((start, end))
+        if end >= length:
+            break
+        start = max(end - overlap, start + 1)
+    return spans
+
+class Bm25Index:
+    def __init__(self, text: str, k1: float = 1.5, b: float = 0.75):
+        self.spans = chunk_spans(text)
+        self.k1 = k1
+
+        vocab = {}
+        term_ids, chunk_ids, tfs = [], [], []
+        lengths = np.zeros(len(self.spans), dtype=np.float32)
+        for chunk_id, (start, end) in enumerate(self.spans):
+            counts = Counter(tokenize(text[start:end]))
+            lengths[chunk_id] = sum(counts.values())
+            for token, count in counts.items():
+                term_ids.append(vocab.setdefault(token, len(vocab)))
+                chunk_ids.append(chunk_id)
+                tfs.append(count)
+
+        term_ids = np.array(term_ids, dtype=np.int32)
+        order = np.argsort(term_ids, kind="stable")
+        self.vocab = vocab
+        self.postings_chunk = np.array(chunk_ids, dtype=np.int32)[order]
+        self.postings_tf = np.array(tfs, dtype=np.float32)[order]
+
+        df = np.bincount(term_ids, minlength=len(vocab))
+        self.indptr = np.concatenate(([0], np.cumsum(df)))
+        n = len(self.spans)
+        self.idf = np.log(1.0 + (n - df + 0.5) / (df + 0.5)).astype(np.float32)
+        avg_length = lengths.mean() if n else 1.0
+        self.length_norm = k1 * (1 - b + b * lengths / max(avg_length, 1.0))
+
+    def __len__(self) -> int:
+        return len(self.spans)
+
+    def search(self, query: str, k: int) -> List[int]:
+        """Returns up to k chunk ids ranked by BM25 score, most relevant first."""
+        scores = np.zeros(len(self.spans), dtype=np.float32)
+        for token in set(tokenize(query)):
+            term_id = self.vocab.get(token)
+            if term_id is None:
+                continue
+            lo, hi = self.indptr[term_id], self.indptr[term_id + 1]
+            rows = self.postings_chunk[lo:hi]
+            tf = self.postings_tf[lo:hi]
+            scores[rows] += self.idf[term_id] * tf * (self.k1 + 1) / (tf + self.length_norm[rows])
+
+        matched = np.flatnonzero(scores > 0)
+        if len(matched) > k:
+            matched = matched[np.argpartition(-scores[matched], k - 1)[:k]]
+        return [int(i) for i in matched[np.argsort(-scores[matched], kind="stable")]]
+
+    def sample(self, k: int, seed: Optional[int] = None) -> List[int]:
+        """Returns k chunk ids spread evenly over the document.
+
+        With a seed, one random chunk is drawn from each of k equal strata instead,
+        so different seeds cover the whole document with different chunks.
+        """
+        if len(self.spans) <= k:
+            return list(range(len(self.spans)))
+        if seed is None:
+            return [int(i) for i in np.linspace(0, len(self.spans) - 1, k).round().astype(int)]
+        bounds = np.linspace(0, len(self.spans), k + 1).astype(int)
+        rng = np.random.default_rng(seed)
+        return [int(rng.integers(lo, hi)) for lo, hi in zip(bounds[:-1], bounds[1:])]
+
+    def excerpts(self, text: str, chunk_ids: List[int]) -> List[str]:
+        """Returns the chunk texts in document order."""
+        return [text[self.spans[i][0]:self.spans[i][1]] for i in sorted(set(chunk_ids))]
+
+class IndexCache:
+    """Per-process LRU of indexes by doc_id. Indexes are rebuilt from the stored text on a miss."""
+
+    def __init__(self, max_entries: int = INDEX_CACHE_SIZE):
+        self.max_entries = max_entries
+        self._indexes: "OrderedDict[str, Bm25Index]" = OrderedDict()
+        self._lock = threading.Lock()
+
+    def build(self, doc_id: str, text: str) -> Bm25Index:
+        index = Bm25Index(text)
+        with self._lock:
+            self._indexes[doc_id] = index
+            self._indexes.move_to_end(doc_id)
+            while len(self._indexes) > self.max_entries:
+                self._indexes.popitem(last=False)
+        return index
+
+    def get(self, doc_id: str) -> Optional[Bm25Index]:
+        with self._lock:
+            index = self._indexes.get(doc_id)
+            if index is not None:
+                self._indexes.move_to_end(doc_id)
+            return index
+
+    def get_or_build(self, doc_id: str, text: str) -> Bm25Index:
+        return self.get(doc_id) or self.build(doc_id, text)
@@ -0,0 +1,71 @@
+"""Read-through cache for the approved-reviews list shown on the landing page.
+
+The list is loaded once, pre-serialized with an ETag, and kept until
+manage_reviews.py changes a review's approval. That script sends a Postgres
+NOTIFY on REVIEWS_CHANNEL, which every API worker LISTENs for. A TTL bounds
+staleness if a notification is ever missed (e.g. while reconnecting).
+"""
+import os
+import json
+import time
+import asyncio
+import hashlib
+from typing import Optional, Tuple
+
+import psycopg
+from fastapi.encoders import jsonable_encoder
+
+import async_database as db
+from database import DATABASE_URL, REVIEWS_CHANNEL
+from metrics import cache_lookup, log
+
+REVIEWS_CACHE_TTL_SECONDS = float(os.getenv("REVIEWS_CACHE_TTL_SECONDS", "600"))
+
+class ReviewsCache:
+    def __init__(self, ttl_seconds: float = REVIEWS_CACHE_TTL_SECONDS):
+        self.ttl_seconds = ttl_seconds
+        self._body: Optional[bytes] = None
+        self._etag: Optional[str] = None
+        self._loaded_at = 0.0
+        self._lock = asyncio.Lock()
+
+    def invalidate(self):
+        self._body = None
+
+    async def get(self) -> Tuple[bytes, str]:
+        """Returns the JSON body and its ETag, loading from the database on a miss."""
+        if self._body is not None and time.monotonic() - self._loaded_at < self.ttl_seconds:
+            cache_lookup("reviews", hit=True)
+            return self._body, self._etag
+        cache_lookup("reviews", hit=False)
+        async with self._lock:
+            # Another request may have reloaded it while we waited for the lock
+            if self._body is None or time.monotonic() - self._loaded_at >= self.ttl_seconds:
+                reviews = await db.get_reviews()
+                body = json.dumps(jsonable_encoder(reviews)).encode("utf-8")
+                self._etag = f'"{hashlib.sha256(body).hexdigest()[:32]}"'
+                self._body = body
+                self._loaded_at = time.monotonic()
+            return self._body, self._etag
+
+async def listen_for_changes(cache: ReviewsCache):
+    """Invalidates the cache whenever a review's approval changes. Runs until cancelled."""
+    if not DATABASE_URL:
+        return
+    delay = 1
+    while True:
+        try:
+            async with await psycopg.AsyncConnection.connect(DATABASE_URL, autocommit=True) as conn:
+                await conn.execute(f"LISTEN {REVIEWS_CHANNEL}")
+                # Changes made while we were disconnected were not notified
+                cache.invalidate()
+                delay = 1
+                async for _ in conn.notifies():
+                    log("Reviews changed, invalidating cache.")
+                    cache.invalidate()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            log(f"Reviews listener error: {e}, reconnecting in {delay} seconds...")
+            await asyncio.sleep(delay)
+            delay = min(delay * 2, 60)
@@ -0,0 +1,88 @@
+"""Chooses the Gemini model for a document from cheap text heuristics.
+
+Receipts, tickets and other short records, and short documents in general,
+do fine on a lighter, faster model; long documents get the full model. The
+document is classified from its length, how much of it is short lines
+(forms, tables, key-value records) and its share of digits, all measured on
+a bounded sample so routing stays cheap for very long texts.
+
+The table maps each class to a model and is set with GEMINI_ROUTES, e.g.
+"transactional=gemini-2.5-flash-lite,short=gemini-2.5-flash-lite". Classes
+left out use GEMINI_MODEL.
+"""
+import os
+from typing import Dict, NamedTuple, Optional
+
+from gemini_client import GEMINI_MODEL
+from metrics import ROUTING_DECISIONS
+
+DOC_CLASSES = ("transactional", "short", "standard", "long")
+
+DEFAULT_ROUTES = "transactional=gemini-2.5-flash-lite,short=gemini-2.5-flash-lite"
+GEMINI_ROUTES = os.getenv("GEMINI_ROUTES", DEFAULT_ROUTES)
+ROUTING_SHORT_CHARS = int(os.getenv("ROUTING_SHORT_CHARS", "8000"))
+ROUTING_LONG_CHARS = int(os.getenv("ROUTING_LONG_CHARS", "150000"))
+ROUTING_TRANSACTIONAL_MAX_CHARS = int(os.getenv("ROUTING_TRANSACTIONAL_MAX_CHARS", "20000"))
+ROUTING_SAMPLE_CHARS = 50000
+
+# Lines shorter than this are typical of forms and records rather than prose
+SHORT_LINE_CHARS = 40
+TRANSACTIONAL_SHORT_LINE_RATIO = 0.6
+TRANSACTIONAL_NUMERIC_RATIO = 0.12
+
+class DocumentProfile(NamedTuple):
+    chars: int
+    short_line_ratio: float  # Share of non-empty lines under SHORT_LINE_CHARS
+    numeric_ratio: float  # Share of non-whitespace characters that are digits
+
+class Route(NamedTuple):
+    doc_class: str
+    model: str
+
+def profile_text(text: str, sample_chars: int = ROUTING_SAMPLE_CHARS) -> DocumentProfile:
+    sample = text[:sample_chars]
+    lines = [line for line in sample.splitlines() if line.strip()]
+    short_lines = sum(1 for line in lines if len(line.strip()) < SHORT_LINE_CHARS)
+    visible = len("".join(sample.split()))
+    digits = sum(sample.count(digit) for digit in "0123456789")
+    return DocumentProfile(
+        chars=len(text),
+        short_line_ratio=short_lines / len(lines) if lines else 0.0,
+        numeric_ratio=digits / visible if visible else 0.0
+    )
+
+def classify(profile: DocumentProfile) -> str:
+    if profile.chars <= ROUTING_TRANSACTIONAL_MAX_CHARS and (
+        profile.short_line_ratio >= TRANSACTIONAL_SHORT_LINE_RATIO
+        or profile.numeric_ratio >= TRANSACTIONAL_NUMERIC_RATIO
+    ):
+        return "transactional"
+    if profile.chars <= ROUTING_SHORT_CHARS:
+        return "short"
+    if profile.chars >= ROUTING_LONG_CHARS:
+        return "long"
+    return "standard"
+
+def parse_routes(spec: str) -> Dict[str, str]:
+    """Parses "class=model,class=model"; unknown classes are rejected to catch typos."""
+    routes = {}
+    for item in spec.split(","):
+        if not item.strip():
+            continue
+        doc_class, _, model = item.partition("=")
+        doc_class, model = doc_class.strip(), model.strip()
+        if doc_class not in DOC_CLASSES or not model:
+            raise ValueError(f"Invalid GEMINI_ROUTES entry: {item!r}")
+        routes[doc_class] = model
+    return routes
+
+class ModelRouter:
+    def __init__(self, routes: Optional[Dict[str, str]] = None, default_model: str = GEMINI_MODEL):
+        self.routes = parse_routes(GEMINI_ROUTES) if routes is None else routes
+        self.default_model = default_model
+
+    def route(self, text: str, endpoint: str) -> Route:
+        doc_class = classify(profile_text(text))
+        model = self.routes.get(doc_class, self.default_model)
+        ROUTING_DECISIONS.inc(endpoint=endpoint, doc_class=doc_class, model=model)
+        return Route(doc_class, model)
@@ -0,0 +1,135 @@
+"""Map-reduce summarization for documents too long for a single study-guide prompt.
+
+The document is split into sections that are summarized concurrently into
+dense notes ("map"). The notes, in document order, then replace the raw text
+as the input of the normal study-guide prompt ("reduce"). If the notes are
+still too long, they are summarized again, in larger sections if a round
+does not shrink them. Notes are only cut as a last resort, which is logged
+and counted in condense_truncations_total.
+"""
+import os
+import asyncio
+from typing import Awaitable, Callable, List, Optional
+
+from metrics import CONDENSE_TRUNCATIONS, log, log_event
+from retrieval import chunk_spans
+
+SECTION_CHARS = int(os.getenv("SUMMARY_SECTION_CHARS", "60000"))
+SUMMARY_CONCURRENCY = int(os.getenv("SUMMARY_CONCURRENCY", "4"))
+# Rounds with larger sections tried before notes that stopped shrinking are cut to fit
+CONDENSE_MAX_STALLED_ROUNDS = 2
+
+def build_section_prompt(section: str, number: int, total: Optional[int]) -> str:
+    # The total is unknown while the document is still being extracted
+    part = f"part {number} of {total}" if total else f"part {number}"
+    return f"""
+        You are summarizing {part} of a longer document, so that a study guide can later be written from all parts.
+
+        Write dense, well-organized Markdown notes for this part only:
+        - Keep every important concept, definition, formula, date, name and figure.
+        - Keep the order in which topics appear.
+        - Do not write an introduction or conclusion, and do not add practice questions.
+        - Use at most about 800 words.
+
+        Text of part {number}:
+        {section}
+        """
+
+def split_sections(text: str, section_chars: int = SECTION_CHARS) -> List[str]:
+    return [text[start:end] for start, end in chunk_spans(text, section_chars, 0)]
+
+async def summarize_sections(sections: List[str], generate: Callable[[str], Awaitable[str]],
+                             concurrency: int = SUMMARY_CONCURRENCY) -> List[str]:
+    """Summarizes sections concurrently, at most `concurrency` at a time, keeping their order."""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def summarize(number: int, section: str) -> str:
+        async with semaphore:
+            log(f"Summarizing section {number}/{len(sections)} ({len(section)} characters)...")
+            return await generate(build_section_prompt(section, number, len(sections)))
+
+    return await asyncio.gather(*(summarize(i, s) for i, s in enumerate(sections, start=1)))
+
+async def condense(text: str, max_chars: int, generate: Callable[[str], Awaitable[str]],
+                   section_chars: int = SECTION_CHARS) -> str:
+    """Reduces text to section notes, repeating until they fit in max_chars.
+
+    When a round does not shrink the text (notes of small sections can be as
+    long as the sections), the next round uses sections twice as large, so
+    each note covers more of the input.
+    """
+    stalled = 0
+    while len(text) > max_chars:
+        notes = await summarize_sections(split_sections(text, section_chars), generate)
+        condensed = "\n\n".join(notes)
+        if len(condensed) < len(text):
+            text = condensed
+            continue
+        stalled += 1
+        if stalled > CONDENSE_MAX_STALLED_ROUNDS:
+            # The model is not shrinking the input any further; stop rather than loop forever
+            CONDENSE_TRUNCATIONS.inc()
+            log_event("condense_truncated", chars=len(text), max_chars=max_chars, dropped_chars=len(text) - max_chars)
+            return text[:max_chars]
+        section_chars *= 2
+        log_event("condense_stalled", chars=len(condensed), section_chars=section_chars)
+    return text
+
+class StreamingSections:
+    """Summarizes sections of a document while its text is still being extracted.
+
+    Text is fed in as it is extracted. Nothing is sent to the model until the
+    document grows past `threshold` characters (shorter documents go into a
+    single prompt); from then on every complete section is summarized right away.
+    """
+
+    def __init__(self, threshold: int, generate: Callable[[str], Awaitable[str]],
+                 section_chars: int = SECTION_CHARS, concurrency: int = SUMMARY_CONCURRENCY):
+        self.threshold = threshold
+        self.generate = generate
+        self.section_chars = section_chars
+        self._semaphore = asyncio.Semaphore(concurrency)
+        self._buffer = ""
+        self._length = 0
+        self._tasks: List[asyncio.Task] = []
+
+    @property
+    def started(self) -> bool:
+        return bool(self._tasks)
+
+    def feed(self, text: str):
+        self._buffer += text
+        self._length += len(text)
+        if self._length <= self.threshold:
+            return
+        while len(self._buffer) > self.section_chars:
+            # Only the first span is final; the rest of the buffer may still grow
+            _, end = chunk_spans(self._buffer[:self.section_chars + 1], self.section_chars, 0)[0]
+            self._start(self._buffer[:end])
+            self._buffer = self._buffer[end:]
+
+    def _start(self, section: str):
+        number = len(self._tasks) + 1
+
+        async def summarize() -> str:
+            async with self._semaphore:
+                log(f"Summarizing section {number} ({len(section)} characters)...")
+                return await self.generate(build_section_prompt(section, number, None))
+
+        self._tasks.append(asyncio.create_task(summarize()))
+
+    async def finish(self) -> str:
+        """Summarizes the remaining text and returns all notes in document order."""
+        if self._buffer:
+            self._start(self._buffer)
+            self._buffer = ""
+        try:
+            notes = await asyncio.gather(*self._tasks)
+        except BaseException:
+            self.cancel()
+            raise
+        return "\n\n".join(notes)
+
+    def cancel(self):
+        for task in self._tasks:
+            task.cancel()
@@ -0,0 +1,52 @@
+import os
+import time
+import asyncio
+
+from chat_sessions import CHAT_RECENT_MESSAGES, STALE_TEMP_FILE_SECONDS, ChatMessage, ChatSessionStore
+
+def messages(count):
+    return [ChatMessage(role="user" if i % 2 == 0 else "assistant", content=f"message {i} " + "x" * 400)
+            for i in range(count)]
+
+def test_failed_compaction_keeps_the_session_and_does_not_raise(tmp_path):
+    store = ChatSessionStore(ttl_seconds=60, directory=str(tmp_path))
+    sid = "a" * 32
+    store.append("doc", sid, messages(CHAT_RECENT_MESSAGES + 20))
+
+    async def failing_generate(prompt):
+        raise TimeoutError("summary call timed out")
+
+    asyncio.run(store.compact("doc", sid, failing_generate))
+    session = store.get("doc", sid)
+    assert session.summary == ""
+    assert len(session.messages) == CHAT_RECENT_MESSAGES + 20
+    assert ("doc", sid) not in store._compacting
+
+def test_compaction_folds_old_messages_into_the_summary(tmp_path):
+    store = ChatSessionStore(ttl_seconds=60, directory=str(tmp_path))
+    sid = "b" * 32
+    store.append("doc", sid, messages(CHAT_RECENT_MESSAGES + 20))
+
+    async def generate(prompt):
+        return "The student asked about messages."
+
+    asyncio.run(store.compact("doc", sid, generate))
+    session = store.get("doc", sid)
+    assert session.summary == "The student asked about messages."
+    assert len(session.messages) == CHAT_RECENT_MESSAGES
+
+def test_purge_keeps_temp_files_that_are_still_being_written(tmp_path):
+    store = ChatSessionStore(ttl_seconds=60, directory=str(tmp_path))
+    store.append("doc", "c" * 32, messages(2))
+    expired = tmp_path / f"doc.{'d' * 32}.json"
+    expired.write_text("{}")
+    os.utime(expired, (time.time() - 1, time.time() - 1))
+    writing = tmp_path / "tmpwriting.tmp"
+    writing.write_text("")
+    abandoned = tmp_path / "tmpabandoned.tmp"
+    abandoned.write_text("")
+    stale = time.time() - STALE_TEMP_FILE_SECONDS - 1
+    os.utime(abandoned, (stale, stale))
+
+    assert store.purge_expired() == 2
+    assert sorted(p.name for p in tmp_path.iterdir()) == [f"doc.{'c' * 32}.json", "tmpwriting.tmp"]
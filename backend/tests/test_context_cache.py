@@ -0,0 +1,195 @@
+import time
+import asyncio
+from types import SimpleNamespace
+
+import pytest
+from google.genai import errors
+
+import main
+from context_cache import (
+    CONTEXT_CACHE_RETRY_SECONDS,
+    MIN_TTL_SECONDS,
+    REFRESH_WINDOW_SECONDS,
+    CacheHandle,
+    ContextCache,
+)
+
+TEXT = "lecture notes " * 100
+
+class StubGemini:
+    """Stands in for GeminiClient: records cache calls and answers generate() from a script."""
+
+    def __init__(self, fail_create=False, cached_error=None):
+        self.fail_create = fail_create
+        self.cached_error = cached_error  # Raised by generate() calls that reference a cache
+        self.created, self.extended, self.deleted, self.prompts = [], [], [], []
+
+    async def create_cache(self, model, contents, ttl_seconds, display_name=""):
+        await asyncio.sleep(0)
+        if self.fail_create:
+            raise errors.APIError(400, {"error": {"code": 400, "status": "INVALID_ARGUMENT", "message": "too small"}})
+        self.created.append((model, ttl_seconds, display_name))
+        return SimpleNamespace(name=f"cachedContents/{len(self.created)}")
+
+    async def extend_cache(self, name, ttl_seconds):
+        self.extended.append((name, ttl_seconds))
+
+    async def delete_cache(self, name):
+        self.deleted.append(name)
+
+    async def generate(self, prompt, endpoint, model=None, config=None):
+        cached = (config or {}).get("cached_content")
+        self.prompts.append((prompt, cached))
+        if cached and self.cached_error:
+            raise self.cached_error
+        return SimpleNamespace(text="answer")
+
+def new_cache(gemini, **kwargs):
+    return ContextCache(gemini, min_chars=10, **{"ttl_seconds": 3600, "enabled": True, **kwargs})
+
+def test_existing_cache_is_reused():
+    gemini = StubGemini()
+    cache = new_cache(gemini)
+    expires = time.time() + 7200
+
+    async def scenario():
+        # Concurrent first questions share one creation
+        names = await asyncio.gather(*(cache.get("doc", TEXT, "model", expires) for _ in range(3)))
+        names.append(await cache.get("doc", TEXT, "model", expires))
+        return names
+
+    assert asyncio.run(scenario()) == ["cachedContents/1"] * 4
+    assert len(gemini.created) == 1
+
+def test_small_texts_and_unknown_expiry_are_sent_inline():
+    gemini = StubGemini()
+    cache = new_cache(gemini)
+    assert asyncio.run(cache.get("doc", "tiny", "model", time.time() + 7200)) is None
+    assert asyncio.run(cache.get("doc", TEXT, "model", None)) is None
+    assert gemini.created == []
+
+def test_ttl_is_capped_at_the_document_expiry():
+    gemini = StubGemini()
+    cache = new_cache(gemini)
+    asyncio.run(cache.get("doc", TEXT, "model", time.time() + 600))
+    (_, ttl, display_name), = gemini.created
+    assert 590 <= ttl <= 600
+    assert display_name == "doc"
+    assert cache._entries[("doc", "model")].expires_at <= time.time() + 600
+
+def test_no_cache_for_a_document_about_to_expire():
+    gemini = StubGemini()
+    cache = new_cache(gemini)
+    assert asyncio.run(cache.get("doc", TEXT, "model", time.time() + MIN_TTL_SECONDS - 10)) is None
+    assert gemini.created == []
+
+def test_cache_close_to_expiry_is_extended_in_the_background():
+    gemini = StubGemini()
+    cache = new_cache(gemini)
+    doc_expires = time.time() + 3000
+
+    async def scenario():
+        await cache.get("doc", TEXT, "model", doc_expires)
+        key = ("doc", "model")
+        soon = time.time() + REFRESH_WINDOW_SECONDS - 60
+        cache._entries[key] = CacheHandle("cachedContents/1", soon)
+
+        assert await cache.get("doc", TEXT, "model", doc_expires) == "cachedContents/1"
+        await asyncio.gather(*cache._refreshing.values())
+        return cache._entries[key]
+
+    handle = asyncio.run(scenario())
+    (name, ttl), = gemini.extended
+    assert name == "cachedContents/1"
+    assert 2990 <= ttl <= 3000  # Capped at the document's remaining lifetime
+    assert handle.expires_at > time.time() + REFRESH_WINDOW_SECONDS
+    assert cache._refreshing == {}
+
+def test_expired_handle_is_replaced():
+    gemini = StubGemini()
+    cache = new_cache(gemini)
+    expires = time.time() + 7200
+
+    async def scenario():
+        await cache.get("doc", TEXT, "model", expires)
+        cache._entries[("doc", "model")] = CacheHandle("cachedContents/1", time.time() + 5)
+        return await cache.get("doc", TEXT, "model", expires)
+
+    assert asyncio.run(scenario()) == "cachedContents/2"
+
+def test_invalidate_forces_a_new_cache():
+    gemini = StubGemini()
+    cache = new_cache(gemini)
+    expires = time.time() + 7200
+
+    async def scenario():
+        first = await cache.get("doc", TEXT, "model", expires)
+        cache.invalidate("doc", "model")
+        return first, await cache.get("doc", TEXT, "model", expires)
+
+    assert asyncio.run(scenario()) == ("cachedContents/1", "cachedContents/2")
+
+def test_failed_creation_is_not_retried_for_a_while():
+    gemini = StubGemini(fail_create=True)
+    cache = new_cache(gemini)
+    expires = time.time() + 7200
+    assert asyncio.run(cache.get("doc", TEXT, "model", expires)) is None
+    until = cache._entries[("doc", "model")].until
+    assert until == pytest.approx(time.time() + CONTEXT_CACHE_RETRY_SECONDS, abs=5)
+
+    gemini.fail_create = False
+    assert asyncio.run(cache.get("doc", TEXT, "model", expires)) is None
+    assert gemini.created == []
+
+def test_close_deletes_the_caches():
+    gemini = StubGemini()
+    cache = new_cache(gemini)
+    asyncio.run(cache.get("doc", TEXT, "model", time.time() + 7200))
+    asyncio.run(cache.close())
+    assert gemini.deleted == ["cachedContents/1"]
+
+def api_error(code):
+    return errors.APIError(code, {"error": {"code": code, "status": "ERROR", "message": "rejected"}})
+
+@pytest.fixture
+def document_backend(monkeypatch):
+    def install(gemini):
+        cache = new_cache(gemini)
+        monkeypatch.setattr(main, "gemini", gemini)
+        monkeypatch.setattr(main, "context_cache", cache)
+        monkeypatch.setattr(main, "documents", SimpleNamespace(expires_at=lambda doc_id: time.time() + 7200))
+        return cache
+    return install
+
+@pytest.mark.parametrize("code", sorted(main.CONTEXT_CACHE_ERROR_CODES))
+def test_rejected_cache_falls_back_to_the_inline_prompt(document_backend, code):
+    gemini = StubGemini(cached_error=api_error(code))
+    cache = document_backend(gemini)
+
+    async def inline_prompt():
+        return "inline prompt"
+
+    response = asyncio.run(main.generate_for_document("doc", TEXT, "chat", inline_prompt, "cached prompt"))
+    assert response.text == "answer"
+    assert gemini.prompts == [("cached prompt", "cachedContents/1"), ("inline prompt", None)]
+    assert cache._entries == {}  # The rejected cache was forgotten
+
+def test_other_errors_with_a_cache_are_raised(document_backend):
+    gemini = StubGemini(cached_error=api_error(500))
+    document_backend(gemini)
+
+    async def inline_prompt():
+        raise AssertionError("the inline prompt must not be built")
+
+    with pytest.raises(errors.APIError):
+        asyncio.run(main.generate_for_document("doc", TEXT, "chat", inline_prompt, "cached prompt"))
+
+def test_cache_is_used_when_accepted(document_backend):
+    gemini = StubGemini()
+    document_backend(gemini)
+
+    async def inline_prompt():
+        raise AssertionError("the inline prompt must not be built")
+
+    asyncio.run(main.generate_for_document("doc", TEXT, "quiz", inline_prompt, "cached prompt", {"temperature": 0}))
+    assert gemini.prompts == [("cached prompt", "cachedContents/1")]
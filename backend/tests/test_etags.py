@@ -0,0 +1,21 @@
+import pytest
+
+from main import etag_matches
+
+@pytest.mark.parametrize("header, etag, expected", [
+    (None, '"abc"', False),
+    ('"abc"', '"abc"', True),
+    ('"xyz"', '"abc"', False),
+    ('"xyz", "abc"', '"abc"', True),
+    ('"xyz","abc"', '"abc"', True),
+    ('W/"abc"', '"abc"', True),
+    ('"abc"', 'W/"abc"', True),
+    ('*', '"abc"', True),
+    ('abc', '"abc"', False),
+])
+def test_etag_matches(header, etag, expected):
+    assert etag_matches(header, etag) is expected
+
+def test_wildcard_can_be_deferred():
+    assert etag_matches("*", '"abc"', wildcard=False) is False
+    assert etag_matches('*, "abc"', '"abc"', wildcard=False) is True
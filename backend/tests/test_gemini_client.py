@@ -0,0 +1,115 @@
+import asyncio
+from types import SimpleNamespace
+
+import httpx
+import pytest
+from google.genai import errors
+
+import gemini_client
+from gemini_client import GeminiClient, PrioritySlots, retry_after_seconds
+
+def throttled(retry_delay: str = "7s", headers=None) -> errors.APIError:
+    response = httpx.Response(429, headers=headers or {})
+    details = {"error": {
+        "code": 429,
+        "status": "RESOURCE_EXHAUSTED",
+        "message": "Quota exceeded",
+        "details": [{"@type": "type.googleapis.com/google.rpc.RetryInfo", "retryDelay": retry_delay}],
+    }}
+    return errors.APIError(429, details, response)
+
+def test_cancel_while_queued_leaves_no_waiter():
+    async def scenario():
+        slots = PrioritySlots(1)
+        await slots.acquire(priority=0)
+        waiter = asyncio.create_task(slots.acquire(priority=0))
+        await asyncio.sleep(0)
+        assert slots.queued == 1
+
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert slots.queued == 0
+
+        slots.release()
+        assert slots.free == 1
+
+    asyncio.run(scenario())
+
+def test_cancel_after_hand_over_returns_the_slot():
+    async def scenario():
+        slots = PrioritySlots(1)
+        await slots.acquire(priority=0)
+        waiter = asyncio.create_task(slots.acquire(priority=0))
+        await asyncio.sleep(0)
+
+        slots.release()  # Hands the slot to the waiter, which has not run yet
+        waiter.cancel()
+        with pytest.raises(asyncio.CancelledError):
+            await waiter
+        assert slots.free == 1
+        assert slots.queued == 0
+
+        await asyncio.wait_for(slots.acquire(priority=0), timeout=1)
+        assert slots.free == 0
+
+    asyncio.run(scenario())
+
+def test_release_wakes_waiters_by_priority():
+    async def scenario():
+        slots = PrioritySlots(1)
+        await slots.acquire(priority=0)
+        order = []
+
+        async def call(name, priority):
+            await slots.acquire(priority)
+            order.append(name)
+            slots.release()
+
+        tasks = [asyncio.create_task(call("quiz", 2)), asyncio.create_task(call("chat", 0))]
+        await asyncio.sleep(0)
+        slots.release()
+        await asyncio.gather(*tasks)
+        assert order == ["chat", "quiz"]
+
+    asyncio.run(scenario())
+
+def test_retry_after_seconds_reads_header_and_retry_info():
+    assert retry_after_seconds(throttled(headers={"retry-after": "3"})) == 3.0
+    assert retry_after_seconds(throttled("7s")) == 7.0
+    assert retry_after_seconds(ValueError("no hint")) is None
+
+def test_throttled_call_waits_the_requested_delay(monkeypatch):
+    sleeps = []
+
+    async def fake_sleep(seconds):
+        sleeps.append(seconds)
+
+    responses = [throttled("7s"), "done"]
+
+    async def generate_content(**kwargs):
+        result = responses.pop(0)
+        if isinstance(result, Exception):
+            raise result
+        return result
+
+    monkeypatch.setattr(gemini_client.random, "uniform", lambda low, high: 0.0)
+    monkeypatch.setattr(gemini_client.asyncio, "sleep", fake_sleep)
+    stub = SimpleNamespace(aio=SimpleNamespace(models=SimpleNamespace(generate_content=generate_content)))
+    client = GeminiClient(client=stub)
+
+    assert asyncio.run(client.generate("prompt", "chat")) == "done"
+    assert sleeps == [7.0]
+    assert client.stats["throttled"] == 1
+    assert client.stats["retries"] == 1
+    assert client.stats["in_flight"] == 0
+
+def test_non_retryable_error_is_raised_at_once():
+    async def generate_content(**kwargs):
+        raise errors.APIError(400, {"error": {"code": 400, "status": "INVALID_ARGUMENT", "message": "bad"}})
+
+    stub = SimpleNamespace(aio=SimpleNamespace(models=SimpleNamespace(generate_content=generate_content)))
+    client = GeminiClient(client=stub)
+    with pytest.raises(errors.APIError):
+        asyncio.run(client.generate("prompt", "chat"))
+    assert client.stats["retries"] == 0
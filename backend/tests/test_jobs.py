@@ -0,0 +1,56 @@
+import asyncio
+
+from jobs import CANCELLED, RUNNING, SUCCEEDED, JobQueue
+
+async def slow_run(job):
+    await asyncio.sleep(0.05)
+    return {"ok": True}
+
+def test_resubmitting_a_key_joins_the_job_under_a_new_id():
+    async def scenario():
+        queue = JobQueue(slow_run, workers=1)
+        queue.start()
+        first_id, first = queue.submit("same-file", {"n": 1})
+        second_id, second = queue.submit("same-file", {"n": 2})
+        assert second is first
+        assert second_id != first_id
+        assert queue.get(second_id).to_dict(second_id)["job_id"] == second_id
+        await queue.stop()
+
+    asyncio.run(scenario())
+
+def test_cancel_only_withdraws_the_caller_while_others_hold_the_job():
+    async def scenario():
+        queue = JobQueue(slow_run, workers=1)
+        queue.start()
+        first_id, job = queue.submit("same-file", {"n": 1})
+        second_id, _ = queue.submit("same-file", {"n": 2})
+        await asyncio.sleep(0)
+
+        state = queue.cancel(first_id)
+        assert state["job_id"] == first_id and state["status"] == CANCELLED
+        assert queue.get(first_id) is None
+        assert job.status in (RUNNING, "queued") and not job.cancel_requested
+
+        states = [s async for s in queue.follow(job, second_id)]
+        assert states[-1]["status"] == SUCCEEDED
+        assert states[-1]["job_id"] == second_id
+        await queue.stop()
+
+    asyncio.run(scenario())
+
+def test_last_holder_cancelling_stops_the_job():
+    async def scenario():
+        queue = JobQueue(slow_run, workers=1)
+        queue.start()
+        first_id, job = queue.submit("same-file", {"n": 1})
+        second_id, _ = queue.submit("same-file", {"n": 2})
+        await asyncio.sleep(0)
+
+        queue.cancel(second_id)
+        state = queue.cancel(first_id)
+        assert state["status"] == CANCELLED
+        assert job.status == CANCELLED and job.cancel_requested
+        await queue.stop()
+
+    asyncio.run(scenario())
@@ -0,0 +1,71 @@
+import pytest
+
+import routing
+from gemini_client import GEMINI_MODEL
+from routing import (
+    ROUTING_LONG_CHARS,
+    ROUTING_SHORT_CHARS,
+    ROUTING_TRANSACTIONAL_MAX_CHARS,
+    DocumentProfile,
+    ModelRouter,
+    classify,
+    parse_routes,
+    profile_text,
+)
+
+PROSE = 0.0  # No short lines and no digits
+
+@pytest.mark.parametrize("profile, expected", [
+    # Record-like documents up to the transactional limit
+    (DocumentProfile(ROUTING_TRANSACTIONAL_MAX_CHARS, 0.6, PROSE), "transactional"),
+    (DocumentProfile(500, PROSE, 0.12), "transactional"),
+    (DocumentProfile(ROUTING_TRANSACTIONAL_MAX_CHARS + 1, 0.9, 0.5), "standard"),
+    (DocumentProfile(ROUTING_TRANSACTIONAL_MAX_CHARS, 0.59, 0.11), "standard"),
+    # Prose by length
+    (DocumentProfile(0, PROSE, PROSE), "short"),
+    (DocumentProfile(ROUTING_SHORT_CHARS, PROSE, PROSE), "short"),
+    (DocumentProfile(ROUTING_SHORT_CHARS + 1, PROSE, PROSE), "standard"),
+    (DocumentProfile(ROUTING_LONG_CHARS - 1, PROSE, PROSE), "standard"),
+    (DocumentProfile(ROUTING_LONG_CHARS, PROSE, PROSE), "long"),
+    (DocumentProfile(ROUTING_LONG_CHARS, 0.9, 0.5), "long"),
+])
+def test_classify_boundaries(profile, expected):
+    assert classify(profile) == expected
+
+def test_profile_text_measures_short_lines_and_digits():
+    receipt = "\n".join(["Coffee 3.50", "Bagel 2.25", "Total 5.75", "", "Thank you for shopping with us today, see you again soon!"])
+    profile = profile_text(receipt)
+    assert profile.chars == len(receipt)
+    assert profile.short_line_ratio == pytest.approx(0.75)
+    assert 0 < profile.numeric_ratio < 1
+    assert classify(profile) == "transactional"
+
+def test_parse_routes_accepts_spacing_and_empty_items():
+    assert parse_routes(" short = lite-model ,, long=big-model ") == {"short": "lite-model", "long": "big-model"}
+    assert parse_routes("") == {}
+
+@pytest.mark.parametrize("spec", [
+    "tiny=lite-model",  # Unknown class
+    "short=",  # Missing model
+    "short",  # Missing "="
+    "=lite-model",
+    "short=lite-model,Long=big-model",  # Classes are case-sensitive
+])
+def test_parse_routes_rejects_malformed_specs(spec):
+    with pytest.raises(ValueError):
+        parse_routes(spec)
+
+def test_unlisted_classes_fall_back_to_the_default_model():
+    router = ModelRouter({"short": "lite-model"})
+    assert router.default_model == GEMINI_MODEL
+    note = "A short paragraph of ordinary prose that fills one reasonably long line."
+    assert router.route(note, "upload") == routing.Route("short", "lite-model")
+    long_text = "word " * (ROUTING_LONG_CHARS // 5 + 1)
+    assert router.route(long_text, "upload") == routing.Route("long", GEMINI_MODEL)
+
+def test_router_reads_gemini_routes_when_not_given_a_table(monkeypatch):
+    monkeypatch.setattr(routing, "GEMINI_ROUTES", "long=big-model")
+    assert ModelRouter().routes == {"long": "big-model"}
+    monkeypatch.setattr(routing, "GEMINI_ROUTES", "huge=big-model")
+    with pytest.raises(ValueError):
+        ModelRouter()
@@ -0,0 +1,53 @@
+import asyncio
+
+import main
+from jobs import Job
+
+def test_job_documents_are_registered_once_across_attempts(monkeypatch):
+    registered = []
+
+    async def register_document(text):
+        registered.append(text)
+        return f"doc-{len(registered)}"
+
+    monkeypatch.setattr(main, "register_document", register_document)
+    job = Job("key", {})
+
+    async def attempt():
+        return [
+            await main.register_job_document(job, "file-0", "first"),
+            await main.register_job_document(job, "set", "first and second"),
+        ]
+
+    assert asyncio.run(attempt()) == ["doc-1", "doc-2"]
+    assert asyncio.run(attempt()) == ["doc-1", "doc-2"]  # A retry of the same job
+    assert registered == ["first", "first and second"]
+
+def test_quiet_streams_get_heartbeats_and_are_closed_with_the_client():
+    closed = []
+
+    async def events():
+        try:
+            yield main.sse_event("meta", {})
+            await asyncio.sleep(0.25)  # e.g. summarizing sections before the first chunk
+            yield main.sse_event("chunk", {"text": "Guide"})
+            await asyncio.sleep(10)
+            yield main.sse_event("done", {})
+        finally:
+            closed.append(True)
+
+    async def scenario():
+        received = []
+        stream = main.with_heartbeats(events(), interval=0.1)
+        async for event in stream:
+            received.append(event)
+            if "chunk" in event:
+                break
+        await stream.aclose()
+        return received
+
+    received = asyncio.run(scenario())
+    assert received[0].startswith("event: meta")
+    assert received[-1].startswith("event: chunk")
+    assert received[1:-1] and all(event == main.SSE_HEARTBEAT for event in received[1:-1])
+    assert closed == [True]
@@ -0,0 +1,103 @@
+"""Chunked, concurrent translation of Markdown study guides.
+
+Fenced blocks (Mermaid diagrams and code) are cut out before anything is
+sent to the model and put back verbatim. The remaining prose is grouped into
+chunks at paragraph boundaries, translated concurrently, and reassembled in
+document order.
+"""
+import os
+import re
+import asyncio
+from typing import Awaitable, Callable, List, Tuple
+
+from metrics import log
+from retrieval import chunk_spans
+
+TRANSLATION_CHUNK_CHARS = int(os.getenv("TRANSLATION_CHUNK_CHARS", "6000"))
+TRANSLATION_CONCURRENCY = int(os.getenv("TRANSLATION_CONCURRENCY", "4"))
+
+# A fenced block runs from an opening ``` or ~~~ line to the next line with the same fence (or the end)
+FENCE_RE = re.compile(r"^[ \t]*(```|~~~).*?(?:^[ \t]*\1[ \t]*$|\Z)", re.MULTILINE | re.DOTALL)
+# Paragraph boundaries: blank lines, and line breaks right before a heading
+PARAGRAPH_RE = re.compile(r"\n[ \t]*\n|\n(?=#)")
+
+def build_translation_prompt(text: str, language: str) -> str:
+    return f"""
+        Translate the following part of an academic study guide into {language}.
+
+        Maintain the original Markdown formatting exactly.
+        Do not translate inline code, URLs or LaTeX.
+        Return only the translated text, without any commentary.
+
+        Text to translate:
+        {text}
+        """
+
+def split_fences(text: str) -> List[Tuple[bool, str]]:
+    """Splits Markdown into (is_fenced_block, text) segments that join back to the input."""
+    segments = []
+    position = 0
+    for match in FENCE_RE.finditer(text):
+        if match.start() > position:
+            segments.append((False, text[position:match.start()]))
+        segments.append((True, match.group(0)))
+        position = match.end()
+    if position < len(text):
+        segments.append((False, text[position:]))
+    return segments
+
+def chunk_prose(text: str, chunk_chars: int = TRANSLATION_CHUNK_CHARS) -> List[str]:
+    """Groups whole paragraphs into chunks of at most chunk_chars, which join back to the input.
+
+    A single paragraph longer than chunk_chars is cut at line breaks or spaces.
+    """
+    paragraphs = []
+    position = 0
+    for match in PARAGRAPH_RE.finditer(text):
+        paragraphs.append(text[position:match.end()])
+        position = match.end()
+    paragraphs.append(text[position:])
+
+    chunks = []
+    current = ""
+    for paragraph in paragraphs:
+        if len(current) + len(paragraph) <= chunk_chars:
+            current += paragraph
+            continue
+        if current:
+            chunks.append(current)
+        if len(paragraph) > chunk_chars:
+            chunks.extend(paragraph[start:end] for start, end in chunk_spans(paragraph, chunk_chars, 0))
+            current = ""
+        else:
+            current = paragraph
+    if current:
+        chunks.append(current)
+    return chunks
+
+async def translate_markdown(text: str, language: str, generate: Callable[[str], Awaitable[str]],
+                             chunk_chars: int = TRANSLATION_CHUNK_CHARS,
+                             concurrency: int = TRANSLATION_CONCURRENCY) -> str:
+    """Translates the prose of a Markdown document, keeping fenced blocks as they are."""
+    semaphore = asyncio.Semaphore(concurrency)
+
+    async def translate(fenced: bool, chunk: str) -> str:
+        body = chunk.strip()
+        if fenced or not body:
+            return chunk
+        # The model drops surrounding whitespace, which separates this chunk from its neighbours
+        leading = chunk[:len(chunk) - len(chunk.lstrip())]
+        trailing = chunk[len(chunk.rstrip()):]
+        async with semaphore:
+            translated = await generate(build_translation_prompt(body, language))
+        return leading + translated.strip() + trailing
+
+    pieces = []
+    for fenced, segment in split_fences(text):
+        if fenced:
+            pieces.append((True, segment))
+        else:
+            pieces.extend((False, chunk) for chunk in chunk_prose(segment, chunk_chars))
+
+    log(f"Translating {sum(not fenced and bool(chunk.strip()) for fenced, chunk in pieces)} chunks into {language}...")
+    return "".join(await asyncio.gather(*(translate(fenced, chunk) for fenced, chunk in pieces)))
@@ -0,0 +1,122 @@
+"""Size-bounded, streaming ingestion of uploaded files.
+
+Uploads are copied in fixed-size chunks to a temp file on disk while being
+hashed, so the API never holds a whole document in memory. The file type is
+decided from its magic bytes rather than the filename, and extractors read
+the temp file by path (PDF worker processes memory-map it).
+"""
+import os
+import asyncio
+import hashlib
+import tempfile
+import zipfile
+from typing import List, Optional
+
+from fastapi import HTTPException, UploadFile
+
+MAX_UPLOAD_MB = int(os.getenv("MAX_UPLOAD_MB", "50"))
+MAX_BATCH_FILES = int(os.getenv("MAX_BATCH_FILES", "20"))
+MAX_BATCH_UPLOAD_MB = int(os.getenv("MAX_BATCH_UPLOAD_MB", "200"))
+UPLOAD_SPOOL_DIR = os.getenv("UPLOAD_SPOOL_DIR") or None  # None uses the system temp dir
+UPLOAD_READ_CHUNK = 1024 * 1024
+
+PDF_MAGIC = b"%PDF-"
+ZIP_MAGIC = b"PK\x03\x04"
+# Some PDF writers put a few bytes of junk before the header, which readers tolerate
+PDF_HEADER_WINDOW = 1024
+
+class SpooledUpload:
+    """An uploaded file on disk. Deletes the file on close()."""
+
+    def __init__(self, filename: str, kind: str, path: str, size: int, content_hash: str):
+        self.filename = filename
+        self.kind = kind  # "pdf" or "docx"
+        self.path = path
+        self.size = size
+        self.content_hash = content_hash
+
+    def close(self):
+        try:
+            os.unlink(self.path)
+        except FileNotFoundError:
+            pass
+
+    def __enter__(self) -> "SpooledUpload":
+        return self
+
+    def __exit__(self, *exc):
+        self.close()
+
+def check_upload_filename(filename: Optional[str]):
+    if not filename or not filename.lower().endswith((".pdf", ".docx")):
+        raise HTTPException(status_code=400, detail="File must be a PDF or Word (.docx) document")
+
+def sniff_kind(head: bytes) -> Optional[str]:
+    if PDF_MAGIC in head[:PDF_HEADER_WINDOW]:
+        return "pdf"
+    if head.startswith(ZIP_MAGIC):
+        return "docx"
+    return None
+
+def _is_word_document(path: str) -> bool:
+    try:
+        with zipfile.ZipFile(path) as archive:
+            archive.getinfo("word/document.xml")
+        return True
+    except (zipfile.BadZipFile, KeyError):
+        return False
+
+async def spool_upload(file: UploadFile, max_bytes: int = MAX_UPLOAD_MB * 1024 * 1024) -> SpooledUpload:
+    """Copies an upload to a temp file, rejecting oversized or mislabelled files early."""
+    check_upload_filename(file.filename)
+    expected = "pdf" if file.filename.lower().endswith(".pdf") else "docx"
+
+    tmp = tempfile.NamedTemporaryFile(suffix=f".{expected}", dir=UPLOAD_SPOOL_DIR, delete=False)
+    digest = hashlib.sha256()
+    size = 0
+    try:
+        with tmp:
+            while True:
+                chunk = await file.read(UPLOAD_READ_CHUNK)
+                if not chunk:
+                    break
+                if size == 0 and sniff_kind(chunk) != expected:
+                    raise HTTPException(status_code=400, detail=f"File content is not a valid {expected.upper()} document")
+                size += len(chunk)
+                if size > max_bytes:
+                    raise HTTPException(status_code=413, detail=f"File is larger than {max_bytes // (1024 * 1024)} MB")
+                digest.update(chunk)
+                await asyncio.to_thread(tmp.write, chunk)
+
+        if size == 0:
+            raise HTTPException(status_code=400, detail="File is empty")
+        if expected == "docx" and not await asyncio.to_thread(_is_word_document, tmp.name):
+            raise HTTPException(status_code=400, detail="File content is not a valid DOCX document")
+    except BaseException:
+        os.unlink(tmp.name)
+        raise
+
+    return SpooledUpload(file.filename, expected, tmp.name, size, digest.hexdigest())
+
+async def spool_uploads(files: List[UploadFile], max_files: int = MAX_BATCH_FILES,
+                        max_total_bytes: int = MAX_BATCH_UPLOAD_MB * 1024 * 1024) -> List[SpooledUpload]:
+    """Spools every file of a batch, or none: on any error the ones already written are deleted."""
+    if not files:
+        raise HTTPException(status_code=400, detail="No files were uploaded")
+    if len(files) > max_files:
+        raise HTTPException(status_code=400, detail=f"At most {max_files} files can be uploaded at once")
+    uploads: List[SpooledUpload] = []
+    try:
+        for file in files:
+            remaining = max_total_bytes - sum(upload.size for upload in uploads)
+            try:
+                uploads.append(await spool_upload(file, min(MAX_UPLOAD_MB * 1024 * 1024, remaining)))
+            except HTTPException as e:
+                if e.status_code == 413 and remaining < MAX_UPLOAD_MB * 1024 * 1024:
+                    raise HTTPException(status_code=413, detail=f"Files are larger than {max_total_bytes // (1024 * 1024)} MB in total")
+                raise HTTPException(status_code=e.status_code, detail=f"{file.filename}: {e.detail}")
+    except BaseException:
+        for upload in uploads:
+            upload.close()
+        raise
+    return uploads
@@ -59,19 +59,22 @@ const ChatInterface = ({ docId }) => {
         setIsLoading(true);
 
         try {
-            // Prepare history for backend (simple format for now)
-            const history = messages.map(m => ({
-                role: m.role,
-                parts: [m.content]
-            }));
+            // The server keeps the conversation per session; earlier messages are only
+            // sent to start a session from history saved before it had one
+            const sessionKey = `chat_session_${docId}`;
+            const sessionId = localStorage.getItem(sessionKey);
 
             const API_URL = import.meta.env.VITE_API_URL || 'http://127.0.0.1:8000';
             const response = await axios.post(`${API_URL}/chat`, {
                 doc_id: docId,
-                messages: history,
+                session_id: sessionId,
+                messages: sessionId ? [] : messages.map(m => ({ role: m.role, content: m.content })),
                 question: userMessage
             });
 
+            if (response.data.session_id) {
+                localStorage.setItem(sessionKey, response.data.session_id);
+            }
             setMessages(prev => [...prev, { role: 'assistant', content: response.data.answer }]);
         } catch (error) {
             console.error('Chat error:', error);
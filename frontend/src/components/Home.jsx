@@ -1,5 +1,4 @@
 import React, { useState } from 'react';
-import axios from 'axios';
 import LandingPage from './LandingPage';
 import Workspace from './Workspace';
 import ErrorBoundary from './ErrorBoundary';
@@ -11,6 +10,7 @@ function Home({ isDarkMode, toggleTheme }) {
     const [summary, setSummary] = useState(null);
     const [docId, setDocId] = useState(null);
     const [isLoading, setIsLoading] = useState(false);
+    const [isStreaming, setIsStreaming] = useState(false);
 
     // Load session from localStorage on mount
     React.useEffect(() => {
@@ -33,9 +33,9 @@ function Home({ isDarkMode, toggleTheme }) {
         }
     }, []);
 
-    // Save session when relevant state changes
+    // Save session when relevant state changes (only once the study guide is complete)
     React.useEffect(() => {
-        if (docId && summary) {
+        if (docId && summary && !isStreaming) {
             const session = {
                 docId,
                 summary,
@@ -43,40 +43,86 @@ function Home({ isDarkMode, toggleTheme }) {
             };
             localStorage.setItem('doc_ai_session', JSON.stringify(session));
         }
-    }, [docId, summary, file]);
+    }, [docId, summary, file, isStreaming]);
 
     // Handle file selection from Landing Page
     const handleFileUpload = async (selectedFile) => {
         setFile(selectedFile);
         setIsLoading(true); // Start loading immediately
+        setIsStreaming(true);
 
         const formData = new FormData();
         formData.append('file', selectedFile);
 
+        // Abort after 5 minutes (300000ms) for large files
+        const controller = new AbortController();
+        const timeoutId = setTimeout(() => controller.abort(), 300000);
+
         try {
-            // Increase timeout to 5 minutes (300000ms) for large files
             const API_URL = import.meta.env.VITE_API_URL || 'http://127.0.0.1:8000';
-            const response = await axios.post(`${API_URL}/upload`, formData, {
-                headers: {
-                    'Content-Type': 'multipart/form-data',
-                },
-                timeout: 300000,
+            const response = await fetch(`${API_URL}/upload/stream`, {
+                method: 'POST',
+                body: formData,
+                signal: controller.signal,
             });
-            setSummary(response.data.study_guide);
-            setDocId(response.data.doc_id);
+
+            if (!response.ok) {
+                const errorData = await response.json().catch(() => ({}));
+                throw new Error(errorData.detail || `Server responded with ${response.status}`);
+            }
+
+            // Read the Server-Sent Events stream and render the study guide as it arrives
+            const reader = response.body.getReader();
+            const decoder = new TextDecoder();
+            let buffer = '';
+            let guide = '';
+
+            while (true) {
+                const { value, done } = await reader.read();
+                if (done) break;
+                buffer += decoder.decode(value, { stream: true });
+
+                let boundary;
+                while ((boundary = buffer.indexOf('\n\n')) !== -1) {
+                    const rawEvent = buffer.slice(0, boundary);
+                    buffer = buffer.slice(boundary + 2);
+
+                    const eventType = rawEvent.match(/^event: (.*)$/m)?.[1];
+                    const dataLine = rawEvent.match(/^data: (.*)$/m)?.[1];
+                    const data = dataLine ? JSON.parse(dataLine) : {};
+
+                    if (eventType === 'meta') {
+                        setDocId(data.doc_id);
+                    } else if (eventType === 'chunk') {
+                        guide += data.text;
+                        setSummary(guide);
+                        setIsLoading(false); // First tokens replace the spinner
+                    } else if (eventType === 'error') {
+                        throw new Error(data.detail);
+                    }
+                }
+            }
+
+            if (!guide) {
+                throw new Error('The AI returned an empty study guide.');
+            }
             // Storage will be updated by the useEffect
         } catch (error) {
             console.error('Error uploading file:', error);
-            if (error.code === 'ECONNABORTED') {
+            if (error.name === 'AbortError') {
                 showToast('Request timed out. The file might be too large or the AI is taking too long.', 'error');
             } else {
-                const errorMessage = error.response?.data?.detail || error.message || 'Unknown error occurred';
+                const errorMessage = error.message || 'Unknown error occurred';
                 showToast(`Failed to process file: ${errorMessage}`, 'error');
                 console.error('Full error:', error);
             }
             setFile(null); // Reset on error
+            setSummary(null);
+            setDocId(null);
         } finally {
+            clearTimeout(timeoutId);
             setIsLoading(false);
+            setIsStreaming(false);
         }
     };
 
@@ -103,6 +149,7 @@ function Home({ isDarkMode, toggleTheme }) {
                     summary={summary}
                     docId={docId}
                     isLoading={isLoading}
+                    isStreaming={isStreaming}
                     onBack={handleBack}
                     isDarkMode={isDarkMode}
                     toggleTheme={toggleTheme}
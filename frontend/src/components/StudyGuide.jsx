@@ -7,7 +7,7 @@ import { useToast } from '../context/ToastContext';
 import { useTTS } from '../hooks/useTTS';
 import QuizModal from './QuizModal';
 
-const StudyGuide = React.forwardRef(({ content, onReset, isInWorkspace = false, isDarkMode = false, title = "Your Study Guide", showEmoji = true, showUploadButton = true, showTranslate = true, showListen = true, showQuiz = true }, ref) => {
+const StudyGuide = React.forwardRef(({ content, onReset, isInWorkspace = false, isDarkMode = false, title = "Your Study Guide", showEmoji = true, showUploadButton = true, showTranslate = true, showListen = true, showQuiz = true, isStreaming = false }, ref) => {
     const contentRef = useRef(null);
     const { showToast } = useToast();
     const { speak, cancel, isSpeaking } = useTTS();
@@ -167,84 +167,87 @@ const StudyGuide = React.forwardRef(({ content, onReset, isInWorkspace = false,
                         </div>
                     )}
 
-                    <div className="flex justify-end pt-4 px-4 sm:px-8 mb-2 z-20 gap-3">
-                        {showListen && (
-                            <button
-                                onClick={handleSpeak}
-                                className={`flex items-center gap-2 px-4 py-2 rounded-lg text-sm font-medium transition-all border border-slate-200/50 dark:border-slate-700/50 backdrop-blur-sm ${isSpeaking ? 'bg-red-500 text-white hover:bg-red-600' : 'bg-white/50 dark:bg-slate-800/50 hover:bg-white/70 dark:hover:bg-slate-800/70 text-slate-700 dark:text-slate-200'}`}
-                            >
-                                {isSpeaking ? <StopCircle className="w-4 h-4" /> : <Volume2 className="w-4 h-4" />}
-                                <span className="hidden sm:inline">{isSpeaking ? 'Stop Reading' : 'Read Summary'}</span>
-                            </button>
-                        )}
-
-                        {showQuiz && (
-                            <button
-                                onClick={() => setIsQuizOpen(true)}
-                                className="flex items-center gap-2 px-4 py-2 rounded-lg text-sm font-medium transition-all border border-slate-200/50 dark:border-slate-700/50 backdrop-blur-sm bg-white/50 dark:bg-slate-800/50 hover:bg-white/70 dark:hover:bg-slate-800/70 text-slate-700 dark:text-slate-200"
-                            >
-                                <BrainCircuit className="w-4 h-4" />
-                                <span className="hidden sm:inline">Take Quiz</span>
-                            </button>
-                        )}
-
-                        <div className="relative">
-                            {/* Overlay to close dropdown when clicking outside */}
-                            {isLanguageDropdownOpen && (
-                                <div className="fixed inset-0 z-40" onClick={() => setIsLanguageDropdownOpen(false)}></div>
+                    {/* Actions need the complete study guide, so they are hidden while it is still streaming in */}
+                    {!isStreaming && (
+                        <div className="flex justify-end pt-4 px-4 sm:px-8 mb-2 z-20 gap-3">
+                            {showListen && (
+                                <button
+                                    onClick={handleSpeak}
+                                    className={`flex items-center gap-2 px-4 py-2 rounded-lg text-sm font-medium transition-all border border-slate-200/50 dark:border-slate-700/50 backdrop-blur-sm ${isSpeaking ? 'bg-red-500 text-white hover:bg-red-600' : 'bg-white/50 dark:bg-slate-800/50 hover:bg-white/70 dark:hover:bg-slate-800/70 text-slate-700 dark:text-slate-200'}`}
+                                >
+                                    {isSpeaking ? <StopCircle className="w-4 h-4" /> : <Volume2 className="w-4 h-4" />}
+                                    <span className="hidden sm:inline">{isSpeaking ? 'Stop Reading' : 'Read Summary'}</span>
+                                </button>
                             )}
 
-                            {showTranslate && (
+                            {showQuiz && (
                                 <button
-                                    onClick={() => setIsLanguageDropdownOpen(!isLanguageDropdownOpen)}
-                                    disabled={isTranslating}
-                                    className="flex items-center gap-2 pl-3 pr-4 py-2 bg-white/50 dark:bg-slate-800/50 backdrop-blur-sm border border-slate-200/50 dark:border-slate-700/50 rounded-lg text-sm text-slate-700 dark:text-slate-200 hover:bg-white/70 dark:hover:bg-slate-800/70 transition-all disabled:opacity-50 relative z-50 min-w-[140px] justify-between"
+                                    onClick={() => setIsQuizOpen(true)}
+                                    className="flex items-center gap-2 px-4 py-2 rounded-lg text-sm font-medium transition-all border border-slate-200/50 dark:border-slate-700/50 backdrop-blur-sm bg-white/50 dark:bg-slate-800/50 hover:bg-white/70 dark:hover:bg-slate-800/70 text-slate-700 dark:text-slate-200"
                                 >
-                                    <div className="flex items-center gap-3">
-                                        {currentLanguage === 'English' ? (
-                                            <>
-                                                <img src="https://flagcdn.com/w20/us.png" alt="US" className="w-5 h-3.5 object-cover rounded-[2px] shadow-sm" />
-                                                <span>English</span>
-                                            </>
-                                        ) : (
-                                            <>
-                                                <img src="https://flagcdn.com/w20/in.png" alt="IN" className="w-5 h-3.5 object-cover rounded-[2px] shadow-sm" />
-                                                <span>Hindi</span>
-                                            </>
-                                        )}
-                                    </div>
-                                    <svg className={`w-4 h-4 text-slate-400 transition-transform duration-200 ${isLanguageDropdownOpen ? 'rotate-180' : ''}`} fill="none" viewBox="0 0 24 24" stroke="currentColor">
-                                        <path strokeLinecap="round" strokeLinejoin="round" strokeWidth={2} d="M19 9l-7 7-7-7" />
-                                    </svg>
+                                    <BrainCircuit className="w-4 h-4" />
+                                    <span className="hidden sm:inline">Take Quiz</span>
                                 </button>
                             )}
 
-                            {isLanguageDropdownOpen && (
-                                <div className="absolute right-0 mt-2 w-full bg-white dark:bg-slate-800 rounded-lg shadow-xl border border-slate-200 dark:border-slate-700 overflow-hidden z-50 animate-fade-in origin-top-right">
-                                    <button
-                                        onClick={() => {
-                                            handleTranslate('English');
-                                            setIsLanguageDropdownOpen(false);
-                                        }}
-                                        className={`w-full flex items-center gap-3 px-4 py-2.5 text-sm hover:bg-slate-50 dark:hover:bg-slate-700 transition-colors ${currentLanguage === 'English' ? 'bg-indigo-50 dark:bg-indigo-900/20 text-indigo-600 dark:text-indigo-400 font-medium' : 'text-slate-700 dark:text-slate-200'}`}
-                                    >
-                                        <img src="https://flagcdn.com/w20/us.png" alt="US" className="w-5 h-3.5 object-cover rounded-[2px] shadow-sm" />
-                                        <span>English</span>
-                                    </button>
+                            <div className="relative">
+                                {/* Overlay to close dropdown when clicking outside */}
+                                {isLanguageDropdownOpen && (
+                                    <div className="fixed inset-0 z-40" onClick={() => setIsLanguageDropdownOpen(false)}></div>
+                                )}
+
+                                {showTranslate && (
                                     <button
-                                        onClick={() => {
-                                            handleTranslate('Hindi');
-                                            setIsLanguageDropdownOpen(false);
-                                        }}
-                                        className={`w-full flex items-center gap-3 px-4 py-2.5 text-sm hover:bg-slate-50 dark:hover:bg-slate-700 transition-colors ${currentLanguage === 'Hindi' ? 'bg-indigo-50 dark:bg-indigo-900/20 text-indigo-600 dark:text-indigo-400 font-medium' : 'text-slate-700 dark:text-slate-200'}`}
+                                        onClick={() => setIsLanguageDropdownOpen(!isLanguageDropdownOpen)}
+                                        disabled={isTranslating}
+                                        className="flex items-center gap-2 pl-3 pr-4 py-2 bg-white/50 dark:bg-slate-800/50 backdrop-blur-sm border border-slate-200/50 dark:border-slate-700/50 rounded-lg text-sm text-slate-700 dark:text-slate-200 hover:bg-white/70 dark:hover:bg-slate-800/70 transition-all disabled:opacity-50 relative z-50 min-w-[140px] justify-between"
                                     >
-                                        <img src="https://flagcdn.com/w20/in.png" alt="IN" className="w-5 h-3.5 object-cover rounded-[2px] shadow-sm" />
-                                        <span>Hindi</span>
+                                        <div className="flex items-center gap-3">
+                                            {currentLanguage === 'English' ? (
+                                                <>
+                                                    <img src="https://flagcdn.com/w20/us.png" alt="US" className="w-5 h-3.5 object-cover rounded-[2px] shadow-sm" />
+                                                    <span>English</span>
+                                                </>
+                                            ) : (
+                                                <>
+                                                    <img src="https://flagcdn.com/w20/in.png" alt="IN" className="w-5 h-3.5 object-cover rounded-[2px] shadow-sm" />
+                                                    <span>Hindi</span>
+                                                </>
+                                            )}
+                                        </div>
+                                        <svg className={`w-4 h-4 text-slate-400 transition-transform duration-200 ${isLanguageDropdownOpen ? 'rotate-180' : ''}`} fill="none" viewBox="0 0 24 24" stroke="currentColor">
+                                            <path strokeLinecap="round" strokeLinejoin="round" strokeWidth={2} d="M19 9l-7 7-7-7" />
+                                        </svg>
                                     </button>
-                                </div>
-                            )}
+                                )}
+
+                                {isLanguageDropdownOpen && (
+                                    <div className="absolute right-0 mt-2 w-full bg-white dark:bg-slate-800 rounded-lg shadow-xl border border-slate-200 dark:border-slate-700 overflow-hidden z-50 animate-fade-in origin-top-right">
+                                        <button
+                                            onClick={() => {
+                                                handleTranslate('English');
+                                                setIsLanguageDropdownOpen(false);
+                                            }}
+                                            className={`w-full flex items-center gap-3 px-4 py-2.5 text-sm hover:bg-slate-50 dark:hover:bg-slate-700 transition-colors ${currentLanguage === 'English' ? 'bg-indigo-50 dark:bg-indigo-900/20 text-indigo-600 dark:text-indigo-400 font-medium' : 'text-slate-700 dark:text-slate-200'}`}
+                                        >
+                                            <img src="https://flagcdn.com/w20/us.png" alt="US" className="w-5 h-3.5 object-cover rounded-[2px] shadow-sm" />
+                                            <span>English</span>
+                                        </button>
+                                        <button
+                                            onClick={() => {
+                                                handleTranslate('Hindi');
+                                                setIsLanguageDropdownOpen(false);
+                                            }}
+                                            className={`w-full flex items-center gap-3 px-4 py-2.5 text-sm hover:bg-slate-50 dark:hover:bg-slate-700 transition-colors ${currentLanguage === 'Hindi' ? 'bg-indigo-50 dark:bg-indigo-900/20 text-indigo-600 dark:text-indigo-400 font-medium' : 'text-slate-700 dark:text-slate-200'}`}
+                                        >
+                                            <img src="https://flagcdn.com/w20/in.png" alt="IN" className="w-5 h-3.5 object-cover rounded-[2px] shadow-sm" />
+                                            <span>Hindi</span>
+                                        </button>
+                                    </div>
+                                )}
+                            </div>
                         </div>
-                    </div>
+                    )}
 
                     {/* Content Area */}
                     <div ref={contentRef} className={`py-4 px-2 sm:p-6 md:p-12 prose prose-lg prose-slate dark:prose-invert max-w-none transition-colors duration-200 ${isInWorkspace ? 'overflow-y-auto flex-1 custom-scrollbar bg-transparent' : 'bg-transparent'}`}>
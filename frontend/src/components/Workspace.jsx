@@ -5,7 +5,7 @@ import axios from 'axios';
 import ChatInterface from './ChatInterface';
 import { useToast } from '../context/ToastContext';
 
-const Workspace = ({ file, summary, isLoading, onBack, isDarkMode, toggleTheme, docId }) => {
+const Workspace = ({ file, summary, isLoading, isStreaming = false, onBack, isDarkMode, toggleTheme, docId }) => {
     const [readMode, setReadMode] = useState(false);
     const { showToast } = useToast();
     const studyGuideRef = useRef(null);
@@ -92,8 +92,9 @@ const Workspace = ({ file, summary, isLoading, onBack, isDarkMode, toggleTheme,
                             <h1 className="font-bold text-slate-800 dark:text-white truncate max-w-[120px] sm:max-w-xs md:max-w-md text-sm sm:text-base">
                                 {file ? file.name : 'Document'}
                             </h1>
-                            <p className="text-[10px] sm:text-xs text-slate-500 dark:text-slate-400 truncate">
-                                AI Generated Study Guide
+                            <p className="text-[10px] sm:text-xs text-slate-500 dark:text-slate-400 truncate flex items-center gap-1">
+                                {isStreaming && <Loader2 className="w-3 h-3 animate-spin text-blue-500" />}
+                                {isStreaming ? 'Writing Study Guide...' : 'AI Generated Study Guide'}
                             </p>
                         </div>
                     </div>
@@ -106,7 +107,7 @@ const Workspace = ({ file, summary, isLoading, onBack, isDarkMode, toggleTheme,
                             {isDarkMode ? <Sun className="w-4 h-4 sm:w-5 sm:h-5" /> : <Moon className="w-4 h-4 sm:w-5 sm:h-5" />}
                         </button>
 
-                        {summary && (
+                        {summary && !isStreaming && (
                             <>
                                 {/* Share Button */}
                                 <button
@@ -163,7 +164,7 @@ const Workspace = ({ file, summary, isLoading, onBack, isDarkMode, toggleTheme,
                             </p>
                         </div>
                     ) : summary ? (
-                        <StudyGuide ref={studyGuideRef} content={summary} onReset={null} isInWorkspace={true} isDarkMode={isDarkMode} />
+                        <StudyGuide ref={studyGuideRef} content={summary} onReset={null} isInWorkspace={true} isDarkMode={isDarkMode} isStreaming={isStreaming} />
                     ) : (
                         <div className="flex flex-col items-center justify-center h-full text-slate-300 dark:text-slate-600">
                             <p>Waiting for content...</p>
@@ -173,7 +174,7 @@ const Workspace = ({ file, summary, isLoading, onBack, isDarkMode, toggleTheme,
             </div>
 
             {/* Chat Interface */}
-            {summary && <ChatInterface docId={docId} />}
+            {summary && !isStreaming && <ChatInterface docId={docId} />}
         </div>
     );
 };